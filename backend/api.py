@@ -1,110 +1,57 @@
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
-from main import run_agent_workflow
+from main import run_agent_workflow, get_runtime, start_warm_up, readiness_status, local_router, unmute_pool, medical_client
+from config.settings import settings
+from utils.llm_registry import get_llm_pool_stats
+from utils.route_cache import route_cache
+from modules.web_operations import search_cache
+from utils.conversation_window import conversation_window
+from modules.memory_operations import memory_compactor
+from utils.tracing import agent_metrics
+from utils.streaming import streaming_channel, make_chunk
+from api_common import (
+    parse_agent_request, build_agent_response, build_final_result, resolve_session_request, check_admin,
+    commit_session, build_session_final_result, session_conflict_body, session_state, SESSION_TOKEN_HEADER,
+    SessionConflictError, workflow_error_chunk, stream_error_chunk, STREAM_HEADERS, STREAM_CORS_HEADERS, KEEPALIVE_INTERVAL
+)
 import json
+import os
 import queue
 import threading
-import time
 
 app = Flask(__name__)
 CORS(app)
 
-# Global streaming queue
-streaming_queue = queue.Queue()
-
-def send_streaming_chunk(chunk_type: str, data: dict):
-    """Send a chunk to the frontend via the streaming queue"""
-    chunk = {
-        "type": chunk_type,
-        "data": data,
-        "timestamp": time.time()
-    }
-    streaming_queue.put(chunk)
-    print(f"DEBUG - Sent streaming chunk: {chunk_type} (queue size: {streaming_queue.qsize()})")
-
-def build_default_profile(profile):
-    # Fill with defaults if missing
-    return {
-        "uid": profile.get("uid", ""),
-        "name": profile.get("name", ""),
-        "age": profile.get("age", 0),
-        "bloodType": profile.get("bloodType", ""),
-        "allergies": profile.get("allergies", []),
-        "treatment": {
-            "medicationList": profile.get("treatment", {}).get("medicationList", []),
-            "dailyChecklist": profile.get("treatment", {}).get("dailyChecklist", []),
-            "appointment": profile.get("treatment", {}).get("appointment", ""),
-            "recommendations": profile.get("treatment", {}).get("recommendations", []),
-            "sleepHours": profile.get("treatment", {}).get("sleepHours", 0),
-            "sleepQuality": profile.get("treatment", {}).get("sleepQuality", "")
-        }
-    }
+# Models/clients load in the background so the worker can accept connections immediately;
+# /ready reports when everything is hot. Nothing starts at import, so importing the app
+# (tests, tools, the debug reloader's watcher process) opens no external connections.
+@app.before_request
+def warm_up_on_first_request():
+    # WSGI servers never run the __main__ block below
+    if settings.WARMUP_ON_START:
+        start_warm_up()
 
 @app.route("/api/agent", methods=["POST"])
 def agent_endpoint():
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No JSON payload received."}), 400
-
-        # --- Input Processing and Validation ---
-        user_input = data.get("prompt", "")
-        memory = data.get("memory", [])
-        updates = data.get("updates", [])
-        conversation = data.get("conversation", {})
-
-        # Validate and sanitize memory structure
-        if not isinstance(memory, list):
-            memory = [] # Default to empty list if memory is not a list
-
-        # Validate conversation structure
-        if not isinstance(conversation, dict):
-            conversation = {"cid": "conv-001", "tags": [], "conversation": []}
-
-        # Flatten incoming patient profile
-        patient_profile = data.get("patientProfile", {})
-        if "treatment" in patient_profile and isinstance(patient_profile["treatment"], dict):
-            treatment_data = patient_profile.pop("treatment")
-            patient_profile.update(treatment_data)
-
-        if not user_input:
-            return jsonify({"error": "Missing 'prompt' in request."}), 400
+        data, session, session_error = resolve_session_request(request.get_json(), request.headers.get(SESSION_TOKEN_HEADER))
+        if session_error:
+            return jsonify(session_error[0]), session_error[1]
+        agent_request, error = parse_agent_request(data)
+        if error:
+            return jsonify({"error": error}), 400
 
         # --- Call backend.main.run_agent_workflow ---
-        result = run_agent_workflow(
-            user_input, memory, patient_profile,
-            updates=updates, conversation=conversation
-        )
-
-        # --- Patient Profile Transformation ---
-        profile = result.get("patientProfile", patient_profile)
-        # Dynamically collect all treatment fields
-        treatment_data = {}
-        for k in list(profile.keys()):
-            if k not in ("uid", "name", "age", "bloodType", "allergies", "treatment"):
-                treatment_data[k] = profile.pop(k)
-        # Compose the nested treatment dict
-        transformed_profile = profile.copy()
-        transformed_profile["treatment"] = treatment_data
-        # Ensure all required fields are present
-        transformed_profile = build_default_profile(transformed_profile)
-
-        # --- Memory ---
-        memory = result.get("memory", memory)
+        result = run_agent_workflow(**agent_request)
 
         # Prepare response with transformed data
-        
-        response = {
-            "updatedPatientProfile": transformed_profile,
-            "updatedMemory": memory,
-            "Updates": result.get("updates", updates),
-        }
-        if "final_answer" in result and result["final_answer"]:
-            response["extraInfo"] = result["final_answer"]
-        elif "response" in result:
-            response["extraInfo"] = result["response"]
+        response = build_agent_response(result, agent_request)
+        if session:
+            response = commit_session(session, result, response, agent_request)
         print("Response:-\n",jsonify(response))
         return jsonify(response)
+    except SessionConflictError as e:
+        return jsonify(session_conflict_body(e)), 409
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
@@ -113,45 +60,17 @@ def agent_endpoint():
 def agent_stream_endpoint():
     # Handle preflight OPTIONS request
     if request.method == "OPTIONS":
-        return Response(
-            status=200,
-            headers={
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type, Cache-Control',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Credentials': 'true'
-            }
-        )
+        return Response(status=200, headers=STREAM_CORS_HEADERS)
     
     # Handle actual POST request
     """Streaming endpoint that sends chunks in real-time"""
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No JSON payload received."}), 400
-
-        # --- Input Processing and Validation ---
-        user_input = data.get("prompt", "")
-        memory = data.get("memory", [])
-        updates = data.get("updates", [])
-        conversation = data.get("conversation", {})
-
-        # Validate and sanitize memory structure
-        if not isinstance(memory, list):
-            memory = []
-
-        # Validate conversation structure
-        if not isinstance(conversation, dict):
-            conversation = {"cid": "conv-001", "tags": [], "conversation": []}
-
-        # Flatten incoming patient profile
-        patient_profile = data.get("patientProfile", {})
-        if "treatment" in patient_profile and isinstance(patient_profile["treatment"], dict):
-            treatment_data = patient_profile.pop("treatment")
-            patient_profile.update(treatment_data)
-
-        if not user_input:
-            return jsonify({"error": "Missing 'prompt' in request."}), 400
+        data, session, session_error = resolve_session_request(request.get_json(), request.headers.get(SESSION_TOKEN_HEADER))
+        if session_error:
+            return jsonify(session_error[0]), session_error[1]
+        agent_request, error = parse_agent_request(data)
+        if error:
+            return jsonify({"error": error}), 400
 
         def generate_stream():
             """Generator function for Server-Sent Events"""
@@ -159,80 +78,32 @@ def agent_stream_endpoint():
                 # Create a new queue for this specific request
                 request_queue = queue.Queue()
                 
-                # Override the global send_streaming_chunk function for this request
                 def send_streaming_chunk_local(chunk_type: str, data: dict):
                     """Send a chunk to the frontend via the request-specific queue"""
-                    chunk = {
-                        "type": chunk_type,
-                        "data": data,
-                        "timestamp": time.time()
-                    }
-                    request_queue.put(chunk)
+                    request_queue.put(make_chunk(chunk_type, data))
                     print(f"DEBUG - Sent streaming chunk: {chunk_type} (queue size: {request_queue.qsize()})")
                 
                 # Start workflow in background thread FIRST
                 def run_workflow():
                     try:
-                        # Temporarily replace the global send_streaming_chunk
-                        import main
-                        original_send_chunk = main.send_streaming_chunk
-                        main.send_streaming_chunk = send_streaming_chunk_local
+                        # Chunks sent anywhere in this run (including worker threads) land in this request's queue
+                        with streaming_channel(send_streaming_chunk_local):
+                            result = run_agent_workflow(**agent_request)
                         
-                        try:
-                            result = run_agent_workflow(
-                                user_input, memory, patient_profile,
-                                updates=updates, conversation=conversation
-                            )
-                            
-                            # Send final result
-                            # Add defensive type checking for result
-                            if isinstance(result, dict):
-                                patient_profile_result = result.get("patientProfile", patient_profile)
-                                memory_result = result.get("memory", memory)
-                                updates_result = result.get("updates", updates)
-                                final_answer_result = result.get("final_answer", "")
-                                function_result = result.get("function", "")
-                            else:
-                                print(f"WARNING: result is not a dict, it's {type(result)}: {result}")
-                                # Fallback to original values if result is not a dict
-                                patient_profile_result = patient_profile
-                                memory_result = memory
-                                updates_result = updates
-                                final_answer_result = ""
-                                function_result = ""
-                            
-                            final_response = {
-                                "type": "final_result",
-                                "data": {
-                                    "updatedPatientProfile": patient_profile_result, #build_default_profile(patient_profile_result),
-                                    "updatedMemory": memory_result,
-                                    "Updates": updates_result,
-                                    "extraInfo": final_answer_result,
-                                    "function": function_result
-                                }
-                            }
-                            request_queue.put(final_response)
-                            
-                        finally:
-                            # Restore the original function
-                            main.send_streaming_chunk = original_send_chunk
+                        # Send final result
+                        if session:
+                            request_queue.put(build_session_final_result(session, result, agent_request))
+                        else:
+                            request_queue.put(build_final_result(result, agent_request))
                         
                     except Exception as e:
-                        error_response = {
-                            "type": "error",
-                            "data": {"error from here": str(e)}
-                        }
-                        request_queue.put(error_response)
+                        request_queue.put(workflow_error_chunk(e))
                 
                 # Start workflow thread BEFORE starting streaming loop
                 workflow_thread = threading.Thread(target=run_workflow)
                 workflow_thread.daemon = True
                 workflow_thread.start()
                 
-                # Give workflow a moment to start and send first chunk
-                #import time
-                #time.sleep(0.5)
-                
                 # Stream chunks as they arrive
                 print(f"DEBUG - Streaming endpoint: Starting to read chunks from queue")
                 keepalive_count = 0
@@ -240,7 +111,7 @@ def agent_stream_endpoint():
                     try:
                         # Wait for chunk with timeout - use shorter timeout for real-time streaming
                         print(f"DEBUG - Streaming endpoint: Waiting for chunk (queue size: {request_queue.qsize()})")
-                        chunk = request_queue.get(timeout=0.5)  # 0.005 second timeout for real-time
+                        chunk = request_queue.get(timeout=KEEPALIVE_INTERVAL)
                         print(f"DEBUG - Streaming endpoint: Sending chunk {chunk['type']} to frontend")
                         
                         if chunk["type"] == "final_result":
@@ -266,27 +137,91 @@ def agent_stream_endpoint():
                         yield f"data: {json.dumps({'type': 'keepalive'})}\n\n"
                         
             except Exception as e:
-                error_response = {
-                    "type": "error",
-                    "data": {"error": f"Streaming error: {str(e)}"}
-                }
-                yield f"data: {json.dumps(error_response)}\n\n"
+                yield f"data: {json.dumps(stream_error_chunk(e))}\n\n"
 
         return Response(
             generate_stream(),
             mimetype='text/event-stream',
-            headers={
-                'Cache-Control': 'no-cache',
-                'Connection': 'keep-alive',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type, Cache-Control',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Credentials': 'true'
-            }
+            headers=STREAM_HEADERS
         )
         
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
+@app.route("/ready", methods=["GET"])
+def ready_endpoint():
+    """Readiness probe: 200 once graph, LLM clients and embeddings are loaded, 503 before"""
+    status = readiness_status()
+    if not status["ready"]:
+        # Warm up on demand (WARMUP_ON_START=False) and retry failed warm-ups
+        status["warming_up"] = start_warm_up() or status["warming_up"]
+    return jsonify(status), (200 if status["ready"] else 503)
+
+@app.route("/api/llm/pool", methods=["GET"])
+def llm_pool_endpoint():
+    """Expose shared LLM client registry and connection pool statistics"""
+    return jsonify(get_llm_pool_stats())
+
+@app.route("/api/route/cache", methods=["GET"])
+def route_cache_endpoint():
+    """Expose route-decision cache hit/miss statistics"""
+    return jsonify(route_cache.stats())
+
+@app.route("/api/route/local", methods=["GET"])
+def local_router_endpoint():
+    """Expose local router example counts and local-vs-LLM routing rates"""
+    return jsonify(local_router.stats())
+
+@app.route("/api/unmute/pool", methods=["GET"])
+def unmute_pool_endpoint():
+    """Expose Unmute session pool size and lease wait-time statistics"""
+    return jsonify(unmute_pool.stats())
+
+@app.route("/api/web/cache", methods=["GET"])
+def web_cache_endpoint():
+    """Expose web-search result cache hit/miss and single-flight statistics"""
+    return jsonify(search_cache.stats())
+
+@app.route("/api/conversation/window", methods=["GET"])
+def conversation_window_endpoint():
+    """Expose conversation window budget and rolling-summary cache statistics"""
+    return jsonify(conversation_window.stats())
+
+@app.route("/api/memory/compaction", methods=["GET"])
+def memory_compaction_endpoint():
+    """Expose memory compaction settings and merged/evicted counts"""
+    return jsonify(memory_compactor.stats())
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus metrics: per-node latency histograms, LLM calls and tokens"""
+    return Response(agent_metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/medical/metrics", methods=["GET"])
+def medical_metrics_endpoint():
+    """Expose per-endpoint medical client latency, error and circuit-breaker statistics"""
+    return jsonify(medical_client.stats())
+
+@app.route("/api/session/<session_id>", methods=["GET"])
+def session_endpoint(session_id):
+    """Full stored session state, for clients resyncing after a version conflict (X-Session-Token required)"""
+    state = session_state(session_id, request.headers.get(SESSION_TOKEN_HEADER))
+    if state is None:
+        return jsonify({"error": "Unknown session"}), 404
+    return jsonify(state)
+
+@app.route("/api/runtime/reload", methods=["POST"])
+def runtime_reload_endpoint():
+    """Rebuild the tool registries and recompile the agent workflow (admin token required)"""
+    error = check_admin(request.headers.get("Authorization"))
+    if error:
+        return jsonify(error[0]), error[1]
+    runtime = get_runtime()
+    runtime.reload()
+    return jsonify({"status": "reloaded", "loaded_at": runtime.loaded_at})
+
 if __name__ == "__main__":
+    # Only in the serving process, not in the reloader's watcher
+    if settings.WARMUP_ON_START and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_warm_up()
     app.run(debug=True, host="0.0.0.0", port=5100)
\ No newline at end of file
@@ -0,0 +1,279 @@
+# Request/response shaping shared by the Flask (api.py) and ASGI (asgi.py) servers
+
+import copy
+import hashlib
+import hmac
+import secrets
+from typing import Optional
+from config.settings import settings
+from utils.json_patch import PatchError, apply_patch, make_patch
+from utils.session_store import SessionConflictError, create_session_store
+
+# Headers for the streaming endpoint and its CORS preflight
+STREAM_CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type, Cache-Control, X-Session-Token',
+    'Access-Control-Allow-Methods': 'POST, OPTIONS',
+    'Access-Control-Allow-Credentials': 'true'
+}
+STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive',
+    **STREAM_CORS_HEADERS
+}
+
+# Seconds without a chunk before the stream sends a keepalive event
+KEEPALIVE_INTERVAL = 0.5
+
+def check_admin(authorization: Optional[str]) -> Optional[tuple]:
+    """None if the Authorization header carries ADMIN_TOKEN, else an error (body, status) pair."""
+    if not settings.ADMIN_TOKEN:
+        return {"error": "Admin endpoints are disabled (set ADMIN_TOKEN)"}, 403
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), settings.ADMIN_TOKEN.encode()):
+        return {"error": "Unauthorized"}, 401
+    return None
+
+# Server-side session state (None = stateless, clients send everything on every request)
+session_store = create_session_store()
+
+
+def build_default_profile(profile):
+    # Fill with defaults if missing
+    return {
+        "uid": profile.get("uid", ""),
+        "name": profile.get("name", ""),
+        "age": profile.get("age", 0),
+        "bloodType": profile.get("bloodType", ""),
+        "allergies": profile.get("allergies", []),
+        "treatment": {
+            "medicationList": profile.get("treatment", {}).get("medicationList", []),
+            "dailyChecklist": profile.get("treatment", {}).get("dailyChecklist", []),
+            "appointment": profile.get("treatment", {}).get("appointment", ""),
+            "recommendations": profile.get("treatment", {}).get("recommendations", []),
+            "sleepHours": profile.get("treatment", {}).get("sleepHours", 0),
+            "sleepQuality": profile.get("treatment", {}).get("sleepQuality", "")
+        }
+    }
+
+
+def parse_agent_request(data) -> tuple:
+    """
+    Validate an /api/agent(/stream) payload. Returns (workflow_kwargs, None) on success
+    or (None, error_message) for a 400 response.
+    """
+    if not data:
+        return None, "No JSON payload received."
+
+    # --- Input Processing and Validation ---
+    user_input = data.get("prompt", "")
+    memory = data.get("memory", [])
+    updates = data.get("updates", [])
+    conversation = data.get("conversation", {})
+
+    # Validate and sanitize memory structure
+    if not isinstance(memory, list):
+        memory = []  # Default to empty list if memory is not a list
+
+    # Validate conversation structure
+    if not isinstance(conversation, dict):
+        conversation = {"cid": "conv-001", "tags": [], "conversation": []}
+
+    # Flatten incoming patient profile
+    patient_profile = data.get("patientProfile", {})
+    if "treatment" in patient_profile and isinstance(patient_profile["treatment"], dict):
+        treatment_data = patient_profile.pop("treatment")
+        patient_profile.update(treatment_data)
+
+    if not user_input:
+        return None, "Missing 'prompt' in request."
+
+    return {
+        "user_input": user_input,
+        "memory": memory,
+        "patient_profile": patient_profile,
+        "updates": updates,
+        "conversation": conversation,
+        "timing": bool(data.get("timing", False))
+    }, None
+
+
+def build_agent_response(result: dict, request: dict) -> dict:
+    """Shape a workflow result into the /api/agent response body."""
+    # --- Patient Profile Transformation ---
+    # Copied so the workflow's own profile stays intact for commit_session
+    profile = dict(result.get("patientProfile", request["patient_profile"]))
+    # Dynamically collect all treatment fields
+    treatment_data = {}
+    for k in list(profile.keys()):
+        if k not in ("uid", "name", "age", "bloodType", "allergies", "treatment"):
+            treatment_data[k] = profile.pop(k)
+    # Compose the nested treatment dict
+    transformed_profile = profile.copy()
+    transformed_profile["treatment"] = treatment_data
+    # Ensure all required fields are present
+    transformed_profile = build_default_profile(transformed_profile)
+
+    response = {
+        "updatedPatientProfile": transformed_profile,
+        "updatedMemory": result.get("memory", request["memory"]),
+        "Updates": result.get("updates", request["updates"]),
+    }
+    if "final_answer" in result and result["final_answer"]:
+        response["extraInfo"] = result["final_answer"]
+    elif "response" in result:
+        response["extraInfo"] = result["response"]
+    return response
+
+
+def build_final_result(result, request: dict) -> dict:
+    """Shape a workflow result into the terminal `final_result` stream chunk."""
+    # Add defensive type checking for result
+    if not isinstance(result, dict):
+        print(f"WARNING: result is not a dict, it's {type(result)}: {result}")
+        # Fallback to original values if result is not a dict
+        result = {}
+    return {
+        "type": "final_result",
+        "data": {
+            "updatedPatientProfile": result.get("patientProfile", request["patient_profile"]),
+            "updatedMemory": result.get("memory", request["memory"]),
+            "Updates": result.get("updates", request["updates"]),
+            "extraInfo": result.get("final_answer", ""),
+            "function": result.get("function", "")
+        }
+    }
+
+
+def workflow_error_chunk(e: Exception) -> dict:
+    return {
+        "type": "error",
+        "data": {"error from here": str(e)}
+    }
+
+
+def stream_error_chunk(e: Exception) -> dict:
+    return {
+        "type": "error",
+        "data": {"error": f"Streaming error: {str(e)}"}
+    }
+
+
+def is_terminal_chunk(chunk: Optional[dict]) -> bool:
+    return bool(chunk) and chunk.get("type") in ("final_result", "error")
+
+
+# --- Session delta sync ---
+# A client that sends "sessionId" keeps its memory, conversation and patientProfile on the
+# server. It starts a session with "sessionId": null and the full state; the response
+# carries the server-issued "sessionId" and a "sessionToken" that every later request (and
+# GET /api/session/<id>) must send in the X-Session-Token header. Later turns send
+# "baseVersion" plus an RFC 6902 "patch" against that state; the response carries the new
+# "version" and a "patch" from the state the client holds to the state after the turn.
+# The store keeps {"tokenHash", "state"} per session; only "state" is ever sent or patched.
+
+SESSION_TOKEN_HEADER = "X-Session-Token"
+
+
+def _session_document(data: dict) -> dict:
+    return {
+        "memory": data.get("memory", []),
+        "conversation": data.get("conversation", {}),
+        "patientProfile": data.get("patientProfile", {}),
+    }
+
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _load_owned_session(session_id: str, token: Optional[str]) -> tuple:
+    """(version, stored) for a session the token opens, or (0, None) -- unknown and foreign look the same."""
+    version, stored = session_store.load(session_id)
+    if stored is None or not token or not hmac.compare_digest(_token_hash(token), stored.get("tokenHash", "")):
+        return 0, None
+    return version, stored
+
+
+def session_conflict_body(e: SessionConflictError) -> dict:
+    return {"error": "Session version conflict, resync required", "sessionId": e.session_id, "version": e.version}
+
+
+def resolve_session_request(data, token: Optional[str] = None) -> tuple:
+    """
+    Expand a session request into a full agent payload. Returns (payload, session, error),
+    where session is None for stateless requests and error is a (body, status) pair.
+    `token` is the X-Session-Token header.
+    """
+    if not isinstance(data, dict) or "sessionId" not in data:
+        return data, None, None
+    delta = "baseVersion" in data
+    if session_store is None:
+        if delta:
+            return None, None, ({"error": "Session store is disabled; send the full state."}, 400)
+        return data, None, None
+
+    if not data["sessionId"]:
+        if delta:
+            return None, None, ({"error": "baseVersion needs the sessionId the server issued."}, 400)
+        token = secrets.token_urlsafe(32)
+        session_id, version, document = secrets.token_urlsafe(16), 0, _session_document(data)
+    else:
+        session_id = str(data["sessionId"])
+        version, stored = _load_owned_session(session_id, token)
+        if stored is None:
+            return None, None, ({"error": "Unknown session"}, 404)
+        # A versionless write would silently reset the session; the client has to resync instead
+        if not delta or data["baseVersion"] != version:
+            return None, None, (session_conflict_body(SessionConflictError(session_id, version)), 409)
+        try:
+            document = apply_patch(stored["state"], data.get("patch", []))
+        except PatchError as e:
+            return None, None, ({"error": f"Invalid session patch: {e}"}, 400)
+
+    # parse_agent_request flattens the profile in place; the session keeps the client's shape
+    payload = {"prompt": data.get("prompt", ""), "updates": data.get("updates", []), **copy.deepcopy(document)}
+    session = {"id": session_id, "version": version, "document": document, "tokenHash": _token_hash(token)}
+    if version == 0:
+        session["token"] = token
+    return payload, session, None
+
+
+def commit_session(session: dict, result, response: dict, request: dict) -> dict:
+    """
+    Save the turn's state and turn a full response into a delta response. The stored profile
+    is the workflow's own (as build_final_result returns it) whichever endpoint served the turn.
+    """
+    if not isinstance(result, dict):
+        result = {}
+    document = {
+        "memory": result.get("memory", request["memory"]),
+        "conversation": request["conversation"],
+        "patientProfile": result.get("patientProfile", request["patient_profile"]),
+    }
+    version = session_store.save(session["id"], session["version"], {"tokenHash": session["tokenHash"], "state": document})
+    delta = {k: v for k, v in response.items() if k not in ("updatedMemory", "updatedPatientProfile")}
+    issued = {"sessionToken": session["token"]} if "token" in session else {}
+    return {
+        "sessionId": session["id"],
+        **issued,
+        "version": version,
+        "patch": make_patch(session["document"], document),
+        **delta,
+    }
+
+
+def build_session_final_result(session: dict, result, request: dict) -> dict:
+    """The terminal `final_result` chunk for a session stream (delta instead of full state)."""
+    data = commit_session(session, result, build_final_result(result, request)["data"], request)
+    return {"type": "final_result", "data": data}
+
+
+def session_state(session_id: str, token: Optional[str]) -> Optional[dict]:
+    """Full stored state for a client resync, or None unless the token opens the session."""
+    if session_store is None:
+        return None
+    version, stored = _load_owned_session(session_id, token)
+    if stored is None:
+        return None
+    return {"sessionId": session_id, "version": version, "state": stored["state"]}
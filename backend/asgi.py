@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+ASGI entry point serving the same contracts as api.py (/api/agent, /api/agent/stream and
+the ops endpoints), but running the workflow with workflow.ainvoke() on one event loop:
+LLM, medical-endpoint and Unmute I/O are awaited instead of pinning a thread per request.
+
+Run (from backend/):
+    uvicorn asgi:app --host 0.0.0.0 --port 5100
+    python asgi.py
+"""
+
+import asyncio
+import contextlib
+import json
+import threading
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from main import arun_agent_workflow, get_runtime, start_warm_up, readiness_status, local_router, unmute_pool, medical_client
+from config.settings import settings
+from utils.llm_registry import get_llm_pool_stats
+from utils.route_cache import route_cache
+from modules.web_operations import search_cache
+from utils.conversation_window import conversation_window
+from modules.memory_operations import memory_compactor
+from utils.tracing import agent_metrics
+from utils.streaming import streaming_channel, make_chunk
+from api_common import (
+    parse_agent_request, build_agent_response, build_final_result, resolve_session_request, check_admin,
+    commit_session, build_session_final_result, session_conflict_body, session_state, SESSION_TOKEN_HEADER,
+    SessionConflictError, workflow_error_chunk, stream_error_chunk, is_terminal_chunk,
+    STREAM_HEADERS, STREAM_CORS_HEADERS, KEEPALIVE_INTERVAL
+)
+
+async def _read_json(request: Request):
+    try:
+        return await request.json()
+    except (json.JSONDecodeError, ValueError):
+        return None
+
+
+async def agent_endpoint(request: Request):
+    try:
+        # Session store I/O is blocking (SQLite), so it runs off the event loop
+        data, session, session_error = await asyncio.to_thread(resolve_session_request, await _read_json(request),
+                                                               request.headers.get(SESSION_TOKEN_HEADER))
+        if session_error:
+            return JSONResponse(session_error[0], status_code=session_error[1])
+        agent_request, error = parse_agent_request(data)
+        if error:
+            return JSONResponse({"error": error}, status_code=400)
+        result = await arun_agent_workflow(**agent_request)
+        response = build_agent_response(result, agent_request)
+        if session:
+            response = await asyncio.to_thread(commit_session, session, result, response, agent_request)
+        return JSONResponse(response)
+    except SessionConflictError as e:
+        return JSONResponse(session_conflict_body(e), status_code=409)
+    except Exception as e:
+        return JSONResponse({"error": f"Internal server error: {str(e)}"}, status_code=500)
+
+
+async def agent_stream_endpoint(request: Request):
+    if request.method == "OPTIONS":
+        return Response(status_code=200, headers=STREAM_CORS_HEADERS)
+
+    try:
+        data, session, session_error = await asyncio.to_thread(resolve_session_request, await _read_json(request),
+                                                               request.headers.get(SESSION_TOKEN_HEADER))
+        if session_error:
+            return JSONResponse(session_error[0], status_code=session_error[1])
+        agent_request, error = parse_agent_request(data)
+        if error:
+            return JSONResponse({"error": error}, status_code=400)
+    except Exception as e:
+        return JSONResponse({"error": f"Internal server error: {str(e)}"}, status_code=500)
+
+    async def generate_stream():
+        loop = asyncio.get_running_loop()
+        loop_thread = threading.get_ident()
+        request_queue = asyncio.Queue()
+
+        def send_streaming_chunk_local(chunk_type: str, data: dict):
+            chunk = make_chunk(chunk_type, data)
+            if threading.get_ident() == loop_thread:
+                request_queue.put_nowait(chunk)
+            else:
+                # Sync nodes run in worker threads, so hand chunks to the loop thread-safely
+                loop.call_soon_threadsafe(request_queue.put_nowait, chunk)
+
+        async def run_workflow():
+            try:
+                result = await arun_agent_workflow(**agent_request)
+                if session:
+                    final = await asyncio.to_thread(build_session_final_result, session, result, agent_request)
+                else:
+                    final = build_final_result(result, agent_request)
+                request_queue.put_nowait(final)
+            except Exception as e:
+                request_queue.put_nowait(workflow_error_chunk(e))
+
+        # The task copies the current context, so only this run sees this request's channel
+        with streaming_channel(send_streaming_chunk_local):
+            task = asyncio.create_task(run_workflow())
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(request_queue.get(), timeout=KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield f"data: {json.dumps({'type': 'keepalive'})}\n\n"
+                    continue
+                yield f"data: {json.dumps(chunk)}\n\n"
+                if is_terminal_chunk(chunk):
+                    break
+        except Exception as e:
+            yield f"data: {json.dumps(stream_error_chunk(e))}\n\n"
+        finally:
+            # Client went away (or the stream ended): don't leave the workflow running
+            if not task.done():
+                task.cancel()
+                with contextlib.suppress(BaseException):
+                    await task
+
+    return StreamingResponse(generate_stream(), media_type="text/event-stream", headers=STREAM_HEADERS)
+
+
+async def ready_endpoint(request: Request):
+    """Readiness probe: 200 once graph, LLM clients and embeddings are loaded, 503 before"""
+    status = readiness_status()
+    if not status["ready"]:
+        # Warm up on demand (WARMUP_ON_START=False) and retry failed warm-ups
+        status["warming_up"] = start_warm_up() or status["warming_up"]
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+async def llm_pool_endpoint(request: Request):
+    """Expose shared LLM client registry and connection pool statistics"""
+    return JSONResponse(get_llm_pool_stats())
+
+
+async def route_cache_endpoint(request: Request):
+    """Expose route-decision cache hit/miss statistics"""
+    return JSONResponse(route_cache.stats())
+
+
+async def local_router_endpoint(request: Request):
+    """Expose local router example counts and local-vs-LLM routing rates"""
+    return JSONResponse(local_router.stats())
+
+
+async def unmute_pool_endpoint(request: Request):
+    """Expose Unmute session pool size and lease wait-time statistics"""
+    return JSONResponse(unmute_pool.stats())
+
+
+async def web_cache_endpoint(request: Request):
+    """Expose web-search result cache hit/miss and single-flight statistics"""
+    return JSONResponse(search_cache.stats())
+
+
+async def conversation_window_endpoint(request: Request):
+    """Expose conversation window budget and rolling-summary cache statistics"""
+    return JSONResponse(conversation_window.stats())
+
+
+async def memory_compaction_endpoint(request: Request):
+    """Expose memory compaction settings and merged/evicted counts"""
+    return JSONResponse(memory_compactor.stats())
+
+
+async def metrics_endpoint(request: Request):
+    """Prometheus metrics: per-node latency histograms, LLM calls and tokens"""
+    return Response(agent_metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+async def medical_metrics_endpoint(request: Request):
+    """Expose per-endpoint medical client latency, error and circuit-breaker statistics"""
+    return JSONResponse(medical_client.stats())
+
+
+async def session_endpoint(request: Request):
+    """Full stored session state, for clients resyncing after a version conflict (X-Session-Token required)"""
+    state = await asyncio.to_thread(session_state, request.path_params["session_id"],
+                                    request.headers.get(SESSION_TOKEN_HEADER))
+    if state is None:
+        return JSONResponse({"error": "Unknown session"}, status_code=404)
+    return JSONResponse(state)
+
+
+async def runtime_reload_endpoint(request: Request):
+    """Rebuild the tool registries and recompile the agent workflow (admin token required)"""
+    error = check_admin(request.headers.get("authorization"))
+    if error:
+        return JSONResponse(error[0], status_code=error[1])
+    runtime = get_runtime()
+    await asyncio.to_thread(runtime.reload)
+    return JSONResponse({"status": "reloaded", "loaded_at": runtime.loaded_at})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Same background warm-up as api.py; /ready reports when everything is hot
+    if settings.WARMUP_ON_START:
+        start_warm_up()
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route("/api/agent", agent_endpoint, methods=["POST"]),
+        Route("/api/agent/stream", agent_stream_endpoint, methods=["POST", "OPTIONS"]),
+        Route("/ready", ready_endpoint, methods=["GET"]),
+        Route("/metrics", metrics_endpoint, methods=["GET"]),
+        Route("/api/llm/pool", llm_pool_endpoint, methods=["GET"]),
+        Route("/api/route/cache", route_cache_endpoint, methods=["GET"]),
+        Route("/api/route/local", local_router_endpoint, methods=["GET"]),
+        Route("/api/unmute/pool", unmute_pool_endpoint, methods=["GET"]),
+        Route("/api/web/cache", web_cache_endpoint, methods=["GET"]),
+        Route("/api/conversation/window", conversation_window_endpoint, methods=["GET"]),
+        Route("/api/memory/compaction", memory_compaction_endpoint, methods=["GET"]),
+        Route("/api/medical/metrics", medical_metrics_endpoint, methods=["GET"]),
+        Route("/api/session/{session_id}", session_endpoint, methods=["GET"]),
+        Route("/api/runtime/reload", runtime_reload_endpoint, methods=["POST"]),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=5100)
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Offline throughput benchmark for /api/agent and /api/agent/stream.
+
+Starts the fake LLM, PSE, medical and Unmute services from fake_services.py, launches
+the API server (Flask api.py or the ASGI app) as a subprocess pointed at them, and
+drives it at a fixed concurrency with prompts drawn from a route mix. Reports
+requests/s, p50/p95/p99 latency and server CPU time per request, so the backend's own
+overhead can be compared across commits with the model latency held constant.
+
+Usage (from backend/):
+    python benchmarks/bench_agent_throughput.py --server flask --concurrency 8 --requests 200
+    python benchmarks/bench_agent_throughput.py --server asgi --llm-ttft 0.05 --routes TEXT=1,PATIENT=1
+    python benchmarks/bench_agent_throughput.py --url http://127.0.0.1:5100 --server-pid 4242
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.fake_services import FakeServices, agent_payload, parse_route_weights, prompt_sequence
+
+SERVER_COMMANDS = {
+    "flask": ["-c", "from api import app; app.run(host='127.0.0.1', port={port}, threaded=True, use_reloader=False)"],
+    "asgi": ["-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", "{port}", "--log-level", "warning"],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_cpu_seconds(pid: int) -> float:
+    """User + system CPU of a process (all threads) from /proc; 0.0 where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Fields after the parenthesised command name; utime and stime are fields 14 and 15
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+class AgentServer:
+    """The API server under test, running in a subprocess against the fake services."""
+
+    def __init__(self, kind: str, env: dict, log_path: str):
+        self.kind = kind
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.env = {**os.environ, **env}
+        self.log_path = log_path
+        self.process = None
+
+    def start(self, timeout: float = 180.0):
+        command = [sys.executable] + [arg.format(port=self.port) for arg in SERVER_COMMANDS[self.kind]]
+        self._log = open(self.log_path, "w")
+        self.process = subprocess.Popen(command, cwd=BACKEND_DIR, env=self.env,
+                                        stdout=self._log, stderr=subprocess.STDOUT)
+        wait_until_ready(self.url, timeout, self.process)
+        return self
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self._log.close()
+
+
+def wait_until_ready(url: str, timeout: float, process=None):
+    """Poll /ready until the server reports every component loaded."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} before becoming ready")
+        try:
+            response = httpx.get(f"{url}/ready", timeout=2)
+        except httpx.HTTPError:
+            response = None
+        if response is not None:
+            if response.status_code == 200:
+                return
+            if response.json().get("error"):
+                raise RuntimeError(f"Server warm-up failed: {response.json()['error']}")
+        time.sleep(0.25)
+    raise RuntimeError(f"{url} not ready after {timeout:.0f}s")
+
+
+def bench_env(services: FakeServices, workdir: str, extra: list) -> dict:
+    env = services.env()
+    env.update({
+        "WARMUP_ON_START": "True",
+        # Exercise the opt-in route decision log without writing to backend/data
+        "ROUTE_DECISIONS_PATH": os.path.join(workdir, "route_decisions.jsonl"),
+    })
+    for item in extra:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+def post_agent(client: httpx.Client, url: str, payload: dict) -> bool:
+    response = client.post(f"{url}/api/agent", json=payload)
+    return response.status_code == 200 and "error" not in response.json()
+
+
+def post_stream(client: httpx.Client, url: str, payload: dict) -> bool:
+    """Read the stream to its terminal chunk; True if that was a final_result."""
+    with client.stream("POST", f"{url}/api/agent/stream", json=payload,
+                       headers={"Accept": "text/event-stream"}) as response:
+        if response.status_code != 200:
+            return False
+        for line in response.iter_lines():
+            if not line.startswith("data: "):
+                continue
+            chunk_type = json.loads(line[6:]).get("type")
+            if chunk_type == "final_result":
+                return True
+            if chunk_type == "error":
+                return False
+    return False
+
+
+ENDPOINTS = {"agent": post_agent, "stream": post_stream}
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_load(url: str, endpoint: str, prompts, total: int, concurrency: int, timeout: float) -> dict:
+    """Send `total` requests from `concurrency` client threads; returns latencies and outcomes."""
+    send = ENDPOINTS[endpoint]
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies, failures = [], []
+
+    def worker(worker_id: int):
+        with httpx.Client(timeout=timeout) as client:
+            while True:
+                with lock:
+                    index = next(counter)
+                    if index >= total:
+                        return
+                    tag, prompt = next(prompts)
+                payload = agent_payload(prompt, conversation_id=f"bench-{worker_id}")
+                start = time.perf_counter()
+                try:
+                    ok = send(client, url, payload)
+                    error = None if ok else "bad response"
+                except Exception as e:
+                    ok, error = False, f"{type(e).__name__}: {e}"
+                elapsed = time.perf_counter() - start
+                with lock:
+                    if ok:
+                        latencies.append(elapsed)
+                    else:
+                        failures.append((tag, error))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {"wall": time.perf_counter() - started, "latencies": sorted(latencies), "failures": failures}
+
+
+def summarize(endpoint: str, result: dict, cpu_seconds: float = None) -> dict:
+    latencies = result["latencies"]
+    completed = len(latencies)
+    summary = {
+        "endpoint": endpoint,
+        "requests": completed + len(result["failures"]),
+        "errors": len(result["failures"]),
+        "req_per_s": round(completed / result["wall"], 2) if result["wall"] else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "cpu_ms_per_req": round(cpu_seconds / completed * 1000, 2) if cpu_seconds is not None and completed else None,
+    }
+    if result["failures"]:
+        summary["first_error"] = result["failures"][0][1]
+    return summary
+
+
+def report(summary: dict):
+    cpu = f"{summary['cpu_ms_per_req']:8.2f}" if summary["cpu_ms_per_req"] is not None else "     n/a"
+    print(f"{summary['endpoint']:<8} n={summary['requests']:<5} err={summary['errors']:<3} "
+          f"{summary['req_per_s']:8.2f} req/s  p50={summary['p50_ms']:8.1f} ms  "
+          f"p95={summary['p95_ms']:8.1f} ms  p99={summary['p99_ms']:8.1f} ms  cpu={cpu} ms/req")
+    if summary.get("first_error"):
+        print(f"         first error: {summary['first_error']}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Measure agent API throughput against fake LLM/PSE/medical/Unmute services")
+    parser.add_argument("--server", choices=sorted(SERVER_COMMANDS), default="flask", help="server to launch")
+    parser.add_argument("--url", help="benchmark an already running server instead of launching one")
+    parser.add_argument("--server-pid", type=int, help="pid of the --url server, for CPU accounting")
+    parser.add_argument("--endpoints", default="agent,stream", help="comma-separated: agent, stream")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests per endpoint")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request client timeout (s)")
+    parser.add_argument("--routes", default="", help="route weights, e.g. TEXT=3,PATIENT=2,WEB=1 (default: realistic mix)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-ttft", type=float, default=0.2, help="fake LLM time to first token (s)")
+    parser.add_argument("--llm-tps", type=float, default=400.0, help="fake LLM tokens per second")
+    parser.add_argument("--llm-answer-tokens", type=int, default=60, help="length of free-text LLM answers")
+    parser.add_argument("--search-latency", type=float, default=0.15)
+    parser.add_argument("--medical-latency", type=float, default=0.8)
+    parser.add_argument("--unmute-chunks", type=int, default=8)
+    parser.add_argument("--unmute-chunk-interval", type=float, default=0.05)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra server settings")
+    parser.add_argument("--json", action="store_true", help="print the summaries as JSON")
+    args = parser.parse_args()
+
+    weights = parse_route_weights(args.routes) if args.routes else None
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    for endpoint in endpoints:
+        if endpoint not in ENDPOINTS:
+            parser.error(f"unknown endpoint {endpoint!r}")
+
+    services = FakeServices(
+        llm_ttft=args.llm_ttft, llm_tokens_per_second=args.llm_tps, llm_answer_tokens=args.llm_answer_tokens,
+        search_latency=args.search_latency, medical_latency=args.medical_latency,
+        unmute_chunks=args.unmute_chunks, unmute_chunk_interval=args.unmute_chunk_interval,
+    ).start()
+    workdir = tempfile.mkdtemp(prefix="futureos-bench-")
+    server = None
+    try:
+        if args.url:
+            url, pid = args.url.rstrip("/"), args.server_pid
+            print("Using running server; it must already point at fake services configured the same way")
+            wait_until_ready(url, 30)
+        else:
+            server = AgentServer(args.server, bench_env(services, workdir, args.env),
+                                 os.path.join(workdir, "server.log")).start()
+            url, pid = server.url, server.pid
+            print(f"{args.server} server on {url} (pid {pid}, log {server.log_path})")
+
+        summaries = []
+        for endpoint in endpoints:
+            prompts = prompt_sequence(weights, args.seed)
+            run_load(url, endpoint, prompts, args.warmup, args.concurrency, args.timeout)
+            cpu_before = process_cpu_seconds(pid) if pid else None
+            result = run_load(url, endpoint, prompts, args.requests, args.concurrency, args.timeout)
+            cpu = process_cpu_seconds(pid) - cpu_before if pid else None
+            summaries.append(summarize(endpoint, result, cpu))
+
+        if args.json:
+            print(json.dumps({"summaries": summaries, "fake_services": services.stats()}, indent=2))
+        else:
+            for summary in summaries:
+                report(summary)
+            print(f"fake services: {services.stats()}")
+    finally:
+        if server is not None:
+            server.stop()
+        services.stop()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for per-request graph overhead.
+
+Compares the old per-request setup (build_workflow() + draw_mermaid() + re-creating
+the LangChain tools) against the warm AgentRuntime. No LLM calls are made.
+
+Usage (from backend/):
+    python benchmarks/bench_graph_overhead.py --iterations 200
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from tools.memory_tools import create_memory_tools
+
+
+def per_request_cold():
+    workflow = main.build_workflow()
+    workflow.get_graph().draw_mermaid()
+    tools = main.create_patient_tools()
+    [{"name": t.name, "description": t.description} for t in tools]
+    {t.name: t.func for t in main.create_web_tools()}
+    {t.name: t.func for t in create_memory_tools()}
+    return workflow
+
+
+def per_request_warm():
+    runtime = main.get_runtime()
+    workflow = runtime.workflow
+    runtime.patient_tool_metadata
+    runtime.tool_funcs['web']
+    runtime.tool_funcs['memory']
+    return workflow
+
+
+def measure(fn, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:<8} mean={statistics.mean(timings):9.4f} ms  p50={statistics.median(timings):9.4f} ms  p95={p95:9.4f} ms")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Measure per-request graph setup overhead")
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    # Warm up the runtime once, as the server does on its first request
+    main.get_runtime().workflow
+
+    cold = measure(per_request_cold, args.iterations)
+    warm = measure(per_request_warm, args.iterations)
+
+    report("cold", cold)
+    report("warm", warm)
+    print(f"speedup  {statistics.mean(cold) / max(statistics.mean(warm), 1e-9):.0f}x")
+
+
+if __name__ == "__main__":
+    main_cli()
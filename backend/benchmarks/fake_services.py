@@ -0,0 +1,397 @@
+"""
+Local stand-ins for every external service the agent calls, for offline benchmarks.
+
+- FakeLLMServer: Groq/OpenAI-compatible /chat/completions with configurable time to
+  first token and token rate. Answers each prompt of the graph in the shape its parser
+  expects (route tag, NO_CONTEXT_NEEDED, tool names, structured-output tool calls...).
+- FakeSearchServer: Google Custom Search JSON API (GOOGLE_PSE_ENDPOINT).
+- FakeMedicalServer: the medical reasoning endpoint (MEDICAL_ENDPOINT_URLS).
+- FakeUnmuteServer: Unmute realtime websocket (UNMUTE_WEBSOCKET_URL) streaming text
+  and audio deltas.
+
+PROMPT_MIX lists realistic prompts per route; the fake tagger classifies by looking the
+input up in it, so a benchmark controls exactly which graph branches it exercises.
+"""
+
+import asyncio
+import base64
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# route tag -> prompts the fake tagger assigns to it
+PROMPT_MIX = {
+    "TEXT": [
+        "Hi, how are you today?",
+        "Tell me a joke about doctors",
+        "Explain how vaccines work",
+        "Add a recommendation to eat more iron rich food",
+    ],
+    "PATIENT": [
+        "What medications am I taking?",
+        "Update my age to 35",
+        "Do I have any allergies?",
+        "Add walking 30 minutes to my daily checklist",
+    ],
+    "WEB": [
+        "Latest news on diabetes research",
+        "Weather in Dubai today",
+        "Current guidance on flu vaccines this season",
+    ],
+    "MEDICAL": [
+        "Is it safe to combine ibuprofen with my blood pressure medication?",
+        "What are the contraindications for metformin?",
+    ],
+    "UI_CHANGE": [
+        "Switch to dark mode",
+        "Turn on light mode",
+    ],
+    "MODIFY_TREATMENT": [
+        "Add sleep treatment",
+        "Remove fitness treatment",
+    ],
+}
+
+# Share of traffic per route when drawing from PROMPT_MIX
+DEFAULT_ROUTE_WEIGHTS = {"TEXT": 35, "PATIENT": 25, "WEB": 15, "MEDICAL": 10, "UI_CHANGE": 10, "MODIFY_TREATMENT": 5}
+
+BENCH_PATIENT_PROFILE = {
+    "uid": "bench-001",
+    "name": "Alex Bench",
+    "age": 42,
+    "gender": "female",
+    "allergies": ["Peanuts"],
+    "treatment": [{"name": "Sleep", "medicationList": ["Melatonin"], "dailyChecklist": ["No screens after 22:00"]}],
+}
+
+
+def route_for_prompt(user_input: str) -> str:
+    """Tag of the PROMPT_MIX entry contained in the input; TEXT for anything else."""
+    for tag, prompts in PROMPT_MIX.items():
+        if any(p in user_input for p in prompts):
+            return tag
+    return "TEXT"
+
+
+def prompt_sequence(weights: dict = None, seed: int = 0):
+    """Endless (route tag, prompt) draws following the route weights."""
+    weights = weights or DEFAULT_ROUTE_WEIGHTS
+    rng = random.Random(seed)
+    tags = [t for t in weights if weights[t] > 0]
+    while True:
+        tag = rng.choices(tags, weights=[weights[t] for t in tags])[0]
+        yield tag, rng.choice(PROMPT_MIX[tag])
+
+
+def parse_route_weights(spec: str) -> dict:
+    """"TEXT=3,WEB=1" -> {"TEXT": 3.0, "WEB": 1.0}"""
+    weights = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        tag, _, weight = part.partition("=")
+        tag = tag.strip().upper()
+        if tag not in PROMPT_MIX:
+            raise ValueError(f"Unknown route {tag!r} (choose from {', '.join(PROMPT_MIX)})")
+        weights[tag] = float(weight or 1)
+    return weights
+
+
+def _schema_value(schema: dict):
+    """Smallest value satisfying a JSON schema: defaults, false, 0, "" and empty lists."""
+    if "default" in schema:
+        return schema["default"]
+    kind = schema.get("type")
+    if kind == "object":
+        return {k: _schema_value(v) for k, v in schema.get("properties", {}).items()}
+    return {"boolean": False, "integer": 0, "number": 0, "string": "", "array": []}.get(kind)
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _HTTPService:
+    """ThreadingHTTPServer on an ephemeral port, served from a daemon thread."""
+
+    handler = _QuietHandler
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        handler = type(self.handler.__name__, (self.handler,), {"service": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _LLMHandler(_QuietHandler):
+    def do_POST(self):
+        service = self.service
+        service.count()
+        request = self._read_json()
+        message, completion_tokens = service.respond(request)
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in request.get("messages", [])) // 4
+        # Prefill, then decode at the configured rate
+        time.sleep(service.ttft + completion_tokens / service.tokens_per_second)
+        self._send_json({
+            "id": f"chatcmpl-bench-{service.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "bench"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+
+class FakeLLMServer(_HTTPService):
+    """
+    Groq-compatible chat endpoint; point GROQ_BASE_URL at .url. Latency per call is
+    ttft + completion_tokens / tokens_per_second. Free-text answers are answer_tokens long.
+    """
+
+    handler = _LLMHandler
+
+    def __init__(self, ttft: float = 0.2, tokens_per_second: float = 400.0, answer_tokens: int = 60, **kwargs):
+        super().__init__(**kwargs)
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+
+    @property
+    def base_url(self) -> str:
+        # The Groq SDK appends /openai/v1/chat/completions; any POST path is served
+        return self.url
+
+    def respond(self, request: dict):
+        """(assistant message, completion tokens) for one chat completion request."""
+        messages = request.get("messages", [])
+        system = " ".join(str(m.get("content") or "") for m in messages if m.get("role") == "system")
+        user = str(messages[-1].get("content") or "") if messages else ""
+        tools = request.get("tools") or []
+
+        if tools:
+            function = tools[0]["function"]
+            arguments = json.dumps(_schema_value(function.get("parameters", {})) or {})
+            return {"role": "assistant", "content": None, "tool_calls": [{
+                "id": "call_bench", "type": "function",
+                "function": {"name": function["name"], "arguments": arguments},
+            }]}, max(1, len(arguments) // 4)
+
+        if "strict classifier" in system:
+            content = route_for_prompt(user)
+        elif "conversational context analyzer" in system:
+            content = "NO_CONTEXT_NEEDED"
+        elif "tool selector" in system:
+            content = "update_patient_profile" if "Update" in user or "Add" in user else "read_patient_profile"
+        elif "binary classifier" in system:
+            content = "no"
+        elif "UI command classifier" in system:
+            content = "setMode(light)" if "light" in user else "setMode(dark)"
+        elif "JSON Patch" in system:
+            content = "[]"
+        elif "stored in semantic memory" in user:
+            content = "false"
+        else:
+            content = " ".join(["lorem"] * self.answer_tokens)
+            return {"role": "assistant", "content": content}, self.answer_tokens
+        return {"role": "assistant", "content": content}, max(1, len(content) // 4)
+
+
+class _SearchHandler(_QuietHandler):
+    def do_GET(self):
+        self.service.count()
+        time.sleep(self.service.latency)
+        query = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+        num = int(parse_qs(urlparse(self.path).query).get("num", ["5"])[0])
+        self._send_json({"items": [
+            {"title": f"{query} result {i}", "link": f"https://example.org/{i}",
+             "snippet": f"Snippet {i} about {query}.", "displayLink": "example.org"}
+            for i in range(num)
+        ]})
+
+
+class FakeSearchServer(_HTTPService):
+    """Custom Search JSON API; point GOOGLE_PSE_ENDPOINT at .url."""
+
+    handler = _SearchHandler
+
+    def __init__(self, latency: float = 0.15, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+
+
+class _MedicalHandler(_QuietHandler):
+    def do_POST(self):
+        self.service.count()
+        self._read_json()
+        time.sleep(self.service.latency)
+        body = b"Benchmark medical answer: no known interaction, monitor blood pressure."
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeMedicalServer(_HTTPService):
+    """Medical reasoning endpoint; point MEDICAL_ENDPOINT_URLS at .endpoint."""
+
+    handler = _MedicalHandler
+
+    def __init__(self, latency: float = 0.8, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    @property
+    def endpoint(self) -> str:
+        return self.url + "/endpoint"
+
+
+class FakeUnmuteServer:
+    """
+    Unmute realtime websocket; point UNMUTE_WEBSOCKET_URL at .url. Acks session.update and
+    answers each response.create with text_chunks text deltas and as many audio deltas,
+    chunk_interval seconds apart, then the text/audio done events.
+    """
+
+    def __init__(self, text_chunks: int = 8, chunk_interval: float = 0.05, audio_bytes: int = 1920,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.text_chunks = text_chunks
+        self.chunk_interval = chunk_interval
+        self.audio = base64.b64encode(bytes(audio_bytes)).decode()
+        self.host = host
+        self.port = port
+        self.connections = 0
+        self.responses = 0
+        self.url = None
+        self._loop = None
+        self._server = None
+        self._ready = threading.Event()
+
+    async def _handler(self, websocket, path=None):
+        self.connections += 1
+        try:
+            async for raw in websocket:
+                msg = json.loads(raw)
+                if msg.get("type") == "session.update":
+                    await websocket.send(json.dumps({"type": "session.updated", "session": msg.get("session", {})}))
+                elif msg.get("type") == "response.create":
+                    self.responses += 1
+                    for i in range(self.text_chunks):
+                        await asyncio.sleep(self.chunk_interval)
+                        await websocket.send(json.dumps({"type": "unmute.response.text.delta.ready", "delta": f"word{i} "}))
+                        await websocket.send(json.dumps({"type": "response.audio.delta", "delta": self.audio}))
+                    await websocket.send(json.dumps({"type": "response.text.done"}))
+                    await websocket.send(json.dumps({"type": "response.audio.done"}))
+        except Exception:
+            pass  # client went away mid-response
+
+    def _run(self):
+        import websockets
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            websockets.serve(self._handler, self.host, self.port, subprotocols=["realtime"], max_size=None)
+        )
+        port = self._server.sockets[0].getsockname()[1]
+        self.url = f"ws://{self.host}:{port}/v1/realtime"
+        self._ready.set()
+        self._loop.run_forever()
+
+    def start(self):
+        threading.Thread(target=self._run, name="FakeUnmuteServer", daemon=True).start()
+        self._ready.wait(10)
+        return self
+
+    async def _shutdown(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def stop(self):
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(10)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+class FakeServices:
+    """All fakes together; env() is the configuration the agent server needs to use them."""
+
+    def __init__(self, llm_ttft=0.2, llm_tokens_per_second=400.0, llm_answer_tokens=60,
+                 search_latency=0.15, medical_latency=0.8, unmute_chunks=8, unmute_chunk_interval=0.05):
+        self.llm = FakeLLMServer(ttft=llm_ttft, tokens_per_second=llm_tokens_per_second, answer_tokens=llm_answer_tokens)
+        self.search = FakeSearchServer(latency=search_latency)
+        self.medical = FakeMedicalServer(latency=medical_latency)
+        self.unmute = FakeUnmuteServer(text_chunks=unmute_chunks, chunk_interval=unmute_chunk_interval)
+
+    def start(self):
+        for service in (self.llm, self.search, self.medical, self.unmute):
+            service.start()
+        return self
+
+    def stop(self):
+        for service in (self.llm, self.search, self.medical, self.unmute):
+            service.stop()
+
+    def env(self) -> dict:
+        return {
+            "GROQ_API_KEY": "bench",
+            "GROQ_BASE_URL": self.llm.base_url,
+            "GOOGLE_PSE_API_KEY": "bench",
+            "GOOGLE_PSE_CX": "bench",
+            "GOOGLE_PSE_ENDPOINT": self.search.url,
+            "MEDICAL_ENDPOINT_URLS": self.medical.endpoint,
+            "UNMUTE_WEBSOCKET_URL": self.unmute.url,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "llm_calls": self.llm.requests,
+            "search_calls": self.search.requests,
+            "medical_calls": self.medical.requests,
+            "unmute_connections": self.unmute.connections,
+            "unmute_responses": self.unmute.responses,
+        }
+
+
+def agent_payload(prompt: str, conversation_id: str = "bench-conv") -> dict:
+    """/api/agent(/stream) request body for one prompt."""
+    return {
+        "prompt": prompt,
+        "patientProfile": json.loads(json.dumps(BENCH_PATIENT_PROFILE)),
+        "memory": [],
+        "conversation": {"cid": conversation_id, "tags": [], "conversation": []},
+    }
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Import-time profile for backend startup.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter, prints the
+slowest imports (cumulative) and exits non-zero when the total exceeds the budget,
+so it can be used as a CI/startup gate.
+
+Usage (from backend/):
+    python benchmarks/import_profile.py                  # profiles `import api`
+    python benchmarks/import_profile.py --module main --top 15 --budget-ms 2000
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from config.settings import settings
+
+LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_imports(module: str) -> list:
+    env = dict(os.environ, WARMUP_ON_START="False")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        tail = "\n".join(proc.stderr.strip().splitlines()[-5:])
+        raise SystemExit(f"Importing {module} failed:\n{tail}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append({
+                "module": name,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+                "depth": len(indent) // 2
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import time of the backend entry point")
+    parser.add_argument("--module", default="api")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=settings.STARTUP_IMPORT_BUDGET_MS)
+    args = parser.parse_args()
+
+    rows = profile_imports(args.module)
+    total = next((r["cumulative_ms"] for r in reversed(rows) if r["module"] == args.module), 0.0)
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for row in sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:args.top]:
+        print(f"{row['cumulative_ms']:>14.1f} {row['self_ms']:>9.1f}  {row['module']}")
+
+    print(f"\nimport {args.module}: {total:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if total > args.budget_ms:
+        print("OVER BUDGET")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Concurrent SSE load generator and conformance tester for /api/agent/stream.
+
+Opens --concurrency parallel streams (--streams in total) with prompts drawn from the
+route mix in fake_services.py and measures, per stream:
+- time to first chunk (first non-keepalive event) and to the terminal chunk
+- gaps between consecutive events, and the longest stall
+- keepalive events and their share of the bytes sent
+- completion: did the stream end with final_result, error, or neither
+
+Every stream is also checked against the streaming contract: HTTP 200, a
+text/event-stream body of JSON events with a "type", and exactly one final_result or
+error, sent last. Violations are listed and make the exit status non-zero.
+
+By default the fake LLM/PSE/medical/Unmute services and a server subprocess are started
+as in bench_agent_throughput.py; --url targets any running server instead (for
+capacity planning against real backends).
+
+Usage (from backend/):
+    python benchmarks/sse_load.py --concurrency 32 --streams 200
+    python benchmarks/sse_load.py --server asgi --routes MEDICAL=1,WEB=1 --medical-latency 3
+    python benchmarks/sse_load.py --url http://127.0.0.1:5100 --concurrency 64 --streams 500
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_agent_throughput import (
+    SERVER_COMMANDS, AgentServer, bench_env, percentile, process_cpu_seconds, wait_until_ready
+)
+from benchmarks.fake_services import FakeServices, agent_payload, parse_route_weights, prompt_sequence
+
+TERMINAL_TYPES = ("final_result", "error")
+
+
+class StreamRecord:
+    """What one client saw on one stream; event times are seconds since the request was sent."""
+
+    def __init__(self, route: str, prompt: str):
+        self.route = route
+        self.prompt = prompt
+        self.status = None
+        self.content_type = ""
+        self.events: List[tuple] = []  # (time, type, bytes); type None for a malformed event
+        self.transport_error: Optional[str] = None
+        self.duration = 0.0
+
+    @property
+    def types(self) -> list:
+        return [e[1] for e in self.events]
+
+    @property
+    def outcome(self) -> str:
+        """final_result, error, or incomplete (no terminal chunk)."""
+        terminals = [t for t in self.types if t in TERMINAL_TYPES]
+        return terminals[0] if terminals else "incomplete"
+
+    def first_chunk(self) -> Optional[float]:
+        return next((t for t, kind, _ in self.events if kind != "keepalive"), None)
+
+    def gaps(self) -> list:
+        times = [t for t, _, _ in self.events]
+        return [b - a for a, b in zip(times, times[1:])]
+
+
+def parse_sse_event(block: str):
+    """(type, raw data) of one SSE event block; type None if its data isn't a JSON object with a type."""
+    data = "\n".join(line[5:].lstrip() for line in block.splitlines() if line.startswith("data:"))
+    try:
+        chunk = json.loads(data)
+    except ValueError:
+        return None, data
+    return (chunk.get("type") if isinstance(chunk, dict) else None), data
+
+
+def check_stream(record: StreamRecord) -> List[str]:
+    """Contract violations of one stream (empty list if it conforms)."""
+    if record.transport_error and not record.events:
+        return [f"transport error before any event: {record.transport_error}"]
+    violations = []
+    if record.status != 200:
+        violations.append(f"HTTP {record.status}")
+    if "text/event-stream" not in record.content_type:
+        violations.append(f"content-type {record.content_type!r}")
+    types = record.types
+    malformed = types.count(None)
+    if malformed:
+        violations.append(f"{malformed} malformed event(s)")
+    terminals = [i for i, kind in enumerate(types) if kind in TERMINAL_TYPES]
+    if not terminals:
+        reason = f" ({record.transport_error})" if record.transport_error else ""
+        violations.append(f"ended without final_result or error{reason}")
+    elif len(terminals) > 1:
+        violations.append(f"{len(terminals)} terminal chunks: {[types[i] for i in terminals]}")
+    elif terminals[0] != len(types) - 1:
+        violations.append(f"{len(types) - 1 - terminals[0]} event(s) after {types[terminals[0]]}")
+    return violations
+
+
+async def run_stream(client: httpx.AsyncClient, url: str, route: str, prompt: str, conversation_id: str) -> StreamRecord:
+    record = StreamRecord(route, prompt)
+    start = time.perf_counter()
+    try:
+        async with client.stream("POST", f"{url}/api/agent/stream", json=agent_payload(prompt, conversation_id),
+                                 headers={"Accept": "text/event-stream"}) as response:
+            record.status = response.status_code
+            record.content_type = response.headers.get("content-type", "")
+            buffer = ""
+            # Read the whole body, not just up to the terminal chunk, so trailing events are caught
+            async for text in response.aiter_text():
+                buffer += text
+                while "\n\n" in buffer:
+                    block, buffer = buffer.split("\n\n", 1)
+                    if not block.strip():
+                        continue
+                    kind, _ = parse_sse_event(block)
+                    record.events.append((time.perf_counter() - start, kind, len(block) + 2))
+            if buffer.strip():
+                kind, _ = parse_sse_event(buffer)
+                record.events.append((time.perf_counter() - start, kind, len(buffer)))
+    except Exception as e:
+        record.transport_error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+    record.duration = time.perf_counter() - start
+    return record
+
+
+async def run_streams(url: str, prompts, total: int, concurrency: int, timeout: float) -> tuple:
+    """Open `total` streams, at most `concurrency` at a time; returns (records, wall seconds)."""
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait((i, *next(prompts)))
+    records: List[StreamRecord] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=httpx.Timeout(timeout, connect=10), limits=limits) as client:
+        async def worker():
+            while not queue.empty():
+                index, route, prompt = queue.get_nowait()
+                records.append(await run_stream(client, url, route, prompt, f"sse-load-{index}"))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return records, time.perf_counter() - started
+
+
+def _ms(values: list) -> dict:
+    values = sorted(values)
+    return {
+        "p50": round(percentile(values, 50) * 1000, 1),
+        "p95": round(percentile(values, 95) * 1000, 1),
+        "p99": round(percentile(values, 99) * 1000, 1),
+        "max": round(values[-1] * 1000, 1) if values else 0.0,
+    }
+
+
+def summarize(records: List[StreamRecord], wall: float) -> dict:
+    outcomes = defaultdict(int)
+    for r in records:
+        outcomes[r.outcome] += 1
+    events = [e for r in records for e in r.events]
+    keepalives = [e for e in events if e[1] == "keepalive"]
+    total_bytes = sum(e[2] for e in events)
+
+    by_route = {}
+    for route in sorted({r.route for r in records}):
+        subset = [r for r in records if r.route == route]
+        by_route[route] = {
+            "streams": len(subset),
+            "completion_rate": round(sum(r.outcome == "final_result" for r in subset) / len(subset), 3),
+            "ttfc_p50_ms": _ms([r.first_chunk() for r in subset if r.first_chunk() is not None])["p50"],
+            "duration_p50_ms": _ms([r.duration for r in subset])["p50"],
+            "keepalives_per_stream": round(sum(r.types.count("keepalive") for r in subset) / len(subset), 2),
+        }
+
+    violations = [(r, check_stream(r)) for r in records]
+    violations = [(r, v) for r, v in violations if v]
+    return {
+        "streams": len(records),
+        "streams_per_s": round(len(records) / wall, 2) if wall else 0.0,
+        "final_result": outcomes["final_result"],
+        "error": outcomes["error"],
+        "incomplete": outcomes["incomplete"],
+        "completion_rate": round(outcomes["final_result"] / len(records), 3) if records else 0.0,
+        "time_to_first_chunk_ms": _ms([r.first_chunk() for r in records if r.first_chunk() is not None]),
+        "time_to_terminal_ms": _ms([r.duration for r in records if r.outcome != "incomplete"]),
+        "inter_chunk_gap_ms": _ms([g for r in records for g in r.gaps()]),
+        "longest_stall_ms": _ms([max(r.gaps()) for r in records if r.gaps()]),
+        "events_per_stream": round(len(events) / len(records), 1) if records else 0.0,
+        "keepalive": {
+            "events": len(keepalives),
+            "share_of_events": round(len(keepalives) / len(events), 3) if events else 0.0,
+            "bytes": sum(e[2] for e in keepalives),
+            "share_of_bytes": round(sum(e[2] for e in keepalives) / total_bytes, 4) if total_bytes else 0.0,
+        },
+        "by_route": by_route,
+        "conformance_violations": len(violations),
+        "violation_examples": [
+            {"route": r.route, "prompt": r.prompt, "violations": v, "types": r.types[-5:]} for r, v in violations[:5]
+        ],
+    }
+
+
+def report(summary: dict):
+    def line(name, stats):
+        print(f"  {name:<22} p50={stats['p50']:8.1f}  p95={stats['p95']:8.1f}  p99={stats['p99']:8.1f}  max={stats['max']:8.1f} ms")
+
+    print(f"streams={summary['streams']}  {summary['streams_per_s']} streams/s  "
+          f"completion={summary['completion_rate']:.1%}  (final_result={summary['final_result']} "
+          f"error={summary['error']} incomplete={summary['incomplete']})")
+    line("time to first chunk", summary["time_to_first_chunk_ms"])
+    line("time to terminal", summary["time_to_terminal_ms"])
+    line("inter-chunk gap", summary["inter_chunk_gap_ms"])
+    line("longest stall", summary["longest_stall_ms"])
+    keepalive = summary["keepalive"]
+    print(f"  events/stream={summary['events_per_stream']}  keepalives={keepalive['events']} "
+          f"({keepalive['share_of_events']:.1%} of events, {keepalive['bytes']} B = {keepalive['share_of_bytes']:.2%} of bytes)")
+    if "cpu_ms_per_stream" in summary:
+        print(f"  server cpu={summary['cpu_ms_per_stream']} ms/stream")
+    for route, stats in summary["by_route"].items():
+        print(f"  {route:<17} n={stats['streams']:<5} completion={stats['completion_rate']:.1%}  "
+              f"ttfc p50={stats['ttfc_p50_ms']:.1f} ms  duration p50={stats['duration_p50_ms']:.1f} ms  "
+              f"keepalives/stream={stats['keepalives_per_stream']}")
+    print(f"conformance violations: {summary['conformance_violations']}")
+    for example in summary["violation_examples"]:
+        print(f"  [{example['route']}] {example['prompt']!r}: {'; '.join(example['violations'])} (last events {example['types']})")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Load and conformance test for /api/agent/stream")
+    parser.add_argument("--server", choices=sorted(SERVER_COMMANDS), default="flask", help="server to launch")
+    parser.add_argument("--url", help="test an already running server instead of launching one with fakes")
+    parser.add_argument("--server-pid", type=int, help="pid of the --url server, for CPU accounting")
+    parser.add_argument("--concurrency", type=int, default=16, help="parallel open streams")
+    parser.add_argument("--streams", type=int, default=100, help="streams in total")
+    parser.add_argument("--warmup", type=int, default=8, help="unmeasured streams before the run")
+    parser.add_argument("--timeout", type=float, default=60.0, help="client read timeout (s); a stalled stream fails")
+    parser.add_argument("--routes", default="", help="route weights, e.g. TEXT=3,MEDICAL=1 (default: realistic mix)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-ttft", type=float, default=0.2, help="fake LLM time to first token (s)")
+    parser.add_argument("--llm-tps", type=float, default=400.0, help="fake LLM tokens per second")
+    parser.add_argument("--search-latency", type=float, default=0.15)
+    parser.add_argument("--medical-latency", type=float, default=0.8)
+    parser.add_argument("--unmute-chunks", type=int, default=8)
+    parser.add_argument("--unmute-chunk-interval", type=float, default=0.05)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra server settings")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    weights = parse_route_weights(args.routes) if args.routes else None
+    services = server = None
+    workdir = tempfile.mkdtemp(prefix="futureos-sse-")
+    try:
+        if args.url:
+            url, pid = args.url.rstrip("/"), args.server_pid
+            wait_until_ready(url, 30)
+        else:
+            services = FakeServices(
+                llm_ttft=args.llm_ttft, llm_tokens_per_second=args.llm_tps,
+                search_latency=args.search_latency, medical_latency=args.medical_latency,
+                unmute_chunks=args.unmute_chunks, unmute_chunk_interval=args.unmute_chunk_interval,
+            ).start()
+            server = AgentServer(args.server, bench_env(services, workdir, args.env),
+                                 os.path.join(workdir, "server.log")).start()
+            url, pid = server.url, server.pid
+            print(f"{args.server} server on {url} (pid {pid}, log {server.log_path})")
+
+        prompts = prompt_sequence(weights, args.seed)
+        if args.warmup:
+            asyncio.run(run_streams(url, prompts, args.warmup, min(args.concurrency, args.warmup), args.timeout))
+        cpu_before = process_cpu_seconds(pid) if pid else None
+        records, wall = asyncio.run(run_streams(url, prompts, args.streams, args.concurrency, args.timeout))
+        summary = summarize(records, wall)
+        if pid and records:
+            summary["cpu_ms_per_stream"] = round((process_cpu_seconds(pid) - cpu_before) / len(records) * 1000, 2)
+
+        if args.json:
+            print(json.dumps(summary, indent=2))
+        else:
+            report(summary)
+    finally:
+        if server is not None:
+            server.stop()
+        if services is not None:
+            services.stop()
+    sys.exit(1 if summary["conformance_violations"] else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
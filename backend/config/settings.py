@@ -10,10 +10,15 @@ class Settings:
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     GOOGLE_PSE_API_KEY = os.getenv("GOOGLE_PSE_API_KEY")
     GOOGLE_PSE_CX = os.getenv("GOOGLE_PSE_CX")  # Custom Search Engine ID
+    GOOGLE_PSE_ENDPOINT = os.getenv("GOOGLE_PSE_ENDPOINT", "")  # Override the Custom Search API base URL (e.g. a local fake server)
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     
     # Database
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///data/database.db")
+
+    # Session Store (see utils/session_store.py); "" = stateless API, full state on every request
+    SESSION_STORE = os.getenv("SESSION_STORE", "")  # "", "memory" or "sqlite" (stored in DATABASE_URL)
+    SESSION_MEMORY_MAX_SESSIONS = int(os.getenv("SESSION_MEMORY_MAX_SESSIONS", "10000"))
     
     # RAG Settings
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -44,17 +49,73 @@ class Settings:
     MAX_RETRIES = int(os.getenv("MAX_RETRIES", "3"))
     RETRY_DELAY = float(os.getenv("RETRY_DELAY", "2.0"))
     RETRY_BACKOFF = float(os.getenv("RETRY_BACKOFF", "2.0"))
-    
+
+    # LLM Client Pool Settings (shared keep-alive connections, see utils/llm_registry.py)
+    LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "50"))
+    LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "20"))
+    LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "60.0"))
+    LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60.0"))
+
     # LangGraph Settings
     MAX_ITERATIONS = 5  # Reduced to prevent loops
     VERBOSE = False
+
+    # Routing Settings
+    SPECULATIVE_TAGGING = os.getenv("SPECULATIVE_TAGGING", "True") == "True"  # Tag the raw input while the context analysis runs
+    SPECULATIVE_TAGGING_WORKERS = int(os.getenv("SPECULATIVE_TAGGING_WORKERS", "8"))
+    ROUTE_CACHE_ENABLED = os.getenv("ROUTE_CACHE_ENABLED", "True") == "True"  # Reuse tagger decisions for repeated inputs
+    ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", "4096"))
+    ROUTE_CACHE_TTL = float(os.getenv("ROUTE_CACHE_TTL", "3600"))  # seconds
+    LOCAL_ROUTER_ENABLED = os.getenv("LOCAL_ROUTER_ENABLED", "True") == "True"  # Answer confident routes in-process (see utils/local_router.py)
+    LOCAL_ROUTER_THRESHOLD = float(os.getenv("LOCAL_ROUTER_THRESHOLD", "0.85"))  # below this confidence the LLM tagger decides
+    LOCAL_ROUTER_MIN_EXAMPLES = int(os.getenv("LOCAL_ROUTER_MIN_EXAMPLES", "5"))  # logged decisions a tag needs before it can be predicted
+    LOCAL_ROUTER_TEMPERATURE = float(os.getenv("LOCAL_ROUTER_TEMPERATURE", "0.05"))  # softmax temperature over centroid similarities
+    LOCAL_ROUTER_MAX_EXAMPLES = int(os.getenv("LOCAL_ROUTER_MAX_EXAMPLES", "5000"))  # most recent logged decisions loaded at startup
+    ROUTE_DECISIONS_PATH = os.getenv("ROUTE_DECISIONS_PATH", "")  # Opt-in JSONL log of tagger decisions (input hashes + embeddings, never raw text), e.g. data/route_decisions.jsonl
+    ROUTE_DECISIONS_MAX_BYTES = int(os.getenv("ROUTE_DECISIONS_MAX_BYTES", str(20 * 1024 * 1024)))  # Rotate the log to <path>.1 past this size
+
+    # Web Search Settings (see modules/web_operations.py and utils/search_cache.py)
+    WEB_SEARCH_TIMEOUT = float(os.getenv("WEB_SEARCH_TIMEOUT", "10"))
+    WEB_SEARCH_CACHE_ENABLED = os.getenv("WEB_SEARCH_CACHE_ENABLED", "True") == "True"  # Reuse results of identical (normalized) queries
+    WEB_SEARCH_CACHE_SIZE = int(os.getenv("WEB_SEARCH_CACHE_SIZE", "1024"))
+    WEB_SEARCH_TTL_REALTIME = float(os.getenv("WEB_SEARCH_TTL_REALTIME", "60"))  # seconds; prices, scores, "now"
+    WEB_SEARCH_TTL_WEATHER = float(os.getenv("WEB_SEARCH_TTL_WEATHER", "1800"))
+    WEB_SEARCH_TTL_NEWS = float(os.getenv("WEB_SEARCH_TTL_NEWS", "600"))
+    WEB_SEARCH_TTL_DEFAULT = float(os.getenv("WEB_SEARCH_TTL_DEFAULT", "21600"))
+    WEB_SEARCH_TTL_EMPTY = float(os.getenv("WEB_SEARCH_TTL_EMPTY", "30"))  # seconds; empty results (often quota/transient errors), 0 = never cache
+
+    # Medical Reasoning Endpoint (see utils/medical_client.py)
+    MEDICAL_ENDPOINT_URLS = os.getenv("MEDICAL_ENDPOINT_URLS", "http://172.22.225.49:8000/endpoint")  # comma-separated; extra URLs are used for failover/hedging
+    MEDICAL_DEADLINE = float(os.getenv("MEDICAL_DEADLINE", "5"))  # total seconds per MEDICAL turn, retries included
+    MEDICAL_ATTEMPT_TIMEOUT = float(os.getenv("MEDICAL_ATTEMPT_TIMEOUT", "5"))  # per attempt, capped by the time left
+    MEDICAL_MAX_ATTEMPTS = int(os.getenv("MEDICAL_MAX_ATTEMPTS", "3"))
+    MEDICAL_RETRY_BACKOFF = float(os.getenv("MEDICAL_RETRY_BACKOFF", "0.2"))  # seconds, doubled per retry (jittered)
+    MEDICAL_HEDGE_DELAY = float(os.getenv("MEDICAL_HEDGE_DELAY", "0"))  # seconds before the request is also sent to the next endpoint; 0 = off
+    MEDICAL_BREAKER_THRESHOLD = int(os.getenv("MEDICAL_BREAKER_THRESHOLD", "5"))  # consecutive failures that open an endpoint's circuit
+    MEDICAL_BREAKER_RESET = float(os.getenv("MEDICAL_BREAKER_RESET", "30"))  # seconds before a half-open probe is allowed
+    MEDICAL_POOL_MAX_CONNECTIONS = int(os.getenv("MEDICAL_POOL_MAX_CONNECTIONS", "20"))
+
+    # Profile Update Settings
+    CHANGE_SUMMARY_TEMPLATES = os.getenv("CHANGE_SUMMARY_TEMPLATES", "True") == "True"  # Phrase common profile changes without an LLM call (see utils/change_summary.py)
     
     # Debug Settings
     DEBUG = os.getenv("DEBUG", "False") == "True"
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    DEBUG_GRAPH = os.getenv("DEBUG_GRAPH", "False") == "True"  # Print the workflow mermaid diagram when the graph is compiled
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "True") == "True"  # Per-node spans, /metrics and the optional "timing" stream chunk (see utils/tracing.py)
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # Bearer token for admin endpoints (POST /api/runtime/reload); empty = admin endpoints disabled
+
+    # Startup Settings
+    WARMUP_ON_START = os.getenv("WARMUP_ON_START", "True") == "True"  # Load graph, LLM clients and embeddings in the background at startup (otherwise on the first /ready probe)
+    WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "30"))  # A failed warm-up is retried by /ready after this long
+    STARTUP_IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "3000"))  # Used by benchmarks/import_profile.py
     
     # Memory Configuration (Curor Memory System)
-    MEMORY_WINDOW_SIZE = int(os.getenv("MEMORY_WINDOW_SIZE", "10"))
+    MEMORY_WINDOW_SIZE = int(os.getenv("MEMORY_WINDOW_SIZE", "10"))  # Conversation messages kept verbatim for the context analyzer
+    CONVERSATION_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1500"))  # Approximate tokens of history in the context prompt (see utils/conversation_window.py)
+    CONVERSATION_SUMMARY_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "300"))  # Rolling summary size for messages outside the window
+    CONVERSATION_SUMMARY_LLM = os.getenv("CONVERSATION_SUMMARY_LLM", "True") == "True"  # Summarize with the LLM in the background; False = first-sentence extracts only
+    CONVERSATION_SUMMARY_CACHE_SIZE = int(os.getenv("CONVERSATION_SUMMARY_CACHE_SIZE", "1000"))  # Conversations (cids) whose summary is cached
     PERSISTENT_MEMORY = os.getenv("PERSISTENT_MEMORY", "false").lower() == "true"
     MEMORY_FILE_PATH = os.getenv("MEMORY_FILE_PATH", os.path.join(BASE_DIR, "data", "conversation_memory.json"))
     
@@ -64,12 +125,47 @@ class Settings:
     PROCEDURAL_MEMORY_ENABLED = True
     MEMORY_RETRIEVAL_K = 5
     MEMORY_SIMILARITY_THRESHOLD = 0.5
+    MEMORY_PRECHECK_STRUCTURED = os.getenv("MEMORY_PRECHECK_STRUCTURED", "True") == "True"  # One structured LLM call for the memory precheck
+
+    # Semantic memory compaction (see utils/memory_compaction.py)
+    MEMORY_COMPACTION = os.getenv("MEMORY_COMPACTION", "inline")  # inline (on every write) | batch (python -m utils.memory_compaction) | off
+    MEMORY_DEDUP_THRESHOLD = float(os.getenv("MEMORY_DEDUP_THRESHOLD", "0.92"))  # cosine similarity at which two memories are the same fact
+    MEMORY_MAX_ITEMS = int(os.getenv("MEMORY_MAX_ITEMS", "500"))  # per patient; 0 = unlimited
+    MEMORY_RECENCY_HALF_LIFE_DAYS = float(os.getenv("MEMORY_RECENCY_HALF_LIFE_DAYS", "30"))  # age at which a memory's retention score halves
+
+    # Embedding cache for semantic memory search (see utils/embedding_cache.py)
+    EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    EMBEDDING_MATRIX_CACHE_SIZE = int(os.getenv("EMBEDDING_MATRIX_CACHE_SIZE", "64"))
+
+    # Shared embedding service (see embedding_service.py); empty = load the model in-process
+    EMBEDDING_SERVICE_URL = os.getenv("EMBEDDING_SERVICE_URL", "")  # e.g. http://127.0.0.1:5200 or unix:///tmp/futureos-embed.sock
+    EMBEDDING_SERVICE_TIMEOUT = float(os.getenv("EMBEDDING_SERVICE_TIMEOUT", "10.0"))
+    EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))
+    EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+
+    # Vector index for semantic memory search (see utils/vector_index.py)
+    VECTOR_INDEX = os.getenv("VECTOR_INDEX", "auto")  # auto | brute | ivf
+    ANN_INDEX_THRESHOLD = int(os.getenv("ANN_INDEX_THRESHOLD", "2000"))  # memories before "auto" switches to IVF
+    ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))  # IVF buckets, 0 = sqrt(n)
+    ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))  # buckets scanned per query (higher = better recall, slower)
+    ANN_KMEANS_ITERATIONS = int(os.getenv("ANN_KMEANS_ITERATIONS", "10"))
+    ANN_RETRAIN_GROWTH = float(os.getenv("ANN_RETRAIN_GROWTH", "2.0"))  # retrain centroids when the index doubles
+    ANN_MAX_PATIENTS = int(os.getenv("ANN_MAX_PATIENTS", "256"))  # per-patient indexes kept in memory
 
     # Memory base path for CurorMemorySystem
     MEMORY_BASE_PATH = os.path.join(DOCS_FOLDER, "memory")
     
     # Unmute Integration
     UNMUTE_WEBSOCKET_URL = os.getenv("UNMUTE_WEBSOCKET_URL", "ws://172.22.225.138:11000/v1/realtime")
+    UNMUTE_CONNECT_TIMEOUT = float(os.getenv("UNMUTE_CONNECT_TIMEOUT", "5"))
+    UNMUTE_SESSION_ACK_TIMEOUT = float(os.getenv("UNMUTE_SESSION_ACK_TIMEOUT", "1"))  # max wait for session.updated before prompting
+
+    # Unmute session pool (see utils/unmute_pool.py); 0 = connect per response
+    UNMUTE_POOL_SIZE = int(os.getenv("UNMUTE_POOL_SIZE", "2"))  # sessions kept connected and initialized
+    UNMUTE_POOL_MAX_SESSIONS = int(os.getenv("UNMUTE_POOL_MAX_SESSIONS", "32"))  # cap on open sessions
+    UNMUTE_POOL_LEASE_TIMEOUT = float(os.getenv("UNMUTE_POOL_LEASE_TIMEOUT", "10"))  # wait for a session at the cap
+    UNMUTE_POOL_MAX_IDLE_SECONDS = float(os.getenv("UNMUTE_POOL_MAX_IDLE_SECONDS", "60"))
+    UNMUTE_POOL_REUSE_SESSIONS = os.getenv("UNMUTE_POOL_REUSE_SESSIONS", "False") == "True"  # sessions keep conversation history
 
 # Agent mode: set to 'chat' for CLI, 'server' for API integration
 AGENT_MODE = "chat"
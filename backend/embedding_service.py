@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Local embedding sidecar: one SentenceTransformer copy per host, shared by all
+backend workers. Concurrent /embed requests are micro-batched before encoding.
+
+Run (from backend/):
+    python embedding_service.py --port 5200
+    python embedding_service.py --socket /tmp/futureos-embed.sock
+and point the workers at it with EMBEDDING_SERVICE_URL=http://127.0.0.1:5200
+(or unix:///tmp/futureos-embed.sock).
+"""
+
+import argparse
+import base64
+import numpy as np
+from flask import Flask, request, jsonify
+from sentence_transformers import SentenceTransformer
+from config.settings import settings
+from utils.micro_batcher import MicroBatcher
+
+app = Flask(__name__)
+
+model = SentenceTransformer(settings.EMBEDDING_MODEL)
+
+def encode_batch(texts: list) -> np.ndarray:
+    return model.encode(
+        texts,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        batch_size=settings.EMBEDDING_BATCH_MAX_SIZE
+    ).astype(np.float32)
+
+batcher = MicroBatcher(encode_batch)
+
+@app.route("/embed", methods=["POST"])
+def embed_endpoint():
+    data = request.get_json(silent=True) or {}
+    texts = data.get("texts")
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        return jsonify({"error": "'texts' must be a list of strings."}), 400
+    vectors = batcher.encode(texts, timeout=settings.EMBEDDING_SERVICE_TIMEOUT)
+    return jsonify({
+        "count": len(texts),
+        "dim": int(vectors.shape[1]) if len(texts) else 0,
+        # Raw little-endian float32, base64 encoded (much smaller than JSON float lists)
+        "data": base64.b64encode(np.ascontiguousarray(vectors, dtype="<f4").tobytes()).decode("ascii")
+    })
+
+@app.route("/stats", methods=["GET"])
+def stats_endpoint():
+    return jsonify({"model": settings.EMBEDDING_MODEL, "batcher": batcher.stats()})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared embedding service with micro-batching")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5200)
+    parser.add_argument("--socket", help="Listen on a Unix socket instead of host:port")
+    args = parser.parse_args()
+    if args.socket:
+        app.run(host=f"unix://{args.socket}", threaded=True)
+    else:
+        app.run(host=args.host, port=args.port, threaded=True)
@@ -2,31 +2,34 @@
 
 import os
 import json
-from typing import Optional, Any, Dict, TypedDict
+import asyncio
+import contextvars
+from typing import Optional, Any, Dict, Tuple, TypedDict
 from config.settings import settings
 from tools.patient_tools import create_patient_tools
 from tools.web_tools import create_web_tools
 from utils.logging_config import logger
-from langchain_groq import ChatGroq
-from langchain_ollama import ChatOllama
+from utils.llm_registry import get_llm, get_async_llm, llm_registry
+from utils.route_cache import route_cache
+from utils.local_router import LocalRouter, RouteDecisionLog
+from utils.background_loop import BackgroundLoop
+from utils.structural_diff import diff_documents
+from utils.change_summary import render_changes
+from utils.conversation_window import conversation_window
+from utils.medical_client import create_medical_client
+from utils.unmute_pool import UnmuteSessionPool, PooledSession, await_session_updated
+from utils.tracing import traced, request_trace, agent_metrics
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
-import requests
 from datetime import datetime
-import websockets
-from langchain_core.runnables.graph_mermaid import draw_mermaid_png
-from IPython.display import Image, display
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 
-# --- Global streaming function ---
-def send_streaming_chunk(chunk_type: str, data: dict):
-    """
-    Send a streaming chunk to the frontend.
-    This function is overridden by the API layer for streaming responses.
-    """
-    # Default implementation - does nothing
-    # The API layer will replace this function during streaming
-    pass
+# --- Streaming: chunks go to the channel the API layer opened for the current request ---
+from utils.streaming import send_streaming_chunk
 
 # --- Websocket function to send messages to Unmute ---
 def send_message_to_unmute(text: str, patient_profile: dict) -> bool:
@@ -35,23 +38,18 @@ def send_message_to_unmute(text: str, patient_profile: dict) -> bool:
     Returns True if successful, False otherwise.
     """
     try:
-        # Get Unmute websocket URL from settings or use default
-        unmute_url = getattr(settings, "UNMUTE_WEBSOCKET_URL", "ws://localhost:11002/v1/realtime")
-        
-        import asyncio
-        
         async def send_message():
-            async with websockets.connect(unmute_url, subprotocols=['realtime']) as websocket:
+            async with unmute_session() as session:
                 message = {
                     "type": "conversation.item.input_text",
                     "text": text,
                     "patientProfile": patient_profile
                 }
                 
-                await websocket.send(json.dumps(message))
+                await session.websocket.send(json.dumps(message))
         
-        # Run the async function
-        asyncio.run(send_message())
+        # Run on the shared Unmute loop (no new event loop per call)
+        unmute_loop.run(send_message())
         
         print(f"DEBUG - Successfully sent message to Unmute: {text}")
         return True
@@ -73,23 +71,29 @@ class AgentState(TypedDict):
     error: Optional[str]
     insights: Optional[str]
     route_tag: Optional[str]
+    speculative_route: Optional[dict]
     function: Optional[str]
 
+# --- Prompt templates (built once at import, shared by all requests) ---
+TOOL_SELECTOR_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", (
+        "You are a tool selector for an AI agent. Given a user input, select the most appropriate tool "
+        "to run from the following list. Use the descriptions to understand the purpose of each tool.\n\n"
+        "Available tools:\n"
+        "{tool_list}\n\n"
+        "Return ONLY the tool name.\n\n"
+        "EXAMPLES:\n"
+        "User: What is my name?\nOutput: read_patient_profile\n"
+        "User: Update my age to 35\nOutput: update_patient_profile\n"
+        "User: I usually sleep 8 hours every night\nOutput: update_patient_profile\n"
+        "User: What are my medications?\nOutput: read_patient_profile\n"
+    )),
+    ("human", "User input: {user_input}")
+])
+
 def select_tool_llm(user_input: str, tool_metadata: list[dict]) -> str:
     """Use an LLM to select the best tool based on user input and tool descriptions."""
-    if getattr(settings, "USE_OLLAMA", False):
-        llm = ChatOllama(
-            model=settings.OLLAMA_MODEL,
-            base_url=settings.OLLAMA_BASE_URL,
-            temperature=0.3
-        )
-    else:
-        llm = ChatGroq(
-            model=settings.LLM_MODEL,
-            temperature=0.3
-        )
-
-    from langchain_core.prompts import ChatPromptTemplate
+    llm = get_llm(temperature=0.3)
 
     # Build tool list string for the prompt
     tool_list_str = "\n".join(
@@ -97,23 +101,7 @@ def select_tool_llm(user_input: str, tool_metadata: list[dict]) -> str:
     )
     tool_names = [tool['name'] for tool in tool_metadata]
 
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", (
-            "You are a tool selector for an AI agent. Given a user input, select the most appropriate tool "
-            "to run from the following list. Use the descriptions to understand the purpose of each tool.\n\n"
-            "Available tools:\n"
-            "{tool_list}\n\n"
-            "Return ONLY the tool name.\n\n"
-            "EXAMPLES:\n"
-            "User: What is my name?\nOutput: read_patient_profile\n"
-            "User: Update my age to 35\nOutput: update_patient_profile\n"
-            "User: I usually sleep 8 hours every night\nOutput: update_patient_profile\n"
-            "User: What are my medications?\nOutput: read_patient_profile\n"
-        )),
-        ("human", "User input: {user_input}")
-    ])
-
-    chain = prompt | llm
+    chain = TOOL_SELECTOR_PROMPT | llm
     result = chain.invoke({
         "user_input": user_input,
         "tool_list": tool_list_str
@@ -138,110 +126,59 @@ def text_node(state: AgentState) -> AgentState:
 
 # --- Helper functions for change tracking ---
 def deep_compare_dicts(before: dict, after: dict, path: str = "") -> list:
-    """Recursively compare two dictionaries and return list of changes"""
-    changes = []
-    
-    # Get all keys from both dictionaries (top-level keys are the same)
-    all_keys = before.keys()
-    
-    for key in all_keys:
-        current_path = f"{path}.{key}" if path else key
-        before_val = before.get(key)
-        after_val = after.get(key)
-        
-        # Compare values
-        if isinstance(before_val, dict) and isinstance(after_val, dict):
-            # Recursively compare nested dictionaries
-            nested_changes = deep_compare_dicts(before_val, after_val, current_path)
-            changes.extend(nested_changes)
-        elif isinstance(before_val, list) and isinstance(after_val, list):
-            # Compare lists by length and content
-            if len(before_val) != len(after_val) or before_val != after_val:
-                # Determine if it's an addition or removal based on length
-                if len(after_val) > len(before_val):
-                    changes.append({
-                        "path": current_path,
-                        "before": before_val,
-                        "after": after_val,
-                        "type": "added"
-                    })
-                elif len(after_val) < len(before_val):
-                    changes.append({
-                        "path": current_path,
-                        "before": before_val,
-                        "after": after_val,
-                        "type": "removed"
-                    })
-                else:
-                    # Same length but different content (modified)
-                    changes.append({
-                        "path": current_path,
-                        "before": before_val,
-                        "after": after_val,
-                        "type": "modified"
-                    })
-        else:
-            # Compare primitive values
-            if before_val != after_val:
-                changes.append({
-                    "path": current_path,
-                    "before": before_val,
-                    "after": after_val,
-                    "type": "modified"
-                })
-    
+    """Structural diff of two profiles as compact change records (see utils/structural_diff.py)"""
+    changes = diff_documents(before, after)
+    if path:
+        for change in changes:
+            change['path'] = f"{path}.{change['path']}" if change['path'] else path
     return changes
 
+CHANGE_SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", (
+        "You are a healthcare assistant. Given a list of changes to a patient profile, "
+        "generate a very brief, natural summary of what was updated. "
+        "Use simple, clear language. Keep it under 20 words per change. "
+        "Focus on what the user actually changed, not technical details.\n\n"
+        "Examples:\n"
+        "- 'Updated age from 25 to 26'\n"
+        "- 'Added allergy to penicillin'\n"
+        "- 'Changed sleep quality from good to poor'\n"
+        "- 'Added walking to daily activities'\n\n"
+        "Return only the summary text, nothing else."
+    )),
+    ("human", "Changes made to patient profile:\n{changes_text}\nSummary:")
+])
+
 def generate_change_summary(changes: list) -> str:
-    """Use LLM to generate a concise summary of changes"""
+    """
+    Summarize profile changes. Common change types are phrased from templates; the LLM is
+    only asked about the changes no template covers.
+    """
     if not changes:
         return ""
-    
-    # Prepare LLM
-    if getattr(settings, "USE_OLLAMA", False):
-        llm = ChatOllama(
-            model=settings.OLLAMA_MODEL,
-            base_url=settings.OLLAMA_BASE_URL,
-            temperature=0.3
-        )
-    else:
-        llm = ChatGroq(
-            model=settings.LLM_MODEL,
-            temperature=0.3
-        )
 
-    import re
+    phrases, unphrased = render_changes(changes) if settings.CHANGE_SUMMARY_TEMPLATES else ([], changes)
+    if unphrased:
+        phrases.append(llm_change_summary(unphrased))
+    return "; ".join(p for p in phrases if p)
 
-    def escape_curly_braces(text):
-        return re.sub(r'({|})', r'\1\1', text)
+def llm_change_summary(changes: list) -> str:
+    """Use LLM to generate a concise summary of changes"""
+    # Prepare LLM
+    llm = get_llm(temperature=0.3)
 
+    # Values are passed as a template variable, so braces in the JSON need no escaping
     changes_text = "\n".join([
         "Field: {}\nBefore: {}\nAfter: {}\nType: {}".format(
             change['path'],
-            escape_curly_braces(json.dumps(change['before'], ensure_ascii=False)),
-            escape_curly_braces(json.dumps(change['after'], ensure_ascii=False)),
+            json.dumps(change.get('before'), ensure_ascii=False),
+            json.dumps(change.get('after'), ensure_ascii=False),
             change['type']
         )
         for change in changes
     ])
     
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", (
-            "You are a healthcare assistant. Given a list of changes to a patient profile, "
-            "generate a very brief, natural summary of what was updated. "
-            "Use simple, clear language. Keep it under 20 words per change. "
-            "Focus on what the user actually changed, not technical details.\n\n"
-            "Examples:\n"
-            "- 'Updated age from 25 to 26'\n"
-            "- 'Added allergy to penicillin'\n"
-            "- 'Changed sleep quality from good to poor'\n"
-            "- 'Added walking to daily activities'\n\n"
-            "Return only the summary text, nothing else."
-        )),
-        ("human", f"Changes made to patient profile:\n{changes_text}\nSummary:")
-    ])
-    
-    chain = prompt | llm
+    chain = CHANGE_SUMMARY_PROMPT | llm
     result = chain.invoke({"changes_text": changes_text})
     return str(result.content).strip()
 
@@ -251,11 +188,11 @@ def patient_node(state: AgentState) -> AgentState:
     print(f"DEBUG - patient_node input: {state.get('input', 'NO INPUT')}")
     try:
         user_input = state.get('input', '')
-        tools = create_patient_tools()
+        runtime = get_runtime()
 
-        # Prepare metadata and function mappings
-        tool_metadata = [{"name": t.name, "description": t.description} for t in tools]
-        tool_funcs = {t.name: t.func for t in tools}
+        # Prebuilt metadata and function mappings
+        tool_metadata = runtime.patient_tool_metadata
+        tool_funcs = runtime.tool_funcs['patient']
 
         # LLM decides which tool to use
         tool_to_run = select_tool_llm(user_input, tool_metadata)
@@ -286,8 +223,12 @@ def patient_node(state: AgentState) -> AgentState:
 
         # Track changes if patient profile was updated
         if tool_to_run == 'update_patient_profile':
-            updated_profile = new_state.get('patientProfile', {})
-            changes = deep_compare_dicts(original_profile, updated_profile)
+            # The update tool reports the changes its patch made; diff only if it didn't
+            changes = new_state.pop('profile_changes', None)
+            new_state.pop('profile_patch', None)
+            if changes is None:
+                updated_profile = new_state.get('patientProfile', {})
+                changes = deep_compare_dicts(original_profile, updated_profile)
             
             if changes:
                 # Generate summary of changes
@@ -324,7 +265,7 @@ def web_node(state: AgentState) -> AgentState:
     print(f"DEBUG - web_node input: {state.get('input', 'NO INPUT')}")
     
     try:
-        tools = {t.name: t.func for t in create_web_tools()}
+        tools = get_runtime().tool_funcs['web']
         
         # Create a new state dict
         new_state = state.copy()
@@ -353,49 +294,51 @@ def web_node(state: AgentState) -> AgentState:
         new_state['error'] = f"Web node error: {str(e)}"
         return new_state
 
-def postprocess_response(user_input, tool_output, source: str = None):
-    if getattr(settings, "USE_OLLAMA", False):
-        llm = ChatOllama(
-            model=settings.OLLAMA_MODEL,
-            base_url=settings.OLLAMA_BASE_URL,
-            temperature=0.3
-        )
-    else:
-        llm = ChatGroq(
-            model=settings.LLM_MODEL,
-            temperature=0.3
-        )
-    
-    from langchain_core.prompts import ChatPromptTemplate
-
+# First person for patient/memory answers, third person for web and others
+POSTPROCESS_PATIENT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", (
+        "You are a helpful assistant. Given the user's question and the tool output, answer as concisely and directly as possible, "
+        "ALWAYS in first person as if you are the patient. "
+        "If the tool output is a patient profile, answer only the specific question asked (e.g., just the name, just the medications) in first person. "
+        "If the tool output is a list of semantic memories, use only the most relevant and respond as the patient. "
+        "If the answer is not found, say so clearly in first person."
+    )),
+    ("human", "User question: {user_input}\nTool output: {tool_output}\nAnswer:")
+])
+
+POSTPROCESS_GENERAL_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", (
+        "You are a helpful assistant. Given the user's question and the tool output, answer concisely and accurately. "
+        "Use third-person voice and avoid pretending to be the user. "
+        "If the answer is not found in the output, say that clearly."
+    )),
+    ("human", "User question: {user_input}\nTool output: {tool_output}\nAnswer:")
+])
+
+def _postprocess_prompt(source: str = None) -> ChatPromptTemplate:
     # Conditional system prompt
     if source == 'patient' or source == 'memory':
-        system_prompt = (
-            "You are a helpful assistant. Given the user's question and the tool output, answer as concisely and directly as possible, "
-            "ALWAYS in first person as if you are the patient. "
-            "If the tool output is a patient profile, answer only the specific question asked (e.g., just the name, just the medications) in first person. "
-            "If the tool output is a list of semantic memories, use only the most relevant and respond as the patient. "
-            "If the answer is not found, say so clearly in first person."
-        )
-    else:  # For web and others
-        system_prompt = (
-            "You are a helpful assistant. Given the user's question and the tool output, answer concisely and accurately. "
-            "Use third-person voice and avoid pretending to be the user. "
-            "If the answer is not found in the output, say that clearly."
-        )
-    
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
-        ("human", "User question: {user_input}\nTool output: {tool_output}\nAnswer:")
-    ])
-    
-    chain = prompt | llm
+        return POSTPROCESS_PATIENT_PROMPT
+    return POSTPROCESS_GENERAL_PROMPT  # For web and others
+
+def postprocess_response(user_input, tool_output, source: str = None):
+    llm = get_llm(temperature=0.3)
+    chain = _postprocess_prompt(source) | llm
     result = chain.invoke({
         "user_input": user_input,
         "tool_output": json.dumps(tool_output, indent=2)
     })
     return str(result.content).strip()
 
+async def apostprocess_response(user_input, tool_output, source: str = None):
+    llm = get_async_llm(temperature=0.3)
+    chain = _postprocess_prompt(source) | llm
+    result = await chain.ainvoke({
+        "user_input": user_input,
+        "tool_output": json.dumps(tool_output, indent=2)
+    })
+    return str(result.content).strip()
+
 # --- Post-processing node for final answer ---
 def postprocess_node(state: AgentState) -> AgentState:
     user_input = state.get('input', '')
@@ -409,44 +352,41 @@ def postprocess_node(state: AgentState) -> AgentState:
     else:
         return state
 
+async def apostprocess_node(state: AgentState) -> AgentState:
+    if not state.get('final_answer'):
+        return state
+    new_state = state.copy()
+    new_state['final_answer'] = await apostprocess_response(state.get('input', ''), state, state.get('source'))
+    return new_state
+
+PROFILE_CLASSIFIER_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", (
+        "You are a binary classifier. Determine whether the user's input is referencing any field or value "
+        "in the provided patient profile. If yes, respond with 'yes'. Otherwise, respond with 'no'.\n"
+        "Patient profile:\n{profile_context}\n\n"
+        "Respond only 'yes' or 'no'. No explanation."
+    )),
+    ("human", "User input: {user_input}")
+])
+
+def flatten_profile(d: dict, prefix: str = "") -> list:
+    """Flatten a profile into 'a.b: value' lines (values included for better LLM judgment)."""
+    items = []
+    for k, v in d.items():
+        full_key = f"{prefix}.{k}" if prefix else k
+        if isinstance(v, dict):
+            items.extend(flatten_profile(v, full_key))
+        else:
+            items.append(f"{full_key}: {v}")
+    return items
+
 def is_input_about_patient_profile(user_input: str, patient_profile: dict) -> bool:
     # Choose model
-    if getattr(settings, "USE_OLLAMA", False):
-        llm = ChatOllama(
-            model=settings.OLLAMA_MODEL,
-            base_url=settings.OLLAMA_BASE_URL,
-            temperature=0
-        )
-    else:
-        llm = ChatGroq(
-            model=settings.LLM_MODEL,
-            temperature=0
-        )
+    llm = get_llm(temperature=0)
 
-    # Flatten profile for context (show values too for better judgment)
-    def flatten(d, prefix=""):
-        items = []
-        for k, v in d.items():
-            full_key = f"{prefix}.{k}" if prefix else k
-            if isinstance(v, dict):
-                items.extend(flatten(v, full_key))
-            else:
-                items.append(f"{full_key}: {v}")
-        return items
-
-    profile_context = "\n".join(flatten(patient_profile))
-
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", (
-            "You are a binary classifier. Determine whether the user's input is referencing any field or value "
-            "in the provided patient profile. If yes, respond with 'yes'. Otherwise, respond with 'no'.\n"
-            "Patient profile:\n{profile_context}\n\n"
-            "Respond only 'yes' or 'no'. No explanation."
-        )),
-        ("human", "User input: {user_input}")
-    ])
+    profile_context = "\n".join(flatten_profile(patient_profile))
 
-    chain = prompt | llm
+    chain = PROFILE_CLASSIFIER_PROMPT | llm
     result = chain.invoke({
         "user_input": user_input,
         "profile_context": profile_context
@@ -456,8 +396,151 @@ def is_input_about_patient_profile(user_input: str, patient_profile: dict) -> bo
     return response == "yes"
 
 
+MEMORY_RELEVANCE_PROMPT = ChatPromptTemplate.from_template(
+    "Is any of the following memory relevant to the user's input? Respond 'true' or 'false'.\nUser: {user_input}\nMemory: {all_contents}\nAnswer:"
+)
+
+MEMORY_STORE_FILTER_PROMPT = ChatPromptTemplate.from_template(
+    "Should the following user input be stored in semantic memory? Store if it's a meaningful fact, preference, about the user, OR contains medical-related information. Respond 'true' or 'false'.\nUser input: {user_input}\nAnswer:"
+)
+
+# Single structured call replacing the profile / relevance / store checks
+MEMORY_PRECHECK_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", (
+        "You are a memory classifier for a healthcare assistant. Given the user's input, their patient profile "
+        "and a numbered list of stored memories, decide all of the following at once:\n"
+        "- about_profile: true if the input references any field or value in the patient profile.\n"
+        "- relevant_memory_ids: ids of the stored memories that are relevant to the input (empty list if none).\n"
+        "- should_store: true if the input should be stored in semantic memory, i.e. it's a meaningful fact, "
+        "preference, about the user, OR contains medical-related information.\n\n"
+        "Patient profile:\n{profile_context}\n\n"
+        "Stored memories:\n{memories}"
+    )),
+    ("human", "User input: {user_input}")
+])
+
+MEMORY_PRECHECK_SCHEMA = {
+    "title": "memory_precheck",
+    "description": "Combined profile, memory relevance and storage decision for one user input.",
+    "type": "object",
+    "properties": {
+        "about_profile": {"type": "boolean", "description": "Input references the patient profile."},
+        "relevant_memory_ids": {
+            "type": "array",
+            "items": {"type": "integer"},
+            "description": "Ids of relevant stored memories."
+        },
+        "should_store": {"type": "boolean", "description": "Input is worth storing in semantic memory."}
+    },
+    "required": ["about_profile", "relevant_memory_ids", "should_store"]
+}
+
+def classify_memory_input(user_input: str, patient_profile: dict, results: list) -> Optional[dict]:
+    """
+    One structured-output LLM call returning {about_profile, relevant_memory_ids, should_store}.
+    Returns None if the call or its output is unusable, so callers can fall back to the sequential checks.
+    """
+    try:
+        llm = get_llm(temperature=0)
+        chain = MEMORY_PRECHECK_PROMPT | llm.with_structured_output(MEMORY_PRECHECK_SCHEMA)
+        decision = chain.invoke(_memory_precheck_inputs(user_input, patient_profile, results))
+        return _parse_memory_decision(decision, results)
+    except Exception as e:
+        logger.warning(f"Structured memory precheck failed, falling back: {str(e)}")
+        return None
+
+async def aclassify_memory_input(user_input: str, patient_profile: dict, results: list) -> Optional[dict]:
+    """Async variant of classify_memory_input."""
+    try:
+        llm = get_async_llm(temperature=0)
+        chain = MEMORY_PRECHECK_PROMPT | llm.with_structured_output(MEMORY_PRECHECK_SCHEMA)
+        decision = await chain.ainvoke(_memory_precheck_inputs(user_input, patient_profile, results))
+        return _parse_memory_decision(decision, results)
+    except Exception as e:
+        logger.warning(f"Structured memory precheck failed, falling back: {str(e)}")
+        return None
+
+def _memory_precheck_inputs(user_input: str, patient_profile: dict, results: list) -> dict:
+    memories = "\n".join(f"[{i}] {r.get('text', '')}" for i, r in enumerate(results)) or "(none)"
+    return {
+        "user_input": user_input,
+        "profile_context": "\n".join(flatten_profile(patient_profile)),
+        "memories": memories
+    }
+
+def _parse_memory_decision(decision, results: list) -> Optional[dict]:
+    if not isinstance(decision, dict):
+        return None
+    ids = []
+    for i in decision.get('relevant_memory_ids') or []:
+        if isinstance(i, int) and 0 <= i < len(results) and i not in ids:
+            ids.append(i)
+    return {
+        "about_profile": bool(decision.get('about_profile')),
+        "relevant_memory_ids": ids,
+        "should_store": bool(decision.get('should_store'))
+    }
+
+def _search_memory_for_precheck(state: AgentState) -> list:
+    tools = get_runtime().tool_funcs['memory']
+    search_state = state.copy()
+    search_state['query'] = state.get('input', '')
+    search_state['limit'] = 3
+    results = tools['search_semantic_memory'](search_state).get('results', [])
+    return results if isinstance(results, list) else []
+
+def _apply_memory_decision(state: AgentState, decision: dict, results: list) -> AgentState:
+    state['source'] = 'memory'
+    if decision['about_profile']:
+        print("DEBUG - Skipping semantic memory (patient-related input detected via LLM)")
+        return state
+
+    if decision['relevant_memory_ids']:
+        relevant = "\n- ".join(results[i].get('text', '') for i in decision['relevant_memory_ids'])
+        state['final_answer'] = f"I found these in your memory:\n- {relevant}"
+        print("DEBUG - Relevant semantic memory found by LLM, returning early")
+        return state
+
+    if decision['should_store']:
+        tools = get_runtime().tool_funcs['memory']
+        updated = tools['update_semantic_memory'](state.copy())
+        state['memory'] = updated.get('memory', state.get('memory', []))
+        print("DEBUG - Semantic memory updated with new fact/preference")
+    else:
+        print("DEBUG - User input not meaningful for semantic memory, not storing.")
+    return state
+
 def semantic_memory_precheck_node(state: AgentState) -> AgentState:
     """
+    Search semantic memory, then make one structured LLM call that decides whether the input
+    is about the patient profile, which memories are relevant and whether to store the input.
+    Falls back to the sequential checks if structured output is disabled or fails.
+    """
+    if not settings.MEMORY_PRECHECK_STRUCTURED:
+        return sequential_memory_precheck(state)
+
+    print(f"DEBUG - semantic_memory_precheck_node received state keys: {list(state.keys())}")
+    results = _search_memory_for_precheck(state)
+    decision = classify_memory_input(state.get('input', ''), state.get('patientProfile', {}), results)
+    if decision is None:
+        return sequential_memory_precheck(state)
+    return _apply_memory_decision(state, decision, results)
+
+async def asemantic_memory_precheck_node(state: AgentState) -> AgentState:
+    """Async variant: embedding search and memory writes run in worker threads, the LLM call on the event loop."""
+    if not settings.MEMORY_PRECHECK_STRUCTURED:
+        return await asyncio.to_thread(sequential_memory_precheck, state)
+
+    print(f"DEBUG - semantic_memory_precheck_node received state keys: {list(state.keys())}")
+    results = await asyncio.to_thread(_search_memory_for_precheck, state)
+    decision = await aclassify_memory_input(state.get('input', ''), state.get('patientProfile', {}), results)
+    if decision is None:
+        return await asyncio.to_thread(sequential_memory_precheck, state)
+    return await asyncio.to_thread(_apply_memory_decision, state, decision, results)
+
+def sequential_memory_precheck(state: AgentState) -> AgentState:
+    """
+    Fallback precheck using up to three separate LLM calls:
     1. If user input is related to patient profile fields, skip this node.
     2. Semantic search for similar memories (top 3).
     3. If results found, use LLM to check if any are relevant.
@@ -481,8 +564,7 @@ def semantic_memory_precheck_node(state: AgentState) -> AgentState:
         return state
         
     # 2. Semantic memory tools
-    from tools.memory_tools import create_memory_tools
-    tools = {t.name: t.func for t in create_memory_tools()}
+    tools = get_runtime().tool_funcs['memory']
 
     # 3. Search semantic memory
     search_state = state.copy()
@@ -492,29 +574,12 @@ def semantic_memory_precheck_node(state: AgentState) -> AgentState:
     results = search_result.get('results', [])
 
     # Prepare LLM
-    from config.settings import settings
-    if getattr(settings, "USE_OLLAMA", False):
-        from langchain_ollama import ChatOllama
-        llm = ChatOllama(
-            model=settings.OLLAMA_MODEL,
-            base_url=settings.OLLAMA_BASE_URL,
-            temperature=0.3
-        )
-    else:
-        from langchain_groq import ChatGroq
-        llm = ChatGroq(
-            model=settings.LLM_MODEL,
-            temperature=0.3
-        )
-    from langchain_core.prompts import ChatPromptTemplate
+    llm = get_llm(temperature=0.3)
 
     # 4. If results found, check LLM relevance
     if results:
         all_contents = "\n- ".join(r.get('text', '') for r in results)
-        prompt = ChatPromptTemplate.from_template(
-            "Is any of the following memory relevant to the user's input? Respond 'true' or 'false'.\nUser: {user_input}\nMemory: {all_contents}\nAnswer:"
-        )
-        chain = prompt | llm
+        chain = MEMORY_RELEVANCE_PROMPT | llm
         relevance_result = chain.invoke({"user_input": user_input, "all_contents": all_contents})
         relevance = str(relevance_result.content).strip().lower()
         if 'true' in relevance:
@@ -523,10 +588,7 @@ def semantic_memory_precheck_node(state: AgentState) -> AgentState:
             print("DEBUG - Relevant semantic memory found by LLM, returning early")
             return state
         # If not relevant, check if input is meaningful to store
-        filter_prompt = ChatPromptTemplate.from_template(
-            "Should the following user input be stored in semantic memory? Store if it's a meaningful fact, preference, about the user, OR contains medical-related information. Respond 'true' or 'false'.\nUser input: {user_input}\nAnswer:"
-        )
-        filter_chain = filter_prompt | llm
+        filter_chain = MEMORY_STORE_FILTER_PROMPT | llm
         filter_result = filter_chain.invoke({"user_input": user_input})
         should_store = str(filter_result.content).strip().lower()
         if 'true' in should_store:
@@ -539,10 +601,7 @@ def semantic_memory_precheck_node(state: AgentState) -> AgentState:
         
         return state
     # 5. If no results, check if input is meaningful to store
-    filter_prompt = ChatPromptTemplate.from_template(
-        "Should the following user input be stored in semantic memory? Store if it's a meaningful fact, preference, about the user, OR contains medical-related information. Respond 'true' or 'false'.\nUser input: {user_input}\nAnswer:"
-    )
-    filter_chain = filter_prompt | llm
+    filter_chain = MEMORY_STORE_FILTER_PROMPT | llm
     filter_result = filter_chain.invoke({"user_input": user_input})
     should_store = str(filter_result.content).strip().lower()
     if 'true' in should_store:
@@ -555,91 +614,63 @@ def semantic_memory_precheck_node(state: AgentState) -> AgentState:
     return state
 
 # --- Conversational Context Node (NEW) ---
-def conversational_context_node(state: AgentState) -> AgentState:
-    """
-    First node in the workflow that analyzes conversation history and modifies the user prompt
-    to include proper conversational context.
-    """
-    user_input = state.get('input', '')
-    conversation = state.get('conversation', {})
-    conversation_history = conversation.get('conversation', [])
-    
-    # If no conversation history, just pass through
-    if not conversation_history or len(conversation_history) < 2:
-        return state
-    
-    # Get the last few messages for context (last 6 messages: 3 user, 3 AI)
-    recent_messages = conversation_history#[-6:]
-    
-    # Prepare LLM for context analysis
-    if getattr(settings, "USE_OLLAMA", False):
-        llm = ChatOllama(
-            model=settings.OLLAMA_MODEL,
-            base_url=settings.OLLAMA_BASE_URL,
-            temperature=0.3
-        )
-    else:
-        llm = ChatGroq(
-            model=settings.LLM_MODEL,
-            temperature=0.3
-        )
-    
-    from langchain_core.prompts import ChatPromptTemplate
-    
-    # Build conversation context string
-    context_messages = []
-    for msg in recent_messages:
-        sender = "User" if msg.get('sender') == 'user' else "AI"
-        text = msg.get('text', '')
-        context_messages.append(f"{sender}: {text}")
-    
-    conversation_context = "\n".join(context_messages)
-    
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", (
-            "You are a conversational context analyzer. Your job is to understand if the current user input "
-            "needs additional context from the conversation history to be properly understood.\n\n"
-            "ANALYZE the user's current input and the recent conversation history.\n\n"
-            "DETECT if the user input is:\n"
-            "1. A follow-up question (e.g., 'Tell me more', 'What about...', 'How about...', 'And?', 'So?', 'Then?', 'What else?', 'Can you elaborate?', 'Explain further')\n"
-            "2. A clarification request (e.g., 'What do you mean?', 'I don't understand', 'Can you rephrase?')\n"
-            "3. A reference to previous topics (e.g., 'What about that thing you mentioned?', 'Tell me more about it')\n"
-            "4. A standalone question that doesn't need context\n\n"
-            "If the user input IS a follow-up or needs context:\n"
-            "- Identify what topic/issue the user is referring to from the conversation history\n"
-            "- Find the most recent relevant AI or User response\n"
-            "- Modify the user input to be more specific\n"
-            "- Include the previous AI or User response as context\n\n"
-            "RESPONSE FORMAT:\n"
-            "If context is needed, respond with:\n"
-            "CONTEXT_NEEDED\n"
-            "Modified user input: [specific question with context]\n"
-            "Previous response: [the relevant previous AI or User response]\n\n"
-            "If no context is needed, respond with:\n"
-            "NO_CONTEXT_NEEDED\n\n"
-            "Examples:\n"
-            "User: 'Tell me more'\n"
-            "AI: 'Insomnia is a sleep disorder...'\n"
-            "Response: CONTEXT_NEEDED\nModified user input: Tell me more about insomnia\nPrevious response: Insomnia is a sleep disorder...\n\n"
-            "User: 'What is diabetes?'\n"
-            "Response: NO_CONTEXT_NEEDED\n"
-        )),
-        ("human", (
-            "Recent conversation:\n{conversation_context}\n\n"
-            "Current user input: {user_input}\n\n"
-            "Analysis:"
-        ))
-    ])
-    
-    chain = prompt | llm
-    result = chain.invoke({
-        "conversation_context": conversation_context,
-        "user_input": user_input
-    })
-    
-    analysis = str(result.content).strip()
-    
-    # Parse the analysis
+CONVERSATIONAL_CONTEXT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", (
+        "You are a conversational context analyzer. Your job is to understand if the current user input "
+        "needs additional context from the conversation history to be properly understood.\n\n"
+        "ANALYZE the user's current input and the recent conversation history.\n\n"
+        "DETECT if the user input is:\n"
+        "1. A follow-up question (e.g., 'Tell me more', 'What about...', 'How about...', 'And?', 'So?', 'Then?', 'What else?', 'Can you elaborate?', 'Explain further')\n"
+        "2. A clarification request (e.g., 'What do you mean?', 'I don't understand', 'Can you rephrase?')\n"
+        "3. A reference to previous topics (e.g., 'What about that thing you mentioned?', 'Tell me more about it')\n"
+        "4. A standalone question that doesn't need context\n\n"
+        "If the user input IS a follow-up or needs context:\n"
+        "- Identify what topic/issue the user is referring to from the conversation history\n"
+        "- Find the most recent relevant AI or User response\n"
+        "- Modify the user input to be more specific\n"
+        "- Include the previous AI or User response as context\n\n"
+        "RESPONSE FORMAT:\n"
+        "If context is needed, respond with:\n"
+        "CONTEXT_NEEDED\n"
+        "Modified user input: [specific question with context]\n"
+        "Previous response: [the relevant previous AI or User response]\n\n"
+        "If no context is needed, respond with:\n"
+        "NO_CONTEXT_NEEDED\n\n"
+        "Examples:\n"
+        "User: 'Tell me more'\n"
+        "AI: 'Insomnia is a sleep disorder...'\n"
+        "Response: CONTEXT_NEEDED\nModified user input: Tell me more about insomnia\nPrevious response: Insomnia is a sleep disorder...\n\n"
+        "User: 'What is diabetes?'\n"
+        "Response: NO_CONTEXT_NEEDED\n"
+    )),
+    ("human", (
+        "Recent conversation:\n{conversation_context}\n\n"
+        "Current user input: {user_input}\n\n"
+        "Analysis:"
+    ))
+])
+
+# Route tagging runs speculatively on the raw input while the context analysis is in flight
+_speculation_executor = ThreadPoolExecutor(
+    max_workers=settings.SPECULATIVE_TAGGING_WORKERS,
+    thread_name_prefix="route-speculation"
+)
+
+def _speculative_tag(future, user_input: str) -> Optional[dict]:
+    """Collect a speculative route tag; any failure just means llm_tagger_node tags normally."""
+    try:
+        tag, decided_by_llm = future.result()
+        return {"input": user_input, "tag": tag, "record": decided_by_llm}
+    except Exception as e:
+        print(f"DEBUG - Speculative tagging failed, falling back to normal tagging: {e}")
+        return None
+
+def _format_conversation(conversation: dict) -> str:
+    # Last MEMORY_WINDOW_SIZE messages verbatim, older ones as the cached rolling summary
+    return conversation_window.build(conversation.get('cid', ''), conversation.get('conversation', []))
+
+def _rewrite_with_context(state: AgentState, user_input: str, analysis: str) -> Optional[AgentState]:
+    """Parse the context analysis; return the rewritten state, or None if the input stands alone."""
     if "CONTEXT_NEEDED" in analysis and "NO_CONTEXT_NEEDED" not in analysis:
         # Extract modified input and previous response
         lines = analysis.split('\n')
@@ -665,15 +696,233 @@ def conversational_context_node(state: AgentState) -> AgentState:
             print(f"DEBUG - conversational_context_node: Modified input from '{user_input}' to '{modified_input}'")
             return new_state
     
-    # No context needed, pass through unchanged
     print(f"DEBUG - conversational_context_node: No context needed for '{user_input}'")
-    return state
+    return None
 
-# --- LLM Tagger Node (NEW) ---
-def llm_tagger_node(state: AgentState) -> AgentState:
+def conversational_context_node(state: AgentState) -> AgentState:
+    """
+    First node in the workflow that analyzes conversation history and modifies the user prompt
+    to include proper conversational context.
+
+    When SPECULATIVE_TAGGING is on, the route tagger runs concurrently on the raw input. Its tag
+    is kept only if the input passes through unchanged (NO_CONTEXT_NEEDED), and llm_tagger_node
+    records it in the route cache and local router only when it uses it.
+    """
     user_input = state.get('input', '')
-    patient_profile = state.get('patientProfile', {})
+    conversation = state.get('conversation', {})
+    conversation_history = conversation.get('conversation', [])
+    
+    # If no conversation history, just pass through
+    if not conversation_history or len(conversation_history) < 2:
+        return state
+    
+    # Prepare LLM for context analysis
+    llm = get_llm(temperature=0.3)
+    conversation_context = _format_conversation(conversation)
+    
+    speculation = None
+    if settings.SPECULATIVE_TAGGING:
+        # Run in this request's context so the tagger's LLM call is attributed to this node's span
+        speculation = _speculation_executor.submit(
+            contextvars.copy_context().run, _classify_route, user_input, state.get('patientProfile', {})
+        )
+    
+    chain = CONVERSATIONAL_CONTEXT_PROMPT | llm
+    try:
+        result = chain.invoke({
+            "conversation_context": conversation_context,
+            "user_input": user_input
+        })
+    except Exception:
+        if speculation:
+            speculation.cancel()
+        raise
+    
+    new_state = _rewrite_with_context(state, user_input, str(result.content).strip())
+    if new_state is not None:
+        # The input was rewritten, so the speculative tag no longer applies
+        if speculation:
+            speculation.cancel()
+        return new_state
     
+    # No context needed, pass through unchanged
+    if speculation:
+        speculative_route = _speculative_tag(speculation, user_input)
+        if speculative_route:
+            return {**state, 'speculative_route': speculative_route}
+    return state
+
+async def aconversational_context_node(state: AgentState) -> AgentState:
+    """Async variant of conversational_context_node; speculation runs as a task on the same loop."""
+    user_input = state.get('input', '')
+    conversation = state.get('conversation', {})
+    conversation_history = conversation.get('conversation', [])
+    if not conversation_history or len(conversation_history) < 2:
+        return state
+
+    llm = get_async_llm(temperature=0.3)
+    speculation = None
+    if settings.SPECULATIVE_TAGGING:
+        speculation = asyncio.create_task(_aclassify_route(user_input, state.get('patientProfile', {})))
+
+    chain = CONVERSATIONAL_CONTEXT_PROMPT | llm
+    try:
+        result = await chain.ainvoke({
+            "conversation_context": _format_conversation(conversation),
+            "user_input": user_input
+        })
+    except Exception:
+        if speculation:
+            speculation.cancel()
+        raise
+
+    new_state = _rewrite_with_context(state, user_input, str(result.content).strip())
+    if new_state is not None:
+        if speculation:
+            speculation.cancel()
+        return new_state
+
+    if speculation:
+        try:
+            tag, decided_by_llm = await speculation
+            return {**state, 'speculative_route': {"input": user_input, "tag": tag, "record": decided_by_llm}}
+        except Exception as e:
+            print(f"DEBUG - Speculative tagging failed, falling back to normal tagging: {e}")
+    return state
+
+# --- LLM Tagger Node (NEW) ---
+ROUTE_TAGGER_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", (
+        "You are a strict classifier for a healthcare AI system. "
+        "This is the user's patient profile: {patient_profile}\n\n"
+        "Given a user input and content of their patient profile, classify it into exactly one of the following tags:\n\n"
+        "TAGS:\n"
+        
+        "1. WEB: For real-time or fact-based queries that may change over time and require a current search. "
+        "Examples: 'Nvidia stock price', 'Current bitcoin value', 'Latest news on diabetes research', "
+        "'Weather in Dubai today', 'Population of China', 'COVID-19 cases in US'.\n"
+        "Classify as WEB if the input is asking for current information, real-time data, or facts that may change over time.\n\n"
+        
+        "2. TEXT: For simple greetings, chit-chat, casual conversations, or general questions that don't need tools"
+        "VERY IMPORTANT: USE for any requests related to adding, updating, or removing recommendations"
+        "Examples: 'Hi', 'Tell me a joke', 'What is your name?', 'Explain photosynthesis', 'Add a recommendation to eat more iron rich food'.\n"
+        "Classify as TEXT if the input is casual conversation, general knowledge questions, or recommendation-related requests.\n\n"
+        
+        "3. PATIENT: For anything related to the patient’s profile, such as their name, age, gender, allergies, medications, routines, appointments, treatments or personal history."
+        "Examples: 'What medications is the patient taking?', 'Update sleep quality to poor', 'Does John have any allergies?', 'Add walking to daily checklist'."
+        "VERY IMPORTANT: DO NOT use for any requests related to adding, updating, or removing recommendations"
+        "VERY IMPORTANT: Can be used for any requests related to modifying content of treatments\n"
+        "Classify as PATIENT if the input is about reading or updating patient profile information (excluding recommendations).\n\n"
+        
+        "4. MEDICAL: For anything that is medical reasoning, verification, or critical treatment suggestions. "
+        "This includes requests for medical advice, diagnosis, or complex medical questions that require domain-specific reasoning. "
+        "Examples: 'Is this treatment safe for diabetes?', 'What are the contraindications for this drug?', "
+        "'Should I combine these two medications?', 'Verify the diagnosis for this patient'.\n"
+        "Classify as MEDICAL if the input is about medical reasoning, verification, or critical suggestions.\n\n"
+        
+        "5. UI_CHANGE: For requests related to changing the user interface, such as themes, layout, or settings. "
+        "Examples: 'Change theme to dark mode', 'Switch to compact view', 'Open settings'.\n"
+        "Classify as UI_CHANGE if the input is about UI themes or interface changes.\n\n"
+        
+        "6. MODIFY_TREATMENT: For requests to add or remove a treatment of a particular type (e.g., 'Add physiotherapy to my plan'), "
+        "but NOT for adding medications or anything else. "
+        "Examples: 'Add sleep treatment', 'Remove sleep treatment', 'Remove sleep from my treatments', 'Add fitness treatment', 'Remove fitness treatment', 'Remove fitness from my treatments', 'Add treatment plan for sleep issues', 'Remove treatment plan for sleep issues', 'Add treatment plan for fitness issues', 'Remove treatment plan for fitness issues'" #'Add physical therapy to my treatment plan', 'Include occupational therapy'. "
+        "Do NOT use this tag for medication or general additions."
+        "Do NOT use this tag for general things related to treatments.\n"
+        "VERY IMPORTANT: DO NOT use for requests related to modifying or updating content of treatments\n\n"
+        
+        "Respond ONLY with one tag: WEB, TEXT, PATIENT, MEDICAL, UI_CHANGE, or MODIFY_TREATMENT. "
+        "Do not explain your choice. Output only the tag."
+    )),
+    ("human", "User input: {user_input}")
+])
+
+def _encode_for_routing(texts: list):
+    from modules.memory_operations import embedding_cache
+    return embedding_cache.encode(texts)
+
+# Learns from every LLM tagger decision; answers in-process once it is confident
+local_router = LocalRouter(encoder=_encode_for_routing, decision_log=RouteDecisionLog())
+
+def _local_route(user_input: str) -> Optional[str]:
+    from modules.memory_operations import embeddings_ready
+    # Never block a request on loading the embedding model just to skip a routing call
+    if not settings.LOCAL_ROUTER_ENABLED or not embeddings_ready():
+        return None
+    try:
+        return local_router.predict(user_input)
+    except Exception as e:
+        print(f"DEBUG - Local router failed, using LLM tagger: {e}")
+        return None
+
+def _cached_route(user_input: str, patient_profile: dict) -> Optional[str]:
+    if settings.ROUTE_CACHE_ENABLED:
+        cached = route_cache.get(user_input, patient_profile)
+        if cached:
+            print(f"DEBUG - classify_route: Route cache hit '{cached}'")
+            return cached
+    return None
+
+def _record_route(user_input: str, patient_profile: dict, tag: str):
+    if settings.ROUTE_CACHE_ENABLED:
+        route_cache.put(user_input, patient_profile, tag)
+    if settings.LOCAL_ROUTER_ENABLED:
+        from modules.memory_operations import embeddings_ready
+        try:
+            local_router.observe(user_input, tag, learn=embeddings_ready())
+        except Exception as e:
+            print(f"DEBUG - Could not record route decision: {e}")
+
+def _classify_route(user_input: str, patient_profile: dict) -> Tuple[str, bool]:
+    """
+    (tag, decided_by_llm) without recording anything: route cache, local router, LLM tagger.
+    Speculative tags go through here so only the decision actually used gets recorded.
+    """
+    tag = _cached_route(user_input, patient_profile)
+    if tag:
+        return tag, False
+    tag = _local_route(user_input)
+    if tag:
+        print(f"DEBUG - classify_route: Local router tag '{tag}'")
+        return tag, False
+    llm = get_llm(temperature=0.3)
+    chain = ROUTE_TAGGER_PROMPT | llm
+    result = chain.invoke({"user_input": user_input, "patient_profile": patient_profile})
+    return str(result.content).strip().lower(), True
+
+async def _aclassify_route(user_input: str, patient_profile: dict) -> Tuple[str, bool]:
+    """Async variant of _classify_route; embedding work for the local router runs in a worker thread."""
+    tag = _cached_route(user_input, patient_profile)
+    if tag:
+        return tag, False
+    tag = await asyncio.to_thread(_local_route, user_input)
+    if tag:
+        print(f"DEBUG - classify_route: Local router tag '{tag}'")
+        return tag, False
+    llm = get_async_llm(temperature=0.3)
+    chain = ROUTE_TAGGER_PROMPT | llm
+    result = await chain.ainvoke({"user_input": user_input, "patient_profile": patient_profile})
+    return str(result.content).strip().lower(), True
+
+def classify_route(user_input: str, patient_profile: dict) -> str:
+    """
+    LLM-based classification (web, patient, text, medical, ui_change, add_treatment).
+    Checked in order: route cache, local router, LLM tagger; LLM decisions are recorded.
+    """
+    tag, decided_by_llm = _classify_route(user_input, patient_profile)
+    if decided_by_llm:
+        _record_route(user_input, patient_profile, tag)
+    return tag
+
+async def aclassify_route(user_input: str, patient_profile: dict) -> str:
+    """Async variant of classify_route."""
+    tag, decided_by_llm = await _aclassify_route(user_input, patient_profile)
+    if decided_by_llm:
+        await asyncio.to_thread(_record_route, user_input, patient_profile, tag)
+    return tag
+
+def _start_tagging(state: AgentState) -> Optional[dict]:
+    """Open the streaming session; return the speculative route if it was made for the current input."""
     # Start streaming session
     session_id = f"session_{int(time.time())}"
     state['session_id'] = session_id
@@ -684,75 +933,41 @@ def llm_tagger_node(state: AgentState) -> AgentState:
         "session_id": session_id
     })
 
-    # --- LLM-based classification (web, patient, text, medical, ui_change, add_treatment) ---
-    if getattr(settings, "USE_OLLAMA", False):
-        llm = ChatOllama(
-            model=settings.OLLAMA_MODEL,
-            base_url=settings.OLLAMA_BASE_URL,
-            temperature=0.3
-        )
+    # Reuse the tag computed alongside the context analysis if it was made for this exact input
+    speculative_route = state.get('speculative_route') or {}
+    if speculative_route.get('input') == state.get('input', '') and speculative_route.get('tag'):
+        print(f"DEBUG - llm_tagger_node: Using speculative route tag '{speculative_route['tag']}'")
+        return speculative_route
+    return None
+
+def llm_tagger_node(state: AgentState) -> AgentState:
+    speculative_route = _start_tagging(state)
+    if speculative_route:
+        tag = speculative_route['tag']
+        # Speculative LLM decisions are recorded only now that the tag is actually used
+        if speculative_route.get('record'):
+            _record_route(state.get('input', ''), state.get('patientProfile', {}), tag)
     else:
-        llm = ChatGroq(
-            model=settings.LLM_MODEL,
-            temperature=0.3,
-            api_key=os.getenv("GROQ_API_KEY")
-        )
-    from langchain_core.prompts import ChatPromptTemplate
-
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", (
-            "You are a strict classifier for a healthcare AI system. "
-            "This is the user's patient profile: {patient_profile}\n\n"
-            "Given a user input and content of their patient profile, classify it into exactly one of the following tags:\n\n"
-            "TAGS:\n"
-            
-            "1. WEB: For real-time or fact-based queries that may change over time and require a current search. "
-            "Examples: 'Nvidia stock price', 'Current bitcoin value', 'Latest news on diabetes research', "
-            "'Weather in Dubai today', 'Population of China', 'COVID-19 cases in US'.\n"
-            "Classify as WEB if the input is asking for current information, real-time data, or facts that may change over time.\n\n"
-            
-            "2. TEXT: For simple greetings, chit-chat, casual conversations, or general questions that don't need tools"
-            "VERY IMPORTANT: USE for any requests related to adding, updating, or removing recommendations"
-            "Examples: 'Hi', 'Tell me a joke', 'What is your name?', 'Explain photosynthesis', 'Add a recommendation to eat more iron rich food'.\n"
-            "Classify as TEXT if the input is casual conversation, general knowledge questions, or recommendation-related requests.\n\n"
-            
-            "3. PATIENT: For anything related to the patient’s profile, such as their name, age, gender, allergies, medications, routines, appointments, treatments or personal history."
-            "Examples: 'What medications is the patient taking?', 'Update sleep quality to poor', 'Does John have any allergies?', 'Add walking to daily checklist'."
-            "VERY IMPORTANT: DO NOT use for any requests related to adding, updating, or removing recommendations"
-            "VERY IMPORTANT: Can be used for any requests related to modifying content of treatments\n"
-            "Classify as PATIENT if the input is about reading or updating patient profile information (excluding recommendations).\n\n"
-            
-            "4. MEDICAL: For anything that is medical reasoning, verification, or critical treatment suggestions. "
-            "This includes requests for medical advice, diagnosis, or complex medical questions that require domain-specific reasoning. "
-            "Examples: 'Is this treatment safe for diabetes?', 'What are the contraindications for this drug?', "
-            "'Should I combine these two medications?', 'Verify the diagnosis for this patient'.\n"
-            "Classify as MEDICAL if the input is about medical reasoning, verification, or critical suggestions.\n\n"
-            
-            "5. UI_CHANGE: For requests related to changing the user interface, such as themes, layout, or settings. "
-            "Examples: 'Change theme to dark mode', 'Switch to compact view', 'Open settings'.\n"
-            "Classify as UI_CHANGE if the input is about UI themes or interface changes.\n\n"
-            
-            "6. MODIFY_TREATMENT: For requests to add or remove a treatment of a particular type (e.g., 'Add physiotherapy to my plan'), "
-            "but NOT for adding medications or anything else. "
-            "Examples: 'Add sleep treatment', 'Remove sleep treatment', 'Remove sleep from my treatments', 'Add fitness treatment', 'Remove fitness treatment', 'Remove fitness from my treatments', 'Add treatment plan for sleep issues', 'Remove treatment plan for sleep issues', 'Add treatment plan for fitness issues', 'Remove treatment plan for fitness issues'" #'Add physical therapy to my treatment plan', 'Include occupational therapy'. "
-            "Do NOT use this tag for medication or general additions."
-            "Do NOT use this tag for general things related to treatments.\n"
-            "VERY IMPORTANT: DO NOT use for requests related to modifying or updating content of treatments\n\n"
-            
-            "Respond ONLY with one tag: WEB, TEXT, PATIENT, MEDICAL, UI_CHANGE, or MODIFY_TREATMENT. "
-            "Do not explain your choice. Output only the tag."
-        )),
-        ("human", "User input: {user_input}")
-    ])
-    chain = prompt | llm
-    result = chain.invoke({"user_input": user_input, "patient_profile": patient_profile})
-    tag = str(result.content).strip().lower()
+        tag = classify_route(state.get('input', ''), state.get('patientProfile', {}))
     state['route_tag'] = tag  # This is what the agent will use
+    return state
 
+async def allm_tagger_node(state: AgentState) -> AgentState:
+    speculative_route = _start_tagging(state)
+    if speculative_route:
+        tag = speculative_route['tag']
+        if speculative_route.get('record'):
+            await asyncio.to_thread(_record_route, state.get('input', ''), state.get('patientProfile', {}), tag)
+    else:
+        tag = await aclassify_route(state.get('input', ''), state.get('patientProfile', {}))
+    state['route_tag'] = tag
     return state
 
 # --- Medical Reasoning Node (NEW) ---
-def medical_reasoning_node(state: AgentState) -> AgentState:
+# Pooled, retrying, circuit-broken client for MEDICAL_ENDPOINT_URLS
+medical_client = create_medical_client()
+
+def _medical_payload(state: AgentState) -> dict:
     user_input = state.get('input', '')
     conversational_context = state.get('conversational_context', {})
 
@@ -762,18 +977,29 @@ def medical_reasoning_node(state: AgentState) -> AgentState:
     else:
         enhanced_prompt = user_input
 
-    payload = {"prompt": enhanced_prompt}
+    return {"prompt": enhanced_prompt}
 
+def _apply_medical_response(state: AgentState, response) -> AgentState:
+    if response.is_success:
+        state['final_answer'] = f"Use this information to answer the user's question: {response.text}"
+    else:
+        state['final_answer'] = f"API error: {response.status_code} {response.text}"
+    return state
+
+def medical_reasoning_node(state: AgentState) -> AgentState:
     try:
-        response = requests.post(
-            "http://172.22.225.49:8000/endpoint",
-            json=payload,
-            timeout=5
-        )
-        if response.ok:
-            state['final_answer'] = f"Use this information to answer the user's question: {response.text}"
-        else:
-            state['final_answer'] = f"API error: {response.status_code} {response.text}"
+        response = medical_client.post(_medical_payload(state))
+        _apply_medical_response(state, response)
+    except Exception as e:
+        state['final_answer'] = f"API request failed: {e}"
+
+    state['source'] = 'medical'
+    return state
+
+async def amedical_reasoning_node(state: AgentState) -> AgentState:
+    try:
+        response = await medical_client.apost(_medical_payload(state))
+        _apply_medical_response(state, response)
     except Exception as e:
         state['final_answer'] = f"API request failed: {e}"
 
@@ -788,29 +1014,14 @@ def semantic_update_node(state: AgentState) -> AgentState:
     user_input = state.get('input', '')
     memory = state.get('memory', [])
 
-    # Import/create memory tools as in your other nodes
-    from tools.memory_tools import create_memory_tools
-    tools = {t.name: t.func for t in create_memory_tools()}
+    # Prebuilt memory tools, shared with the other nodes
+    tools = get_runtime().tool_funcs['memory']
 
     # Use the same LLM as elsewhere
-    if getattr(settings, "USE_OLLAMA", False):
-        llm = ChatOllama(
-            model=settings.OLLAMA_MODEL,
-            base_url=settings.OLLAMA_BASE_URL,
-            temperature=0.3
-        )
-    else:
-        llm = ChatGroq(
-            model=settings.LLM_MODEL,
-            temperature=0.3
-        )
-    from langchain_core.prompts import ChatPromptTemplate
+    llm = get_llm(temperature=0.3)
 
     # LLM: Should we store this in semantic memory?
-    filter_prompt = ChatPromptTemplate.from_template(
-        "Should the following user input be stored in semantic memory? Store if it's a meaningful fact, preference, about the user, OR contains medical-related information. Respond 'true' or 'false'.\nUser input: {user_input}\nAnswer:"
-    )
-    filter_chain = filter_prompt | llm
+    filter_chain = MEMORY_STORE_FILTER_PROMPT | llm
     filter_result = filter_chain.invoke({"user_input": user_input})
     should_store = str(filter_result.content).strip().lower()
     if 'true' in should_store:
@@ -819,16 +1030,21 @@ def semantic_update_node(state: AgentState) -> AgentState:
         state['memory'] = updated.get('memory', memory)
     return state
 
+async def asemantic_update_node(state: AgentState) -> AgentState:
+    llm = get_async_llm(temperature=0.3)
+    filter_result = await (MEMORY_STORE_FILTER_PROMPT | llm).ainvoke({"user_input": state.get('input', '')})
+    if 'true' in str(filter_result.content).strip().lower():
+        tools = get_runtime().tool_funcs['memory']
+        updated = await asyncio.to_thread(tools['update_semantic_memory'], state.copy())
+        state['memory'] = updated.get('memory', state.get('memory', []))
+    return state
+
 # --- Unmute Node (NEW) ---
-# Using direct connection approach to avoid event loop conflicts
+# Sessions come from a pool on a dedicated background loop, so neither node creates an event loop
 
-def unmute_node(state: AgentState) -> AgentState:
-    """
-    Side-effect node that streams to Unmute and frontend.
-    Uses direct connection approach with response.create trigger.
-    """
+def _unmute_message(state: AgentState) -> tuple:
+    """Pick the text and tag to send to Unmute for this state."""
     user_input = state.get('input', '')
-    patient_profile = state.get('patientProfile', {})
     route_tag = state.get('route_tag', '')
     
     # Determine text to send based on source
@@ -858,252 +1074,324 @@ def unmute_node(state: AgentState) -> AgentState:
         else:
             text_to_send = user_input
             tag = 'normal'
+    return text_to_send, tag
+
+UNMUTE_SESSION_MESSAGE = {
+    "type": "session.update",
+    "session": {
+        "instructions": {
+            "type": "constant",
+            "text": "You are a helpful health assistant."
+        },
+        "voice": "unmute-prod-website/developer-1.mp3",
+        "allow_recording": True
+    }
+}
+
+async def initialize_unmute_session(websocket):
+    """Configure a freshly connected Unmute session; returns once the server acknowledged it."""
+    await websocket.send(json.dumps(UNMUTE_SESSION_MESSAGE))
+    print("✓ Sent session initialization")
     
-    print(f"DEBUG - unmute_node: Starting streaming for '{text_to_send}'")
+    if await await_session_updated(websocket, settings.UNMUTE_SESSION_ACK_TIMEOUT):
+        print("✓ Session initialization acknowledged")
+    else:
+        # No ack (older server): the timeout doubles as the old fixed grace period
+        logger.warning(f"Unmute: no session.updated within {settings.UNMUTE_SESSION_ACK_TIMEOUT}s, continuing")
+
+async def connect_unmute_session():
+    """Open a websocket to Unmute and run the session start on it."""
+    import websockets
+
+    unmute_url = getattr(settings, "UNMUTE_WEBSOCKET_URL", "ws://localhost:11000/v1/realtime")
+    websocket = await websockets.connect(
+        unmute_url, subprotocols=['realtime'], open_timeout=settings.UNMUTE_CONNECT_TIMEOUT
+    )
+    try:
+        await initialize_unmute_session(websocket)
+    except BaseException:
+        await websocket.close()
+        raise
+    return websocket
+
+# Unmute websockets live on one long-lived loop thread; sync and async nodes both
+# schedule onto it and lease pre-connected sessions from the pool.
+unmute_loop = BackgroundLoop(name="unmute-loop")
+unmute_pool = UnmuteSessionPool(
+    connect_unmute_session,
+    size=settings.UNMUTE_POOL_SIZE,
+    max_sessions=settings.UNMUTE_POOL_MAX_SESSIONS,
+    lease_timeout=settings.UNMUTE_POOL_LEASE_TIMEOUT,
+    max_idle_seconds=settings.UNMUTE_POOL_MAX_IDLE_SECONDS,
+    reuse=settings.UNMUTE_POOL_REUSE_SESSIONS
+)
+
+@asynccontextmanager
+async def unmute_session():
+    """Ready Unmute session: leased from the pool, or a fresh connection when pooling is off."""
+    if settings.UNMUTE_POOL_SIZE > 0:
+        async with unmute_pool.lease() as session:
+            yield session
+    else:
+        session = PooledSession(await connect_unmute_session())
+        try:
+            yield session
+        finally:
+            await session.websocket.close()
+
+async def relay_unmute_response(websocket, text_to_send: str, tag: str, patient_profile: dict) -> bool:
+    """Send the message on an initialized session and relay the response chunks; True if it completed."""
+    import websockets
+
+    # Send message
     
-    # Send streaming status
-    send_streaming_chunk("unmute_connecting", {
-        "message": "Connecting to voice assistant...",
-        "text": text_to_send
+    prompt_message = {
+        "type": "conversation.item.input_text",
+        "text": text_to_send,
+        "patientProfile": patient_profile,
+        "tag": tag
+    }
+    if tag == 'extra':
+        prompt_message = {
+            "type": "conversation.item.input_text",
+            "text": text_to_send,
+            "tag": tag
+        }
+        
+    await websocket.send(json.dumps(prompt_message))
+    print(f"✓ Sent message: {prompt_message}")
+    
+    # ADD THIS: Send response generation trigger
+    response_create_message = {
+        "type": "response.create"
+    }
+    await websocket.send(json.dumps(response_create_message))
+    print(f"DEBUG - Sent response.create trigger")
+    
+    # Send streaming started status
+    send_streaming_chunk("unmute_streaming_started", {
+        "message": "Voice assistant is responding..."
     })
     
-    # Use direct connection approach with response.create trigger
-    try:
-        import asyncio
-        import websockets
-        
-        async def direct_unmute_connection():
-            unmute_url = getattr(settings, "UNMUTE_WEBSOCKET_URL", "ws://localhost:11000/v1/realtime")
+    # Wait for response
+    completed = False
+    text_done = False
+    audio_done = False
+    start_time = time.time()
+    
+    while True:#time.time() - start_time < 50:
+        try:
+            chunk = await asyncio.wait_for(websocket.recv(), timeout=5)
+            #print(f"✓ Received: {chunk}")
             
-            async with websockets.connect(unmute_url, subprotocols=['realtime']) as websocket:
-                print("✓ Connected to Unmute (direct)")
-                
-                # Send connection status
-                send_streaming_chunk("unmute_connected", {
-                    "message": "Connected to voice assistant"
-                })
-                
-                # Session initialization
-                session_message = {
-                    "type": "session.update",
-                    "session": {
-                        "instructions": {
-                            "type": "constant",
-                            "text": "You are a helpful health assistant."
-                        },
-                        "voice": "unmute-prod-website/developer-1.mp3",
-                        "allow_recording": True
-                    }
-                }
-                await websocket.send(json.dumps(session_message))
-                print("✓ Sent session initialization")
-                
-                await asyncio.sleep(1)
+            try:
+                msg = json.loads(chunk)
+                msg_type = msg.get('type', '')
                 
-                # Send message
-                
-                prompt_message = {
-                    "type": "conversation.item.input_text",
-                    "text": text_to_send,
-                    "patientProfile": patient_profile,
-                    "tag": tag
-                }
-                if tag == 'extra':
-                    prompt_message = {
-                        "type": "conversation.item.input_text",
-                        "text": text_to_send,
-                        "tag": tag
-                    }
+                if msg_type == 'unmute.response.text.delta.ready' and msg.get('delta'):
+                    text_chunk = msg['delta']
+                    print(f"DEBUG - Streaming text chunk: {text_chunk}")
                     
-                await websocket.send(json.dumps(prompt_message))
-                print(f"✓ Sent message: {prompt_message}")
-                
-                # ADD THIS: Send response generation trigger
-                response_create_message = {
-                    "type": "response.create"
-                }
-                await websocket.send(json.dumps(response_create_message))
-                print(f"DEBUG - Sent response.create trigger")
+                    # Send text chunk to frontend immediately
+                    send_streaming_chunk("text_chunk", {
+                        "text": text_chunk,
+                        "source": "unmute"
+                    })
+                    
+                elif msg_type == 'response.audio.delta' and msg.get('delta'):
+                    audio_chunk = msg['delta']
+                    print(f"DEBUG - Streaming audio chunk: {len(audio_chunk)} bytes")
+                    
+                    # Send audio chunk to frontend immediately
+                    send_streaming_chunk("audio_chunk", {
+                        "audio": audio_chunk,
+                        "source": "unmute"
+                    })
                 
-                # Send streaming started status
-                send_streaming_chunk("unmute_streaming_started", {
-                    "message": "Voice assistant is responding..."
-                })
+                elif msg_type == 'response.text.done':
+                    text_done = True
+                    print(f"DEBUG - Text response done")
+                    
+                    # Send text completion status
+                    send_streaming_chunk("text_complete", {
+                        "message": "Text response complete"
+                    })
                 
-                # Wait for response
-                text_done = False
-                audio_done = False
-                start_time = time.time()
+                elif msg_type == 'response.audio.done':
+                    audio_done = True
+                    print(f"DEBUG - Audio response done")
+                    
+                    # Send audio completion status
+                    send_streaming_chunk("audio_complete", {
+                        "message": "Audio response complete"
+                    })
                 
-                while True:#time.time() - start_time < 50:
-                    try:
-                        chunk = await asyncio.wait_for(websocket.recv(), timeout=5)
-                        #print(f"✓ Received: {chunk}")
-                        
-                        try:
-                            msg = json.loads(chunk)
-                            msg_type = msg.get('type', '')
-                            
-                            if msg_type == 'unmute.response.text.delta.ready' and msg.get('delta'):
-                                text_chunk = msg['delta']
-                                print(f"DEBUG - Streaming text chunk: {text_chunk}")
-                                
-                                # Send text chunk to frontend immediately
-                                send_streaming_chunk("text_chunk", {
-                                    "text": text_chunk,
-                                    "source": "unmute"
-                                })
-                                
-                            elif msg_type == 'response.audio.delta' and msg.get('delta'):
-                                audio_chunk = msg['delta']
-                                print(f"DEBUG - Streaming audio chunk: {len(audio_chunk)} bytes")
-                                
-                                # Send audio chunk to frontend immediately
-                                send_streaming_chunk("audio_chunk", {
-                                    "audio": audio_chunk,
-                                    "source": "unmute"
-                                })
-                            
-                            elif msg_type == 'response.text.done':
-                                text_done = True
-                                print(f"DEBUG - Text response done")
-                                
-                                # Send text completion status
-                                send_streaming_chunk("text_complete", {
-                                    "message": "Text response complete"
-                                })
-                            
-                            elif msg_type == 'response.audio.done':
-                                audio_done = True
-                                print(f"DEBUG - Audio response done")
-                                
-                                # Send audio completion status
-                                send_streaming_chunk("audio_complete", {
-                                    "message": "Audio response complete"
-                                })
-                            
-                            if text_done and audio_done:
-                                print(f"DEBUG - Response complete")
-                                send_streaming_chunk("unmute_complete", {
-                                    "message": "Voice assistant response complete"
-                                })
-                                break
-                                
-                        except json.JSONDecodeError:
-                            print(f"Non-JSON response: {chunk}")
-                            
-                    except asyncio.TimeoutError:
-                        print("Timeout - no response received")
-                        send_streaming_chunk("unmute_timeout", {
-                            "message": "Voice assistant timeout"
-                        })
-                        break
-                    except websockets.exceptions.ConnectionClosed as e:
-                        print(f"Connection closed: {e}")
-                        send_streaming_chunk("unmute_error", {
-                            "message": f"Connection error: {str(e)}"
-                        })
-                        break
+                if text_done and audio_done:
+                    print(f"DEBUG - Response complete")
+                    send_streaming_chunk("unmute_complete", {
+                        "message": "Voice assistant response complete"
+                    })
+                    completed = True
+                    break
+                    
+            except json.JSONDecodeError:
+                print(f"Non-JSON response: {chunk}")
                 
-                print("Direct connection completed")
+        except asyncio.TimeoutError:
+            print("Timeout - no response received")
+            send_streaming_chunk("unmute_timeout", {
+                "message": "Voice assistant timeout"
+            })
+            break
+        except websockets.exceptions.ConnectionClosed as e:
+            print(f"Connection closed: {e}")
+            send_streaming_chunk("unmute_error", {
+                "message": f"Connection error: {str(e)}"
+            })
+            break
+    
+    print("Unmute exchange completed")
+    return completed
+
+
+async def stream_to_unmute(text_to_send: str, tag: str, patient_profile: dict):
+    """Run one Unmute exchange for the message and relay its text/audio chunks to the frontend."""
+    async with unmute_session() as session:
+        print("✓ Connected to Unmute")
         
-        # Run the direct connection in a new event loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            loop.run_until_complete(direct_unmute_connection())
-        finally:
-            loop.close()
+        # Send connection status
+        send_streaming_chunk("unmute_connected", {
+            "message": "Connected to voice assistant"
+        })
         
+        session.reusable = await relay_unmute_response(session.websocket, text_to_send, tag, patient_profile)
+
+def _unmute_failed(e: Exception):
+    print(f"DEBUG - Unmute connection failed: {str(e)}")
+    send_streaming_chunk("unmute_error", {
+        "message": f"Connection failed: {str(e)}"
+    })
+    import traceback
+    traceback.print_exc()
+
+def unmute_node(state: AgentState) -> AgentState:
+    """
+    Side-effect node that streams to Unmute and frontend.
+    Leases a ready session on the Unmute loop and blocks until the response is relayed.
+    """
+    text_to_send, tag = _unmute_message(state)
+    
+    print(f"DEBUG - unmute_node: Starting streaming for '{text_to_send}'")
+    
+    # Send streaming status
+    send_streaming_chunk("unmute_connecting", {
+        "message": "Connecting to voice assistant...",
+        "text": text_to_send
+    })
+    
+    try:
+        unmute_loop.run(stream_to_unmute(text_to_send, tag, state.get('patientProfile', {})))
     except Exception as e:
-        print(f"DEBUG - Direct connection failed: {str(e)}")
-        send_streaming_chunk("unmute_error", {
-            "message": f"Connection failed: {str(e)}"
-        })
-        import traceback
-        traceback.print_exc()
+        _unmute_failed(e)
     
     # Return None to terminate this branch (side-effect only)
     return None
 
+async def aunmute_node(state: AgentState) -> AgentState:
+    """Async variant of unmute_node: awaits the exchange running on the Unmute loop."""
+    text_to_send, tag = _unmute_message(state)
+    print(f"DEBUG - unmute_node: Starting streaming for '{text_to_send}'")
+    send_streaming_chunk("unmute_connecting", {
+        "message": "Connecting to voice assistant...",
+        "text": text_to_send
+    })
+    try:
+        await unmute_loop.run_async(stream_to_unmute(text_to_send, tag, state.get('patientProfile', {})))
+    except Exception as e:
+        _unmute_failed(e)
+    return None
+
 # --- UI Change Node (NEW, optional) ---
+UI_COMMAND_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", (
+        "You are a UI command classifier. Based on the user's input, determine which UI command should be executed.\n\n"
+        "Available commands:\n"
+        "- setMode(dark) - Switch to dark mode\n"
+        "- addFitness() - Add fitness treatment to patient profile\n"
+        "- addSleep() - Add sleep treatment to patient profile\n"
+        "- removeFitness() - Remove fitness treatment from patient profile\n"
+        "- removeSleep() - Remove sleep treatment from patient profile\n"
+        "- setMode(light) - Switch to light mode\n\n"
+        "Analyze the user's intent and respond with ONLY the exact command string that should be executed.\n"
+        "If no command matches the user's intent, respond with 'NONE'.\n\n"
+        "Examples:\n"
+        "- 'Switch to dark mode' → setMode(dark)\n"
+        "- 'Add fitness treatment' → addFitness()\n"
+        "- 'Remove sleep treatment' → removeSleep()\n"
+        "- 'Turn on light mode' → setMode(light)\n"
+    )),
+    ("human", "User input: {user_input}")
+])
+
+# Define available UI commands
+UI_COMMANDS = [
+    "setMode(dark)",
+    "addFitness()", 
+    "addSleep()",
+    "removeFitness()",
+    "removeSleep()",
+    "setMode(light)"
+]
+
+def _ui_llm_options() -> dict:
+    # Always Groq for UI commands
+    return {"temperature": 0, "provider": "groq", "model": getattr(settings, 'LLM_MODEL', None) or "llama3-8b-8192"}
+
+def _apply_ui_command(state: AgentState, user_input: str, command: str) -> AgentState:
+    print(f"DEBUG - UI Change Node: User input: '{user_input}'")
+    print(f"DEBUG - UI Change Node: LLM response: '{command}'")
+    
+    # Validate the command
+    if command in UI_COMMANDS:
+        state['function'] = command
+        print(f"DEBUG - UI Change Node: Setting function to: {command}")
+    elif command == 'NONE':
+        state['final_answer'] = "I don't understand what UI change you want me to make. Please be more specific."
+        print(f"DEBUG - UI Change Node: No matching command found")
+    else:
+        state['final_answer'] = f"Invalid command generated: {command}. Please try again."
+        print(f"DEBUG - UI Change Node: Invalid command generated: {command}")
+    
+    state['source'] = 'ui'
+    return state
+
+def _ui_command_failed(state: AgentState, e: Exception) -> AgentState:
+    print(f"DEBUG - UI Change Node: Error processing command: {str(e)}")
+    state['final_answer'] = f"Error processing UI command: {str(e)}"
+    state['source'] = 'ui'
+    return state
+
 def ui_change_node(state: AgentState) -> AgentState:
     """
     Use LLM to determine which UI command to execute based on user input.
     """
     user_input = state.get('input', '')
-    
-    # Choose model
-    if hasattr(settings, 'LLM_MODEL') and settings.LLM_MODEL:
-        llm = ChatGroq(
-            model=settings.LLM_MODEL,
-            temperature=0
-        )
-    else:
-        llm = ChatGroq(
-            model="llama3-8b-8192",
-            temperature=0
-        )
-
-    # Define available UI commands
-    available_commands = [
-        "setMode(dark)",
-        "addFitness()", 
-        "addSleep()",
-        "removeFitness()",
-        "removeSleep()",
-        "setMode(light)"
-    ]
-
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", (
-            "You are a UI command classifier. Based on the user's input, determine which UI command should be executed.\n\n"
-            "Available commands:\n"
-            "- setMode(dark) - Switch to dark mode\n"
-            "- addFitness() - Add fitness treatment to patient profile\n"
-            "- addSleep() - Add sleep treatment to patient profile\n"
-            "- removeFitness() - Remove fitness treatment from patient profile\n"
-            "- removeSleep() - Remove sleep treatment from patient profile\n"
-            "- setMode(light) - Switch to light mode\n\n"
-            "Analyze the user's intent and respond with ONLY the exact command string that should be executed.\n"
-            "If no command matches the user's intent, respond with 'NONE'.\n\n"
-            "Examples:\n"
-            "- 'Switch to dark mode' → setMode(dark)\n"
-            "- 'Add fitness treatment' → addFitness()\n"
-            "- 'Remove sleep treatment' → removeSleep()\n"
-            "- 'Turn on light mode' → setMode(light)\n"
-        )),
-        ("human", "User input: {user_input}")
-    ])
-
-    chain = prompt | llm
+    chain = UI_COMMAND_PROMPT | get_llm(**_ui_llm_options())
     
     try:
         result = chain.invoke({"user_input": user_input})
-        command = result.content.strip()
-        
-        print(f"DEBUG - UI Change Node: User input: '{user_input}'")
-        print(f"DEBUG - UI Change Node: LLM response: '{command}'")
-        
-        # Validate the command
-        if command in available_commands:
-            state['function'] = command
-            print(f"DEBUG - UI Change Node: Setting function to: {command}")
-        elif command == 'NONE':
-            state['final_answer'] = "I don't understand what UI change you want me to make. Please be more specific."
-            print(f"DEBUG - UI Change Node: No matching command found")
-        else:
-            state['final_answer'] = f"Invalid command generated: {command}. Please try again."
-            print(f"DEBUG - UI Change Node: Invalid command generated: {command}")
-        
-        state['source'] = 'ui'
-        
+        return _apply_ui_command(state, user_input, result.content.strip())
     except Exception as e:
-        print(f"DEBUG - UI Change Node: Error processing command: {str(e)}")
-        state['final_answer'] = f"Error processing UI command: {str(e)}"
-        state['source'] = 'ui'
-    
-    return state
+        return _ui_command_failed(state, e)
+
+async def aui_change_node(state: AgentState) -> AgentState:
+    user_input = state.get('input', '')
+    chain = UI_COMMAND_PROMPT | get_async_llm(**_ui_llm_options())
+    try:
+        result = await chain.ainvoke({"user_input": user_input})
+        return _apply_ui_command(state, user_input, result.content.strip())
+    except Exception as e:
+        return _ui_command_failed(state, e)
 
 # --- Processing Router Node (NEW) ---
 def processing_router_node(state: AgentState) -> AgentState:
@@ -1132,20 +1420,30 @@ def processing_router_node(state: AgentState) -> AgentState:
     
     return state
 
+def _node(name, func, afunc=None):
+    """
+    Graph node usable from both workflow.invoke() (Flask server) and workflow.ainvoke() (ASGI server).
+    Nodes without an async variant are run in LangGraph's worker threads under ainvoke().
+    Every run records a span (see utils/tracing.py).
+    """
+    if afunc is None:
+        return traced(name, func)
+    return RunnableLambda(traced(name, func), afunc=traced(name, afunc, asynchronous=True), name=func.__name__)
+
 # --- Build the LangGraph workflow (UPDATED with Parallel Execution) ---
 def build_workflow():
     graph = StateGraph(AgentState)
-    graph.add_node('conversational_context', conversational_context_node)
-    graph.add_node('llm_tagger', llm_tagger_node)
-    graph.add_node('unmute', unmute_node)
-    graph.add_node('processing_router', processing_router_node)
-    graph.add_node('semantic_precheck', semantic_memory_precheck_node)
-    graph.add_node('patient', patient_node)
-    graph.add_node('web', web_node)
-    graph.add_node('medical', medical_reasoning_node)
-    graph.add_node('semantic_update', semantic_update_node)
-    graph.add_node('ui_change', ui_change_node)
-    graph.add_node('postprocess', postprocess_node)
+    graph.add_node('conversational_context', _node('conversational_context', conversational_context_node, aconversational_context_node))
+    graph.add_node('llm_tagger', _node('llm_tagger', llm_tagger_node, allm_tagger_node))
+    graph.add_node('unmute', _node('unmute', unmute_node, aunmute_node))
+    graph.add_node('processing_router', _node('processing_router', processing_router_node))
+    graph.add_node('semantic_precheck', _node('semantic_precheck', semantic_memory_precheck_node, asemantic_memory_precheck_node))
+    graph.add_node('patient', _node('patient', patient_node))
+    graph.add_node('web', _node('web', web_node))
+    graph.add_node('medical', _node('medical', medical_reasoning_node, amedical_reasoning_node))
+    graph.add_node('semantic_update', _node('semantic_update', semantic_update_node, asemantic_update_node))
+    graph.add_node('ui_change', _node('ui_change', ui_change_node, aui_change_node))
+    graph.add_node('postprocess', _node('postprocess', postprocess_node, apostprocess_node))
 
     graph.set_entry_point('conversational_context')
 
@@ -1203,16 +1501,154 @@ def build_workflow():
     return graph.compile()
 
 
-def run_agent_workflow(user_input, memory, patient_profile, updates=None, conversation=None):
+# --- Warm agent runtime (compiled once per process) ---
+class AgentRuntime:
     """
-    Run the workflow in 'server' mode: takes user_input, memory, patient_profile, updates, conversation and returns the updated result state.
+    Holds the compiled workflow and the prebuilt tool registries so that requests
+    don't rebuild the graph or re-create LangChain Tool objects.
+    Call reload() to rebuild everything explicitly (e.g. after changing nodes or settings).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._workflow = None
+        self.tools = {}
+        self.tool_funcs = {}
+        self.patient_tool_metadata = []
+        self.loaded_at = None
+        self._build_tools()
+
+    def _build_tools(self):
+        from tools.memory_tools import create_memory_tools
+        tools = {
+            'patient': create_patient_tools(),
+            'memory': create_memory_tools(),
+            'web': create_web_tools()
+        }
+        tool_funcs = {
+            group: {t.name: t.func for t in group_tools} for group, group_tools in tools.items()
+        }
+        patient_tool_metadata = [
+            {"name": t.name, "description": t.description} for t in tools['patient']
+        ]
+        # Swap in only once everything is built, so concurrent requests never see a half-built registry
+        self.tools, self.tool_funcs, self.patient_tool_metadata = tools, tool_funcs, patient_tool_metadata
+
+    def _compile(self):
+        workflow = build_workflow()
+        if settings.DEBUG_GRAPH:
+            print(workflow.get_graph().draw_mermaid())
+        self.loaded_at = time.time()
+        self._workflow = workflow
+        return workflow
+
+    @property
+    def workflow(self):
+        if self._workflow is None:
+            with self._lock:
+                if self._workflow is None:
+                    self._compile()
+        return self._workflow
+
+    def reload(self):
+        """
+        Rebuild tool registries and recompile the workflow. The new workflow replaces the
+        old one only once compiled; requests already running finish on the old one.
+        """
+        with self._lock:
+            self._build_tools()
+            return self._compile()
+
+
+_runtime: Optional[AgentRuntime] = None
+_runtime_lock = threading.Lock()
+
+def get_runtime() -> AgentRuntime:
+    """Return the process-wide AgentRuntime, creating it on first use."""
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                _runtime = AgentRuntime()
+    return _runtime
+
+
+# --- Warm-up / readiness ---
+_warmup_lock = threading.Lock()
+_warmup_thread: Optional[threading.Thread] = None
+_warmup_error: Optional[str] = None
+_warmup_failed_at = 0.0
+_warm = False
+_unmute_pool_started = False
+
+def warm_up():
+    """
+    Load everything the first request would otherwise pay for: compiled graph,
+    tool registries, pooled LLM clients, the embedding model and Unmute sessions.
+    """
+    global _warmup_error, _warmup_failed_at, _warm, _unmute_pool_started
+    if settings.UNMUTE_POOL_SIZE > 0 and not _unmute_pool_started:
+        # Pre-connect Unmute sessions in the background; readiness doesn't wait for the voice server
+        _unmute_pool_started = True
+        unmute_loop.submit(unmute_pool.start())
+    try:
+        get_runtime().workflow
+        get_llm(temperature=0)
+        get_llm(temperature=0.3)
+        from modules.memory_operations import warm_up_embeddings
+        warm_up_embeddings()
+        if settings.LOCAL_ROUTER_ENABLED:
+            # Build the centroids from the decision log here, not inside the first request
+            local_router.load()
+        _warmup_error = None
+        _warm = True
+    except Exception as e:
+        _warmup_error = str(e)
+        _warmup_failed_at = time.time()
+        logger.error(f"Warm-up failed: {str(e)}")
+
+def start_warm_up() -> bool:
+    """
+    Run warm_up() in a background thread, unless it already succeeded, is running, or
+    failed less than WARMUP_RETRY_SECONDS ago. Returns True if a run was started.
     """
-    workflow = build_workflow()
+    global _warmup_thread
+    if _warm:
+        return False
+    with _warmup_lock:
+        if _warmup_thread is not None and _warmup_thread.is_alive():
+            return False
+        if _warmup_error and time.time() - _warmup_failed_at < settings.WARMUP_RETRY_SECONDS:
+            return False
+        _warmup_thread = threading.Thread(target=warm_up, name="agent-warmup", daemon=True)
+        _warmup_thread.start()
+        return True
+
+def _readiness_components() -> dict:
+    # Read from the loaders themselves, so components loaded lazily by requests count too
+    from modules.memory_operations import embeddings_ready
+    runtime = _runtime
+    return {
+        "graph": runtime is not None and runtime._workflow is not None,
+        "tools": runtime is not None,
+        "llm_clients": llm_registry.client_count() > 0,
+        "embeddings": embeddings_ready()
+    }
+
+def readiness_status() -> dict:
+    """Report which heavy components are loaded; 'ready' is True once all of them are hot."""
+    components = _readiness_components()
+    ready = all(components.values())
+    return {
+        "ready": ready,
+        "components": components,
+        "warming_up": _warmup_thread is not None and _warmup_thread.is_alive(),
+        "error": None if ready else _warmup_error
+    }
 
-    mermaid_code = workflow.get_graph().draw_mermaid()
-    print(mermaid_code)
 
-    initial_state: AgentState = {
+def _initial_state(user_input, memory, patient_profile, updates=None, conversation=None) -> AgentState:
+    return {
         'input': user_input,
         'memory': memory,
         'patientProfile': patient_profile,
@@ -1222,17 +1658,33 @@ def run_agent_workflow(user_input, memory, patient_profile, updates=None, conver
         'source': None,
         'error': None,
         'insights': None,
-        'route_tag': None
+        'route_tag': None,
+        'speculative_route': None
     }
+
+def _finish_trace(trace, result, timing: bool):
+    agent_metrics.record_request(time.perf_counter() - trace.started, result.get('route_tag') if isinstance(result, dict) else None)
+    if timing:
+        # Per-request waterfall for clients that asked for it ("timing": true)
+        send_streaming_chunk("timing", trace.waterfall())
+
+def run_agent_workflow(user_input, memory, patient_profile, updates=None, conversation=None, timing=False):
+    """
+    Run the workflow in 'server' mode: takes user_input, memory, patient_profile, updates, conversation and returns the updated result state.
+    """
+    workflow = get_runtime().workflow
+    initial_state = _initial_state(user_input, memory, patient_profile, updates, conversation)
     
     try:
-        result = workflow.invoke(initial_state)
+        with request_trace() as trace:
+            result = workflow.invoke(initial_state)
         
         # Send final result
         send_streaming_chunk("workflow_complete", {
             "message": "Agent processing complete",
             "result": result
         })
+        _finish_trace(trace, result, timing)
 
         return result
         
@@ -1241,4 +1693,24 @@ def run_agent_workflow(user_input, memory, patient_profile, updates=None, conver
         send_streaming_chunk("workflow_error", {
             "message": f"Workflow error: {str(e)}"
         })
-        raise
\ No newline at end of file
+        raise
+
+async def arun_agent_workflow(user_input, memory, patient_profile, updates=None, conversation=None, timing=False):
+    """Async variant of run_agent_workflow used by the ASGI server (workflow.ainvoke)."""
+    workflow = get_runtime().workflow
+    initial_state = _initial_state(user_input, memory, patient_profile, updates, conversation)
+
+    try:
+        with request_trace() as trace:
+            result = await workflow.ainvoke(initial_state)
+        send_streaming_chunk("workflow_complete", {
+            "message": "Agent processing complete",
+            "result": result
+        })
+        _finish_trace(trace, result, timing)
+        return result
+    except Exception as e:
+        send_streaming_chunk("workflow_error", {
+            "message": f"Workflow error: {str(e)}"
+        })
+        raise
@@ -1,11 +1,53 @@
 import uuid
+import threading
 from config.settings import settings
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 from datetime import datetime
+from utils.embedding_cache import EmbeddingCache
+from utils.vector_index import MemoryIndexStore
+from utils.memory_compaction import MemoryCompactor
 
-embedding_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+# The embedding model (or sidecar client) is created on first use or by warm_up_embeddings(),
+# so importing this module no longer downloads/loads sentence-transformers.
+_embedding_model = None
+_embedding_lock = threading.Lock()
+
+def get_embedding_model():
+    """Return the in-process SentenceTransformer or the embedding sidecar client, loading it once."""
+    global _embedding_model
+    if _embedding_model is None:
+        with _embedding_lock:
+            if _embedding_model is None:
+                if settings.EMBEDDING_SERVICE_URL:
+                    # One model copy per host, shared by all workers through the embedding sidecar
+                    from utils.embedding_client import EmbeddingServiceClient
+                    _embedding_model = EmbeddingServiceClient(settings.EMBEDDING_SERVICE_URL)
+                else:
+                    from sentence_transformers import SentenceTransformer
+                    _embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
+    return _embedding_model
+
+def embeddings_ready() -> bool:
+    return _embedding_model is not None
+
+def _encode_texts(texts: list) -> np.ndarray:
+    model = get_embedding_model()
+    if settings.EMBEDDING_SERVICE_URL:
+        return model(texts)
+    return model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+
+def warm_up_embeddings():
+    """Load the embedding model (or reach the sidecar) and run one encode so the first request is hot."""
+    _encode_texts(["warm up"])
+
+# Only memory texts (and queries) that haven't been seen before reach the model
+embedding_cache = EmbeddingCache(encoder=_encode_texts)
+memory_index = MemoryIndexStore(embedding_cache)
+memory_compactor = MemoryCompactor(embedding_cache)
+
+def _patient_key(state: dict) -> str:
+    profile = state.get("patientProfile") or {}
+    return str(profile.get("uid") or "default_patient")
 
 class MemoryOperations:
     @staticmethod
@@ -23,7 +65,11 @@ class MemoryOperations:
                 
             }
             memory.append(new_entry)
+            if settings.MEMORY_COMPACTION == "inline":
+                # Restatements of the new fact are merged into it; the list stays under MEMORY_MAX_ITEMS
+                memory = memory_compactor.compact_latest(memory)
             state['memory'] = memory
+            memory_index.insert(_patient_key(state), [m["text"] for m in memory])
             return state
         except Exception as e:
             state['error'] = f"Semantic memory update failed: {str(e)}"
@@ -44,16 +90,9 @@ class MemoryOperations:
                 state['results'] = []
                 return state
 
-            # Compute embeddings for all memory entries
+            # Exact search for small lists, IVF above ANN_INDEX_THRESHOLD (cached, normalized embeddings)
             memory_texts = [m["text"] for m in memory]
-            memory_embeddings = embedding_model.encode(
-                memory_texts,
-                convert_to_numpy=True
-            )
-            query_embedding = embedding_model.encode(query, convert_to_numpy=True)
-
-            scores = cosine_similarity([query_embedding], memory_embeddings)[0]
-            top_indices = scores.argsort()[::-1][:limit]
+            top_indices = memory_index.search(_patient_key(state), memory_texts, query, limit)
 
             # Return top results with their original structure
             results = [memory[i] for i in top_indices]
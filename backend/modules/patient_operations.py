@@ -1,13 +1,59 @@
-import os
 import json
-from config.settings import settings
-from langchain_groq import ChatGroq
-from langchain_ollama import ChatOllama
+from utils.llm_registry import get_llm
+from utils.json_patch import PatchError, apply_patch, validate_patch, patch_changes
+from utils.logging_config import logger
 from langchain_core.prompts import ChatPromptTemplate
 import re
 import ast
 import copy
 
+PROFILE_UPDATE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", (
+        "You are a precise assistant for updating patient records in JSON format.\n"
+        "Your job is to turn the user's request into a JSON Patch (RFC 6902) for the patient profile.\n\n"
+        "RULES:\n"
+        "1. Return ONLY a JSON array of patch operations - never the profile itself\n"
+        "2. Use 'replace' to change an existing value, 'add' with index '-' to append to a list, "
+        "'remove' with the item's index to delete a list item\n"
+        "3. Paths are JSON pointers into the profile shown (e.g. /age, /allergies/-, /treatment/0/medicationList/1)\n"
+        "4. ONLY update existing fields in the profile - never add new fields\n"
+        "5. Do NOT invent or hallucinate new information\n"
+        "6. ALWAYS return valid JSON with all property names in double quotes\n\n"
+        "EXAMPLES (profile: {{\"age\": 29, \"allergies\": [\"Peanuts\"], \"treatment\": [{{\"name\": \"Sleep\", "
+        "\"medicationList\": [\"Ibuprofen\"], \"dailyChecklist\": [\"Walk 30 minutes\"]}}]}}):\n"
+        "User: 'Add panadol to my medications'\n"
+        "Output: [{{\"op\": \"add\", \"path\": \"/treatment/0/medicationList/-\", \"value\": \"Panadol\"}}]\n\n"
+        "User: 'Add a new field called symptoms'\n"
+        "Output: []\n\n"
+        "User: 'Update my age to 40'\n"
+        "Output: [{{\"op\": \"replace\", \"path\": \"/age\", \"value\": 40}}]\n\n"
+        "User: 'I'm not allergic to peanuts anymore, but I am allergic to penicillin'\n"
+        "Output: [{{\"op\": \"remove\", \"path\": \"/allergies/0\"}}, "
+        "{{\"op\": \"add\", \"path\": \"/allergies/-\", \"value\": \"Penicillin\"}}]\n\n"
+        "IMPORTANT: If you cannot make the requested change (e.g., adding a new field), return [] without explanation.\n"
+    )),
+    ("human", "User: {user_input}\nProfile: {profile}\nOutput:")
+])
+
+# The LLM never sees or edits these (recommendations are stripped from its view)
+PROTECTED_PROFILE_PATHS = ("/uid", "/treatment/*/recommendations")
+
+def parse_profile_patch(text: str) -> list:
+    """Pull the JSON Patch array out of an LLM reply; a lone operation object is wrapped in a list."""
+    match = re.search(r'\[.*\]', text, re.DOTALL) or re.search(r'\{.*\}', text, re.DOTALL)
+    if not match:
+        return []
+    try:
+        patch = json.loads(match.group(0))
+    except Exception:
+        try:
+            patch = ast.literal_eval(match.group(0))
+        except Exception:
+            return []
+    if isinstance(patch, dict):
+        patch = [patch]
+    return patch if isinstance(patch, list) else []
+
 class PatientOperations:
     @staticmethod
     def read_patient_profile(state: dict) -> dict:
@@ -17,80 +63,41 @@ class PatientOperations:
 
     @staticmethod
     def update_patient_profile(state: dict) -> dict:
+        """
+        Ask the LLM for a JSON Patch instead of the whole profile, validate it against the
+        current profile and apply it locally. Also stores the patch ('profile_patch') and the
+        change records it implies ('profile_changes') on the state.
+        """
         user_input = state.get('user_input', '')
         current_profile = state.get('patientProfile', {})
         
         # Remove recommendations from profile before passing to LLM
         profile_without_recommendations = copy.deepcopy(current_profile)
-        for t in profile_without_recommendations['treatment']:
-            t.pop('recommendations', None)  # safer than del
+        treatments = profile_without_recommendations.get('treatment', [])
+        for t in treatments if isinstance(treatments, list) else []:
+            if isinstance(t, dict):
+                t.pop('recommendations', None)  # safer than del
             
-        # Use LLM to extract and update patient information
-        if getattr(settings, "USE_OLLAMA", False):
-            llm = ChatOllama(
-                model=settings.OLLAMA_MODEL,
-                base_url=settings.OLLAMA_BASE_URL,
-                temperature=0.3
-            )
-        else:
-            llm = ChatGroq(
-                model=settings.LLM_MODEL,
-                temperature=0.3
-            )
+        # Use LLM to turn the request into a patch
+        llm = get_llm(temperature=0)
 
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", (
-                "You are a precise assistant for updating patient records in JSON format.\n"
-                "Your job is to update the patient profile based on the user's request.\n\n"
-                "RULES:\n"
-                "1. ONLY update existing fields in the profile - never add new top-level fields\n"
-                "2. You CAN add items to existing lists (like medicationList, allergies, dailyChecklist)\n"
-                "3. You CAN update values within existing nested objects\n"
-                "4. If the user requests to add a completely new field that doesn't exist, return the original JSON unchanged\n"
-                "5. Always return the ENTIRE JSON in the exact same structure\n"
-                "6. Do NOT invent or hallucinate new information\n"
-                "7. ALWAYS return valid JSON with all property names in double quotes\n\n"
-                "EXAMPLES:\n"
-                "User: 'Add panadol to my medications'\n"
-                "Action: Add 'panadol' to the existing 'medicationList' array\n\n"
-                "User: 'Add a new field called symptoms'\n"
-                "Action: Return original JSON unchanged (new field not allowed)\n\n"
-                "User: 'Update my age to 40'\n"
-                "Action: Update the 'age' field to 40\n\n"
-                "User: 'Add walking to my daily checklist'\n"
-                "Action: Add 'walking' to the existing 'dailyChecklist' array\n\n"
-                "IMPORTANT: If you cannot make the requested change (e.g., adding a new field), return the original JSON without explanation.\n"
-            )),
-            ("human", "User: {user_input}\nProfile: {profile}\nOutput:")
-        ])
-        chain = prompt | llm
+        chain = PROFILE_UPDATE_PROMPT | llm
         llm_output = chain.invoke({
             "user_input": user_input,
             "profile": json.dumps(profile_without_recommendations)
         })
-        llm_json_str = str(llm_output.content)
-        match = re.search(r'\{.*\}', llm_json_str, re.DOTALL)
-        if match:
-            try:
-                updated_profile = json.loads(match.group(0))
-            except Exception:
-                try:
-                    updated_profile = ast.literal_eval(match.group(0))
-                except Exception:
-                    updated_profile = current_profile  # fallback
-        else:
-            updated_profile = current_profile  # fallback
+        patch = parse_profile_patch(str(llm_output.content))
 
-        # Add back recommendations to the updated profile
+        try:
+            validate_patch(current_profile, patch, protected=PROTECTED_PROFILE_PATHS)
+            updated_profile = apply_patch(current_profile, patch)
+            changes = patch_changes(current_profile, patch)
+        except PatchError as e:
+            logger.warning(f"Rejected profile patch {patch}: {str(e)}")
+            patch, updated_profile, changes = [], current_profile, []  # fallback
 
-        i = 0
-        for t in current_profile['treatment']:
-            if 'recommendations' in t:
-                updated_profile['treatment'][i]['recommendations'] = current_profile['treatment'][i]['recommendations']
-                i += 1
-
-        # if 'recommendations' in current_profile:
-        #     updated_profile['recommendations'] = current_profile['recommendations']
-            
+        print(f"DEBUG - Profile patch: {patch}")
         state['patientProfile'] = updated_profile
-        return state 
\ No newline at end of file
+        state['profile_patch'] = patch
+        state['profile_changes'] = changes
+        return state
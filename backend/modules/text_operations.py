@@ -2,25 +2,13 @@
 
 import json
 from config.settings import settings
+from utils.llm_registry import get_llm
 
 class TextOperations:
     @staticmethod
     def summarize_text(state: dict) -> dict:
         text = state.get('text', '')
-        from langchain_groq import ChatGroq
-        from langchain_ollama import ChatOllama
-        if settings.USE_OLLAMA:
-            llm = ChatOllama(
-                model=settings.OLLAMA_MODEL,
-                base_url=settings.OLLAMA_BASE_URL,
-                temperature=0.3
-            )
-        else:
-            llm = ChatGroq(
-                model=settings.LLM_MODEL,
-                temperature=0.3,
-                max_retries=settings.MAX_RETRIES
-            )
+        llm = get_llm(temperature=0.3, max_retries=settings.MAX_RETRIES)
         from langchain_core.prompts import ChatPromptTemplate
         prompt = ChatPromptTemplate.from_messages([
             ("system", (
@@ -44,20 +32,7 @@ class TextOperations:
     @staticmethod
     def extract_keywords(state: dict) -> dict:
         text = state.get('text', '')
-        from langchain_groq import ChatGroq
-        from langchain_ollama import ChatOllama
-        if settings.USE_OLLAMA:
-            llm = ChatOllama(
-                model=settings.OLLAMA_MODEL,
-                base_url=settings.OLLAMA_BASE_URL,
-                temperature=0.3
-            )
-        else:
-            llm = ChatGroq(
-                model=settings.LLM_MODEL,
-                temperature=0.3,
-                max_retries=settings.MAX_RETRIES
-            )
+        llm = get_llm(temperature=0.3, max_retries=settings.MAX_RETRIES)
         from langchain_core.prompts import ChatPromptTemplate
         prompt = ChatPromptTemplate.from_messages([
             ("system", (
@@ -82,19 +57,7 @@ class TextOperations:
     def respond_conversationally(state: dict) -> dict:
         text = state.get('text', '')
         from config.settings import settings
-        from langchain_groq import ChatGroq
-        from langchain_ollama import ChatOllama
-        if settings.USE_OLLAMA:
-            llm = ChatOllama(
-                model=settings.OLLAMA_MODEL,
-                base_url=settings.OLLAMA_BASE_URL,
-                temperature=0.3
-            )
-        else:
-            llm = ChatGroq(
-                model=settings.LLM_MODEL,
-                temperature=0.3
-            )
+        llm = get_llm(temperature=0.3)
         from langchain_core.prompts import ChatPromptTemplate
         prompt = ChatPromptTemplate.from_messages([
             ("system", "You are a helpful assistant. Respond conversationally to the following user message."),
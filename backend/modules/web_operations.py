@@ -1,30 +1,77 @@
+import threading
 from config.settings import settings
+from utils.search_cache import SearchCache
+
+class GoogleSearchClient:
+    """
+    Google Programmable Search client. The discovery-based service object is built once per
+    process; httplib2 connections aren't thread-safe, so each thread executes requests on
+    its own Http object while sharing the service.
+    """
+
+    def __init__(self, api_key: str = None, cx: str = None, endpoint: str = None, timeout: float = None):
+        self.api_key = api_key if api_key is not None else settings.GOOGLE_PSE_API_KEY
+        self.cx = cx if cx is not None else settings.GOOGLE_PSE_CX
+        self.endpoint = endpoint if endpoint is not None else settings.GOOGLE_PSE_ENDPOINT
+        self.timeout = timeout if timeout is not None else settings.WEB_SEARCH_TIMEOUT
+        self._service = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key and self.cx)
+
+    def service(self):
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    from googleapiclient.discovery import build
+                    client_options = {"api_endpoint": self.endpoint} if self.endpoint else None
+                    # Bundled discovery document: no fetch at build time
+                    self._service = build(
+                        "customsearch", "v1", developerKey=self.api_key,
+                        static_discovery=True, cache_discovery=False, client_options=client_options
+                    )
+        return self._service
+
+    def _http(self):
+        http = getattr(self._local, "http", None)
+        if http is None:
+            import httplib2
+            http = httplib2.Http(timeout=self.timeout)
+            self._local.http = http
+        return http
+
+    def search(self, query: str, num: int = 5) -> list:
+        search_results = self.service().cse().list(q=query, cx=self.cx, num=num).execute(http=self._http())
+        results = []
+        for item in search_results.get('items', []):
+            results.append({
+                'title': item.get('title', ''),
+                'link': item.get('link', ''),
+                'snippet': item.get('snippet', ''),
+                'displayLink': item.get('displayLink', '')
+            })
+        return results
+
+search_client = GoogleSearchClient()
+search_cache = SearchCache()
 
 class WebOperations:
     @staticmethod
     def search_web(state: dict) -> dict:
         query = state.get('query', '')
-        from googleapiclient.discovery import build
-        api_key = settings.GOOGLE_PSE_API_KEY
-        cx = settings.GOOGLE_PSE_CX
-        if not api_key or not cx:
+        if not search_client.configured:
             state['results'] = 'Google PSE API key or CX not set.'
             return state
-        service = build("customsearch", "v1", developerKey=api_key)
         try:
-            search_results = service.cse().list(q=query, cx=cx, num=5).execute()
-            results = []
-            for item in search_results.get('items', []):
-                results.append({
-                    'title': item.get('title', ''),
-                    'link': item.get('link', ''),
-                    'snippet': item.get('snippet', ''),
-                    'displayLink': item.get('displayLink', '')
-                })
+            if settings.WEB_SEARCH_CACHE_ENABLED:
+                results = search_cache.get_or_fetch(query, search_client.search)
+            else:
+                results = search_client.search(query)
             state['results'] = results if results else 'No results found.'
             return state
         except Exception as e:
             state['results'] = str(e)
-            return state 
-
-            
\ No newline at end of file
+            return state
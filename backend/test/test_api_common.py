@@ -0,0 +1,21 @@
+import unittest
+from unittest import mock
+from api_common import check_admin
+from config.settings import settings
+
+
+class TestAdminCheck(unittest.TestCase):
+    def test_admin_endpoints_are_disabled_without_a_token(self):
+        with mock.patch.object(settings, "ADMIN_TOKEN", ""):
+            self.assertEqual(check_admin("Bearer anything")[1], 403)
+
+    def test_bearer_token_must_match(self):
+        with mock.patch.object(settings, "ADMIN_TOKEN", "s3cret"):
+            self.assertIsNone(check_admin("Bearer s3cret"))
+            self.assertEqual(check_admin("Bearer wrong")[1], 401)
+            self.assertEqual(check_admin("s3cret")[1], 401)
+            self.assertEqual(check_admin(None)[1], 401)
+
+
+if __name__ == "__main__":
+    unittest.main()
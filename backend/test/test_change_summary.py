@@ -0,0 +1,37 @@
+import unittest
+from utils.change_summary import render_change, render_changes
+
+
+class TestChangeSummary(unittest.TestCase):
+    def test_common_changes_use_templates(self):
+        cases = [
+            ({"path": "age", "before": 25, "after": 26, "type": "modified"}, "Updated age from 25 to 26"),
+            ({"path": "treatment[Sleep].sleepQuality", "before": "good", "after": "poor", "type": "modified"},
+             "Changed sleep quality from good to poor"),
+            ({"path": "allergies", "before": None, "after": "penicillin", "type": "added"}, "Added allergy to penicillin"),
+            ({"path": "treatment[Sleep].medicationList", "before": None, "after": "Panadol", "type": "added"},
+             "Added Panadol to Sleep medications"),
+            ({"path": "treatment[Fitness].dailyChecklist", "before": "Stretch", "after": None, "type": "removed"},
+             "Removed Stretch from Fitness daily checklist"),
+            ({"path": "treatment[Sleep].appointment", "before": "", "after": "2024-09-01T10:00:00", "type": "modified"},
+             "Set Sleep appointment to 2024-09-01T10:00:00"),
+            ({"path": "treatment", "before": None, "after": {"name": "Diet", "medicationList": []}, "type": "added"},
+             "Added Diet treatment"),
+            ({"path": "bloodType", "before": "A-", "after": "A+", "type": "modified"}, "Changed blood type from A- to A+"),
+        ]
+        for change, expected in cases:
+            with self.subTest(path=change["path"]):
+                self.assertEqual(render_change(change), expected)
+
+    def test_ambiguous_changes_are_left_for_the_llm(self):
+        nested = {"path": "treatment[Sleep].schedule", "before": None, "after": {"morning": ["walk"]}, "type": "added"}
+        phrases, unphrased = render_changes([
+            {"path": "age", "before": 25, "after": 26, "type": "modified"},
+            nested,
+        ])
+        self.assertEqual(phrases, ["Updated age from 25 to 26"])
+        self.assertEqual(unphrased, [nested])
+
+
+if __name__ == "__main__":
+    unittest.main()
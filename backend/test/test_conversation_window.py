@@ -0,0 +1,112 @@
+import threading
+import time
+import unittest
+from utils.conversation_window import ConversationWindow, estimate_tokens
+
+
+def history(n: int, words: int = 30) -> list:
+    return [
+        {"sender": "user" if i % 2 == 0 else "ai",
+         "text": f"Message {i} about topic{i}. " + " ".join(["detail"] * words)}
+        for i in range(n)
+    ]
+
+
+class RecordingSummarizer:
+    """Summarizer stand-in that records what it was asked to fold."""
+
+    def __init__(self, delay: float = 0.0):
+        self.calls = []
+        self.delay = delay
+        self.done = threading.Event()
+
+    def __call__(self, summary: str, messages: list) -> str:
+        time.sleep(self.delay)
+        self.calls.append((summary, [m["text"].split(".")[0] for m in messages]))
+        self.done.set()
+        return f"{summary} | folded {len(messages)}".strip(" |")
+
+
+class TestConversationWindow(unittest.TestCase):
+    def window(self, **kwargs) -> ConversationWindow:
+        options = dict(window_size=6, token_budget=400, summary_tokens=80, cache_size=4)
+        options.update(kwargs)
+        return ConversationWindow(**options)
+
+    def wait_idle(self, window: ConversationWindow):
+        deadline = time.time() + 2
+        while window.stats()["pending"] and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_short_conversations_are_verbatim(self):
+        window = self.window(summarizer=RecordingSummarizer())
+        context = window.build("c1", history(4, words=2))
+        self.assertEqual(context.splitlines()[0], "User: Message 0 about topic0. detail detail")
+        self.assertNotIn("Summary", context)
+
+    def test_size_stays_flat_as_the_conversation_grows(self):
+        window = self.window(summarizer=RecordingSummarizer())
+        sizes = [estimate_tokens(window.build("c1", history(n))) for n in (10, 100, 1000)]
+        self.assertTrue(all(size <= 400 + 20 for size in sizes), sizes)
+        context = window.build("c1", history(1000))
+        self.assertIn("Message 999 about topic999", context)
+        self.assertIn("Summary of earlier conversation", context)
+
+    def test_summary_is_cached_and_folded_incrementally(self):
+        summarizer = RecordingSummarizer()
+        window = self.window(summarizer=summarizer)
+        convo = history(20)
+        window.build("c1", convo)
+        self.wait_idle(window)
+        self.assertEqual(summarizer.calls[0][1], [f"Message {i} about topic{i}" for i in range(14)])
+        # Same history: served from the cached summary, no new fold
+        context = window.build("c1", convo)
+        self.assertIn("folded 14", context)
+        self.assertEqual(len(summarizer.calls), 1)
+        # Two more messages: only the two that left the window are folded
+        convo += history(22)[20:]
+        window.build("c1", convo)
+        self.wait_idle(window)
+        self.assertEqual(summarizer.calls[1], ("folded 14", ["Message 14 about topic14", "Message 15 about topic15"]))
+        self.assertEqual(window.stats()["summary_hits"], 1)
+
+    def test_build_never_waits_for_the_summarizer(self):
+        window = self.window(summarizer=RecordingSummarizer(delay=0.5))
+        started = time.perf_counter()
+        context = window.build("c1", history(50))
+        self.assertLess(time.perf_counter() - started, 0.1)
+        # Until the fold lands, older messages appear as first-sentence extracts
+        self.assertIn("Message 43 about topic43.", context)
+        self.assertNotIn("Message 43 about topic43. detail", context)
+
+    def test_reused_cid_with_a_different_history_starts_over(self):
+        summarizer = RecordingSummarizer()
+        window = self.window(summarizer=summarizer)
+        window.build("conv-001", history(20))
+        self.wait_idle(window)
+        other = [{**m, "text": "other " + m["text"]} for m in history(20)]
+        context = window.build("conv-001", other)
+        self.assertNotIn("folded 14", context)
+        self.wait_idle(window)
+        self.assertEqual(summarizer.calls[1][0], "")
+
+    def test_oversized_window_is_squeezed_but_keeps_the_last_exchange(self):
+        window = self.window(token_budget=100, summarizer=RecordingSummarizer())
+        convo = history(6, words=60)
+        context = window.build("c1", convo)
+        lines = context.split("Latest messages:\n")[1].splitlines()
+        self.assertEqual(lines, [f"User: {convo[4]['text']}", f"AI: {convo[5]['text']}"])
+
+    def test_failed_fold_keeps_extracts(self):
+        def failing(summary, messages):
+            raise RuntimeError("rate limited")
+
+        window = self.window(summarizer=failing)
+        context = window.build("c1", history(20))
+        self.wait_idle(window)
+        self.assertIn("Message 13 about topic13.", context)
+        self.assertEqual(window.stats()["fold_errors"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
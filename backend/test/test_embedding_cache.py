@@ -0,0 +1,58 @@
+import unittest
+import numpy as np
+from utils.embedding_cache import EmbeddingCache
+
+
+class CountingEncoder:
+    """Deterministic fake encoder that records which texts it was asked to encode."""
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        vectors = []
+        for text in texts:
+            rng = np.random.default_rng(sum(text.encode("utf-8")) + len(text))
+            vectors.append(rng.standard_normal(self.dim))
+        return np.array(vectors)
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def test_only_new_texts_are_encoded(self):
+        encoder = CountingEncoder()
+        cache = EmbeddingCache(encoder=encoder, max_bytes=1 << 20)
+        cache.encode(["I like roses", "I am a fan of Chelsea"])
+        cache.encode(["I like roses", "I am a fan of Chelsea", "I sleep 8 hours"])
+        self.assertEqual(encoder.calls, [["I like roses", "I am a fan of Chelsea"], ["I sleep 8 hours"]])
+
+    def test_vectors_are_normalized_float32(self):
+        cache = EmbeddingCache(encoder=CountingEncoder(), max_bytes=1 << 20)
+        matrix = cache.matrix(["a", "b", "c"])
+        self.assertEqual(matrix.dtype, np.float32)
+        np.testing.assert_allclose(np.linalg.norm(matrix, axis=1), 1.0, rtol=1e-5)
+
+    def test_matrix_is_reused_for_same_memory_list(self):
+        encoder = CountingEncoder()
+        cache = EmbeddingCache(encoder=encoder, max_bytes=1 << 20)
+        first = cache.matrix(["a", "b"])
+        second = cache.matrix(["a", "b"])
+        self.assertIs(first, second)
+        self.assertEqual(len(encoder.calls), 1)
+
+    def test_lru_eviction_respects_budget(self):
+        encoder = CountingEncoder(dim=4)
+        # Room for two 4-dim float32 vectors
+        cache = EmbeddingCache(encoder=encoder, max_bytes=32)
+        cache.encode(["a"])
+        cache.encode(["b"])
+        cache.encode(["a"])  # touch "a" so "b" is least recently used
+        cache.encode(["c"])
+        self.assertEqual(cache.stats()["evictions"], 1)
+        cache.encode(["a"])
+        cache.encode(["b"])
+        self.assertEqual(encoder.calls[-1], ["b"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+from utils.json_patch import PatchError, apply_patch, validate_patch, patch_changes, parse_pointer
+
+PROFILE = {
+    "uid": "user-001",
+    "name": "Jane Smith",
+    "age": 29,
+    "bloodType": "A-",
+    "allergies": ["Peanuts"],
+    "treatment": [
+        {
+            "name": "Sleep",
+            "medicationList": ["Ibuprofen"],
+            "dailyChecklist": ["Take medication", "Walk 30 minutes"],
+            "appointment": "2024-08-15T09:00:00",
+            "recommendations": ["Stay hydrated"],
+            "sleepHours": 8,
+            "sleepQuality": "Excellent"
+        }
+    ]
+}
+PROTECTED = ("/uid", "/treatment/*/recommendations")
+
+
+class TestJsonPatch(unittest.TestCase):
+    def test_apply_replace_add_remove(self):
+        patch = [
+            {"op": "replace", "path": "/age", "value": 40},
+            {"op": "add", "path": "/treatment/0/medicationList/-", "value": "Panadol"},
+            {"op": "remove", "path": "/allergies/0"},
+        ]
+        validate_patch(PROFILE, patch, protected=PROTECTED)
+        updated = apply_patch(PROFILE, patch)
+        self.assertEqual(updated["age"], 40)
+        self.assertEqual(updated["treatment"][0]["medicationList"], ["Ibuprofen", "Panadol"])
+        self.assertEqual(updated["allergies"], [])
+        # The input document is never modified
+        self.assertEqual(PROFILE["age"], 29)
+        self.assertEqual(PROFILE["allergies"], ["Peanuts"])
+
+    def test_pointer_escapes(self):
+        self.assertEqual(parse_pointer("/a~1b/c~0d"), ["a/b", "c~d"])
+        self.assertEqual(apply_patch({"a/b": 1}, [{"op": "replace", "path": "/a~1b", "value": 2}]), {"a/b": 2})
+
+    def test_test_op_failure_aborts_patch(self):
+        with self.assertRaises(PatchError):
+            apply_patch(PROFILE, [{"op": "test", "path": "/age", "value": 30}])
+
+    def test_validation_rejects_patches_outside_the_profile_shape(self):
+        invalid = [
+            [{"op": "add", "path": "/symptoms", "value": ["cough"]}],            # new field
+            [{"op": "replace", "path": "/age", "value": "forty"}],               # type change
+            [{"op": "add", "path": "/allergies/-", "value": {"name": "x"}}],     # wrong item type
+            [{"op": "replace", "path": "/uid", "value": "someone-else"}],        # protected
+            [{"op": "add", "path": "/treatment/0/recommendations/-", "value": "x"}],
+            [{"op": "remove", "path": "/name"}],                                 # removes a field
+            [{"op": "remove", "path": "/allergies/3"}],                          # missing item
+            [{"op": "upsert", "path": "/age", "value": 1}],                      # unknown op
+            {"op": "replace", "path": "/age", "value": 1},                       # not a list
+        ]
+        for patch in invalid:
+            with self.subTest(patch=patch), self.assertRaises(PatchError):
+                validate_patch(PROFILE, patch, protected=PROTECTED)
+
+    def test_protected_paths_cover_their_ancestors(self):
+        invalid = [
+            [{"op": "replace", "path": "/treatment/0", "value": {"name": "Sleep"}}],
+            [{"op": "remove", "path": "/treatment/0"}],
+            [{"op": "replace", "path": "/treatment", "value": []}],
+            [{"op": "replace", "path": "", "value": {}}],
+            [{"op": "copy", "from": "/treatment/0/recommendations", "path": "/allergies/-"}],
+        ]
+        for patch in invalid:
+            with self.subTest(patch=patch), self.assertRaises(PatchError):
+                validate_patch(PROFILE, patch, protected=PROTECTED)
+        # Siblings of a protected path are still editable
+        validate_patch(PROFILE, [{"op": "replace", "path": "/treatment/0/sleepHours", "value": 7}], protected=PROTECTED)
+
+    def test_validation_sees_earlier_operations(self):
+        patch = [
+            {"op": "add", "path": "/allergies/-", "value": "Penicillin"},
+            {"op": "remove", "path": "/allergies/1"},
+        ]
+        validate_patch(PROFILE, patch, protected=PROTECTED)
+
+    def test_changes_are_read_off_the_patch(self):
+        patch = [
+            {"op": "replace", "path": "/age", "value": 40},
+            {"op": "replace", "path": "/name", "value": "Jane Smith"},  # no-op
+            {"op": "add", "path": "/treatment/0/medicationList/-", "value": "Panadol"},
+            {"op": "remove", "path": "/allergies/0"},
+        ]
+        self.assertEqual(patch_changes(PROFILE, patch), [
+            {"path": "age", "before": 29, "after": 40, "type": "modified"},
+            {"path": "treatment[Sleep].medicationList", "before": None, "after": "Panadol", "type": "added"},
+            {"path": "allergies", "before": "Peanuts", "after": None, "type": "removed"},
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
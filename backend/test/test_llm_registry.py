@@ -0,0 +1,35 @@
+import threading
+import unittest
+from types import SimpleNamespace
+from utils.llm_registry import LLMRegistry
+
+
+class TestLLMRegistryCounters(unittest.TestCase):
+    def test_hook_counters_are_exact_under_concurrency(self):
+        registry = LLMRegistry()
+        hooks = registry._event_hooks("groq")
+        on_request, on_response = hooks["request"][0], hooks["response"][0]
+
+        def worker():
+            for i in range(2000):
+                on_request(None)
+                on_response(SimpleNamespace(status_code=500 if i % 4 == 0 else 200))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(registry._requests["groq"], {"requests": 16000, "responses": 16000, "errors": 4000})
+
+    def test_close_keeps_counters_of_live_hooks(self):
+        registry = LLMRegistry()
+        on_request = registry._event_hooks("groq")["request"][0]
+        on_request(None)
+        registry.close()
+        on_request(None)
+        self.assertEqual(registry._requests["groq"]["requests"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
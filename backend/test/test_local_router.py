@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from utils.local_router import LocalRouter, RouteDecisionLog
+
+VOCAB = ["weather", "stock", "price", "medication", "allergies", "theme", "dark", "mode", "hello", "joke"]
+
+
+def bag_of_words(texts):
+    vectors = np.array([[float(word in text.split()) for word in VOCAB] + [0.01] for text in texts], dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+EXAMPLES = [
+    ("weather today", "web"), ("stock price", "web"), ("nvidia stock price", "web"),
+    ("my medication", "patient"), ("my allergies", "patient"), ("medication and allergies", "patient"),
+    ("dark theme", "ui_change"), ("dark mode", "ui_change"), ("theme mode", "ui_change"),
+]
+
+
+class TestLocalRouter(unittest.TestCase):
+    def test_confident_inputs_are_routed_locally(self):
+        router = LocalRouter(bag_of_words, threshold=0.8, min_examples=3, temperature=0.05)
+        router.fit([t for t, _ in EXAMPLES], [tag for _, tag in EXAMPLES])
+        self.assertEqual(router.predict("what is the stock price"), "web")
+        self.assertEqual(router.predict("switch to dark mode"), "ui_change")
+        self.assertEqual(router.predict("list my medication"), "patient")
+        self.assertEqual(router.stats()["local_predictions"], 3)
+
+    def test_ambiguous_or_untrained_inputs_fall_back(self):
+        router = LocalRouter(bag_of_words, threshold=0.8, min_examples=3, temperature=0.05)
+        self.assertIsNone(router.predict("stock price"))
+        router.fit([t for t, _ in EXAMPLES], [tag for _, tag in EXAMPLES])
+        self.assertIsNone(router.predict("tell me a joke"))
+        self.assertIsNone(router.predict("stock and medication"))
+        self.assertEqual(router.stats()["llm_fallbacks"], 3)
+
+    def test_decisions_are_logged_and_reloaded(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log = RouteDecisionLog(os.path.join(tmp, "routes.jsonl"))
+            router = LocalRouter(bag_of_words, decision_log=log, threshold=0.8, min_examples=3, temperature=0.05)
+            for text, tag in EXAMPLES:
+                router.observe(text, tag)
+            router.observe("not a tag", "something else")
+            router.load()
+            self.assertEqual(len(log.load()), len(EXAMPLES))
+            with open(log.path) as f:
+                self.assertNotIn("medication", f.read())
+
+            restarted = LocalRouter(bag_of_words, decision_log=log, threshold=0.8, min_examples=3, temperature=0.05)
+            restarted.load()
+            self.assertEqual(restarted.predict("weather in dubai"), "web")
+            self.assertEqual(restarted.stats()["examples"], {"web": 3, "patient": 3, "ui_change": 3})
+
+    def test_requests_never_load_the_log(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log = RouteDecisionLog(os.path.join(tmp, "routes.jsonl"))
+            trained = LocalRouter(bag_of_words, decision_log=log, threshold=0.8, min_examples=3, temperature=0.05)
+            trained.load()
+            for text, tag in EXAMPLES:
+                trained.observe(text, tag)
+
+            encoded = []
+            router = LocalRouter(lambda texts: encoded.extend(texts) or bag_of_words(texts), decision_log=log,
+                                 threshold=0.8, min_examples=3, temperature=0.05)
+            with mock.patch.object(router, "_load_in_background") as background:
+                self.assertIsNone(router.predict("weather in dubai"))
+            background.assert_called_once()
+            router.load()
+            # Centroids come from the logged vectors; nothing is re-encoded
+            self.assertEqual(encoded, [])
+            self.assertEqual(router.predict("weather in dubai"), "web")
+
+    def test_log_is_off_by_default_and_rotates(self):
+        self.assertEqual(RouteDecisionLog(path="").load(), [])
+        with tempfile.TemporaryDirectory() as tmp:
+            log = RouteDecisionLog(os.path.join(tmp, "routes.jsonl"), max_bytes=1)
+            vector = np.ones(4, dtype=np.float32)
+            for i in range(3):
+                log.append(f"key{i}", "web", vector)
+            self.assertEqual([r[0] for r in log.load()], ["key1", "key2"])
+            self.assertEqual(sorted(os.listdir(tmp)), ["routes.jsonl", "routes.jsonl.1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils.background_loop import BackgroundLoop
+from utils.medical_client import MedicalClient, CircuitOpenError, MedicalEndpointError
+
+
+class FakeMedicalServer:
+    """Replies to POSTs after `delay` seconds with `status`; counts requests."""
+
+    def __init__(self, status: int = 200, delay: float = 0.0, body: str = "medical answer"):
+        self.status = status
+        self.delay = delay
+        self.body = body
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                server.requests += 1
+                length = int(self.headers.get("Content-Length", 0))
+                json.loads(self.rfile.read(length) or b"{}")
+                time.sleep(server.delay)
+                payload = server.body.encode("utf-8")
+                try:
+                    self.send_response(server.status)
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/endpoint"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def unused_url() -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}/endpoint"
+
+
+class TestMedicalClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.loop = BackgroundLoop(name="test-medical-loop")
+
+    def setUp(self):
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.close()
+
+    def server(self, **kwargs) -> FakeMedicalServer:
+        server = FakeMedicalServer(**kwargs)
+        self.servers.append(server)
+        return server
+
+    def client(self, urls, **kwargs) -> MedicalClient:
+        options = dict(deadline=2.0, attempt_timeout=1.0, max_attempts=3, retry_backoff=0.01,
+                       breaker_threshold=3, breaker_reset=60.0, loop=self.loop)
+        options.update(kwargs)
+        return MedicalClient(urls, **options)
+
+    def test_sync_and_async_calls_reuse_the_pool(self):
+        server = self.server()
+        client = self.client([server.url])
+        self.assertEqual(client.post({"prompt": "hi"}).text, "medical answer")
+        self.assertEqual(asyncio.run(client.apost({"prompt": "hi"})).text, "medical answer")
+        stats = client.stats()["endpoints"][server.url]
+        self.assertEqual((stats["requests"], stats["successes"]), (2, 2))
+        self.assertGreater(stats["latency_ms"]["p50"], 0)
+
+    def test_retries_fail_over_to_a_healthy_endpoint(self):
+        broken = self.server(status=503)
+        healthy = self.server()
+        client = self.client([broken.url, healthy.url])
+        self.assertEqual(client.post({"prompt": "hi"}).status_code, 200)
+        self.assertEqual(client.stats()["retries"], 1)
+        self.assertEqual(client.stats()["endpoints"][broken.url]["failures"], 1)
+
+    def test_deadline_bounds_slow_endpoints(self):
+        slow = self.server(delay=1.0)
+        client = self.client([slow.url], deadline=0.3, attempt_timeout=5.0)
+        started = time.perf_counter()
+        with self.assertRaises(MedicalEndpointError):
+            client.post({"prompt": "hi"})
+        self.assertLess(time.perf_counter() - started, 0.6)
+        self.assertEqual(client.stats()["endpoints"][slow.url]["timeouts"], 1)
+
+    def test_circuit_opens_and_fails_fast(self):
+        client = self.client([unused_url()], max_attempts=1)
+        for _ in range(3):
+            with self.assertRaises(MedicalEndpointError):
+                client.post({"prompt": "hi"})
+        started = time.perf_counter()
+        with self.assertRaises(CircuitOpenError):
+            client.post({"prompt": "hi"})
+        self.assertLess(time.perf_counter() - started, 0.05)
+        self.assertEqual(client.stats()["fast_failures"], 1)
+
+    def test_half_open_probe_closes_the_circuit(self):
+        server = self.server(status=500)
+        client = self.client([server.url], max_attempts=1, breaker_threshold=1, breaker_reset=0.1)
+        client.post({"prompt": "hi"})
+        self.assertEqual(client.stats()["endpoints"][server.url]["state"], "open")
+        server.status = 200
+        time.sleep(0.15)
+        self.assertEqual(client.post({"prompt": "hi"}).status_code, 200)
+        self.assertEqual(client.stats()["endpoints"][server.url]["state"], "closed")
+
+    def test_hedged_request_wins_on_the_fast_endpoint(self):
+        slow = self.server(delay=0.8, body="slow")
+        fast = self.server(body="fast")
+        client = self.client([slow.url, fast.url], hedge_delay=0.1)
+        started = time.perf_counter()
+        self.assertEqual(client.post({"prompt": "hi"}).text, "fast")
+        self.assertLess(time.perf_counter() - started, 0.5)
+        stats = client.stats()
+        self.assertEqual((stats["hedges"], stats["hedge_wins"]), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
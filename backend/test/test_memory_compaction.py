@@ -0,0 +1,88 @@
+import re
+import unittest
+import zlib
+from datetime import datetime
+import numpy as np
+from utils.embedding_cache import EmbeddingCache
+from utils.memory_compaction import MemoryCompactor, compact_sessions
+from utils.session_store import MemorySessionStore
+
+
+def bag_of_words(texts):
+    """Hashed bag-of-words vectors: restatements with the same words are near-identical."""
+    vectors = np.zeros((len(texts), 256), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in re.findall(r"\w+", text.lower()):
+            vectors[row, zlib.crc32(word.encode()) % 256] += 1
+    return vectors
+
+
+def entry(text, day, hour=9, **extra):
+    return {"text": text, "datetime": f"{day:02d}_03_25_{hour:02d}_00", **extra}
+
+
+NOW = datetime(2025, 3, 31, 12, 0)
+
+
+class TestMemoryCompaction(unittest.TestCase):
+    def compactor(self, **kwargs):
+        options = dict(threshold=0.9, max_items=0, half_life_days=30)
+        options.update(kwargs)
+        return MemoryCompactor(EmbeddingCache(encoder=bag_of_words), **options)
+
+    def test_near_duplicates_merge_into_the_newest(self):
+        memory = [
+            entry("I sleep 8 hours", 1),
+            entry("I am allergic to peanuts", 2),
+            entry("i sleep 8 hours.", 5),
+            entry("I sleep 8 hours", 3),
+        ]
+        compacted = self.compactor().compact(memory, now=NOW)
+        self.assertEqual(compacted, [
+            entry("I am allergic to peanuts", 2),
+            entry("i sleep 8 hours.", 5, count=3),
+        ])
+
+    def test_counts_accumulate_across_runs(self):
+        compactor = self.compactor()
+        memory = compactor.compact([entry("I walk daily", 1), entry("I walk daily", 2)], now=NOW)
+        memory = compactor.compact(memory + [entry("I walk daily", 4)], now=NOW)
+        self.assertEqual(memory, [entry("I walk daily", 4, count=3)])
+        self.assertEqual(compactor.stats()["merged"], 2)
+
+    def test_inline_pass_folds_older_restatements_into_the_new_entry(self):
+        memory = [entry("I sleep 8 hours", 1), entry("I drink coffee", 2), entry("I sleep 8 hours", 3, count=2)]
+        compacted = self.compactor().compact_latest(memory + [entry("I sleep 8 hours", 10)], now=NOW)
+        self.assertEqual(compacted, [entry("I drink coffee", 2), entry("I sleep 8 hours", 10, count=4)])
+        # Nothing similar: the list is only appended to
+        fresh = memory + [entry("My appointment is on Friday", 10)]
+        self.assertEqual(self.compactor().compact_latest(fresh, now=NOW), fresh)
+
+    def test_cap_evicts_old_and_rarely_stated_facts(self):
+        memory = [
+            entry("old fact stated once", 1),
+            entry("old fact stated often", 1, count=20),
+            entry("recent fact", 30),
+            entry("another recent fact", 31),
+        ]
+        compacted = self.compactor(max_items=3, half_life_days=7).compact(memory, now=NOW)
+        self.assertEqual([m["text"] for m in compacted],
+                         ["old fact stated often", "recent fact", "another recent fact"])
+
+    def test_unparseable_datetimes_are_evicted_first(self):
+        memory = [{"text": "legacy", "datetime": "yesterday"}, entry("fact a", 30), entry("fact b", 31)]
+        compacted = self.compactor(max_items=2).compact(memory, now=NOW)
+        self.assertEqual([m["text"] for m in compacted], ["fact a", "fact b"])
+
+    def test_batch_job_compacts_stored_sessions(self):
+        store = MemorySessionStore()
+        store.save("s1", 0, {"memory": [entry("I sleep 8 hours", 1), entry("I sleep 8 hours", 2)], "conversation": {}})
+        store.save("s2", 0, {"memory": [entry("I run", 1)], "conversation": {}})
+        report = compact_sessions(store, self.compactor())
+        self.assertEqual(report, {"sessions": 2, "compacted": 1, "removed": 1, "conflicts": 0})
+        self.assertEqual(store.load("s1"), (2, {"memory": [entry("I sleep 8 hours", 2, count=2)], "conversation": {}}))
+        self.assertEqual(store.load("s2")[0], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import threading
+import unittest
+import numpy as np
+from utils.micro_batcher import MicroBatcher
+
+
+class TestMicroBatcher(unittest.TestCase):
+    def test_concurrent_requests_share_a_batch(self):
+        batches = []
+        release = threading.Event()
+
+        def encode(texts):
+            batches.append(list(texts))
+            release.wait(1)
+            return np.array([[float(len(t))] for t in texts])
+
+        batcher = MicroBatcher(encode, max_batch=64, max_wait_ms=50)
+        futures = [batcher.submit([f"text {i}" * (i + 1)]) for i in range(8)]
+        release.set()
+        results = [f.result(timeout=2) for f in futures]
+        self.assertEqual(sum(len(b) for b in batches), 8)
+        self.assertLess(len(batches), 8)
+        for i, vectors in enumerate(results):
+            self.assertEqual(vectors.shape, (1, 1))
+            self.assertEqual(vectors[0, 0], len(f"text {i}" * (i + 1)))
+
+    def test_batch_is_capped_at_max_batch(self):
+        batches = []
+        batcher = MicroBatcher(lambda texts: batches.append(len(texts)) or np.zeros((len(texts), 2)), max_batch=4, max_wait_ms=50)
+        futures = [batcher.submit(["a", "b"]) for _ in range(4)]
+        for f in futures:
+            f.result(timeout=2)
+        self.assertTrue(all(size <= 4 for size in batches))
+
+    def test_encoder_errors_propagate_to_callers(self):
+        def encode(texts):
+            raise RuntimeError("model unavailable")
+
+        batcher = MicroBatcher(encode, max_batch=8, max_wait_ms=1)
+        with self.assertRaises(RuntimeError):
+            batcher.encode(["a"], timeout=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
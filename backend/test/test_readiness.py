@@ -0,0 +1,58 @@
+import threading
+import unittest
+from unittest import mock
+import main
+from config.settings import settings
+
+
+class TestReadiness(unittest.TestCase):
+    def setUp(self):
+        for name, value in (("_warm", False), ("_warmup_thread", None), ("_warmup_error", None), ("_warmup_failed_at", 0.0)):
+            patcher = mock.patch.object(main, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_lazily_loaded_components_count_as_ready(self):
+        with mock.patch.object(main, "_runtime", None):
+            self.assertFalse(main.readiness_status()["components"]["tools"])
+            runtime = mock.Mock(_workflow=object())
+            with mock.patch.object(main, "_runtime", runtime), \
+                    mock.patch.object(main.llm_registry, "client_count", return_value=2), \
+                    mock.patch("modules.memory_operations.embeddings_ready", return_value=True):
+                status = main.readiness_status()
+        self.assertTrue(status["ready"])
+        self.assertIsNone(status["error"])
+
+    def test_failed_warm_up_is_retried_after_the_backoff(self):
+        attempts = []
+
+        def failing_warm_up():
+            attempts.append(1)
+            main._warmup_error, main._warmup_failed_at = "embedding model missing", now[0]
+
+        now = [1000.0]
+        with mock.patch.object(main, "warm_up", failing_warm_up), \
+                mock.patch.object(main.time, "time", lambda: now[0]), \
+                mock.patch.object(settings, "WARMUP_RETRY_SECONDS", 30):
+            self.assertTrue(main.start_warm_up())
+            main._warmup_thread.join()
+            now[0] += 10
+            self.assertFalse(main.start_warm_up())
+            now[0] += 30
+            self.assertTrue(main.start_warm_up())
+            main._warmup_thread.join()
+        self.assertEqual(len(attempts), 2)
+
+    def test_running_or_finished_warm_up_is_not_restarted(self):
+        release = threading.Event()
+        with mock.patch.object(main, "warm_up", release.wait):
+            self.assertTrue(main.start_warm_up())
+            self.assertFalse(main.start_warm_up())
+            release.set()
+            main._warmup_thread.join()
+        main._warm = True
+        self.assertFalse(main.start_warm_up())
+
+
+if __name__ == "__main__":
+    unittest.main()
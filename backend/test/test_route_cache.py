@@ -0,0 +1,55 @@
+import time
+import unittest
+from utils.route_cache import RouteCache, normalize_input, routing_fingerprint
+
+
+PROFILE = {
+    "uid": "123",
+    "name": "John Doe",
+    "allergies": ["pollen"],
+    "treatment": [{"name": "Sleep", "medicationList": ["aspirin"], "sleepHours": 7}]
+}
+
+
+class TestRouteCache(unittest.TestCase):
+    def test_normalized_inputs_share_an_entry(self):
+        cache = RouteCache(max_size=10, ttl_seconds=60)
+        self.assertTrue(cache.put("What are my medications?", PROFILE, "patient"))
+        self.assertEqual(cache.get("  what are my   MEDICATIONS ", PROFILE), "patient")
+        self.assertEqual(normalize_input("Switch to dark mode!"), "switch to dark mode")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 0))
+
+    def test_fingerprint_ignores_values_but_not_shape(self):
+        edited = {**PROFILE, "treatment": [{"name": "Sleep", "medicationList": ["ibuprofen"], "sleepHours": 5}]}
+        self.assertEqual(routing_fingerprint(PROFILE), routing_fingerprint(edited))
+        added = {**PROFILE, "treatment": PROFILE["treatment"] + [{"name": "Fitness"}]}
+        self.assertNotEqual(routing_fingerprint(PROFILE), routing_fingerprint(added))
+        cache = RouteCache(max_size=10, ttl_seconds=60)
+        cache.put("add fitness treatment", PROFILE, "modify_treatment")
+        self.assertIsNone(cache.get("add fitness treatment", added))
+
+    def test_ttl_expiry_and_lru_eviction(self):
+        cache = RouteCache(max_size=2, ttl_seconds=0.05)
+        cache.put("hi", PROFILE, "text")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("hi", PROFILE))
+        self.assertEqual(cache.stats()["expired"], 1)
+
+        cache = RouteCache(max_size=2, ttl_seconds=60)
+        cache.put("a", PROFILE, "text")
+        cache.put("b", PROFILE, "web")
+        cache.get("a", PROFILE)
+        cache.put("c", PROFILE, "medical")
+        self.assertIsNone(cache.get("b", PROFILE))
+        self.assertEqual(cache.get("a", PROFILE), "text")
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_unknown_tags_are_not_cached(self):
+        cache = RouteCache(max_size=10, ttl_seconds=60)
+        self.assertFalse(cache.put("hi", PROFILE, "i think this is text"))
+        self.assertIsNone(cache.get("hi", PROFILE))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import json
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from modules.web_operations import GoogleSearchClient
+from utils.search_cache import SearchCache, categorize_query
+
+
+class FakeSearchServer:
+    """Answers Custom Search list calls with one item per query; counts requests."""
+
+    def __init__(self, delay: float = 0.0):
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                params = parse_qs(urlparse(self.path).query)
+                server.requests.append((urlparse(self.path).path, params))
+                time.sleep(delay)
+                query = params.get("q", [""])[0]
+                body = json.dumps({"items": [{
+                    "title": f"Result for {query}", "link": "https://example.com",
+                    "snippet": f"{query} snippet", "displayLink": "example.com"
+                }]}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class TestSearchCache(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeSearchServer(delay=0.2)
+        self.client = GoogleSearchClient(api_key="test-key", cx="test-cx", endpoint=self.server.url, timeout=5)
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_client_builds_once_and_queries_the_endpoint(self):
+        self.assertEqual(self.client.search("bitcoin price")[0]["snippet"], "bitcoin price snippet")
+        service = self.client.service()
+        self.client.search("ethereum price")
+        self.assertIs(self.client.service(), service)
+        path, params = self.server.requests[0]
+        self.assertTrue(path.endswith("/customsearch/v1"))
+        self.assertEqual(params["key"], ["test-key"])
+        self.assertEqual(params["cx"], ["test-cx"])
+
+    def test_normalized_repeats_are_served_from_cache(self):
+        cache = SearchCache(max_size=16, ttls={"default": 60})
+        first = cache.get_or_fetch("Bitcoin price now?", self.client.search)
+        second = cache.get_or_fetch("  bitcoin   PRICE now", self.client.search)
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_concurrent_identical_queries_share_one_request(self):
+        cache = SearchCache(max_size=16, ttls={"default": 60})
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda _: cache.get_or_fetch("weather in dubai", self.client.search), range(8)))
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertTrue(all(r == results[0] for r in results))
+        self.assertEqual(cache.stats()["coalesced"], 7)
+
+    def test_entries_expire_per_category(self):
+        cache = SearchCache(max_size=16, ttls={"realtime": 0.05, "default": 60})
+        cache.get_or_fetch("nvidia stock price", self.client.search)
+        cache.get_or_fetch("population of china", self.client.search)
+        time.sleep(0.1)
+        cache.get_or_fetch("nvidia stock price", self.client.search)
+        cache.get_or_fetch("population of china", self.client.search)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(cache.stats()["expired"], 1)
+
+    def test_failures_are_not_cached(self):
+        cache = SearchCache(max_size=16, ttls={"default": 60})
+        calls = []
+
+        def failing(query):
+            calls.append(query)
+            raise RuntimeError("quota exceeded")
+
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                cache.get_or_fetch("latest covid cases", failing)
+        self.assertEqual(len(calls), 2)
+
+    def test_empty_results_are_only_cached_briefly(self):
+        cache = SearchCache(max_size=16, ttls={"default": 60, "empty": 0.05})
+        calls = []
+
+        def empty(query):
+            calls.append(query)
+            return []
+
+        cache.get_or_fetch("population of china", empty)
+        cache.get_or_fetch("population of china", empty)
+        time.sleep(0.1)
+        cache.get_or_fetch("population of china", empty)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cache.stats()["empty"], 2)
+        # Without an "empty" TTL they are never cached
+        uncached = SearchCache(max_size=16, ttls={"default": 60})
+        uncached.get_or_fetch("population of china", empty)
+        uncached.get_or_fetch("population of china", empty)
+        self.assertEqual(len(calls), 4)
+
+    def test_categories(self):
+        self.assertEqual(categorize_query("bitcoin price now"), "realtime")
+        self.assertEqual(categorize_query("weather in dubai tomorrow"), "weather")
+        self.assertEqual(categorize_query("earthquake in japan today"), "news")
+        self.assertEqual(categorize_query("current population of china"), "default")
+        self.assertEqual(categorize_query("capital of australia"), "default")
+
+
+if __name__ == "__main__":
+    unittest.main()
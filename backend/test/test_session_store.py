@@ -0,0 +1,209 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+import api_common
+from utils.json_patch import apply_patch, make_patch
+from utils.session_store import MemorySessionStore, SQLiteSessionStore, SessionConflictError, sqlite_path
+
+STATE = {
+    "memory": [{"text": f"fact {i}", "datetime": f"2025-01-{i % 28 + 1:02d}"} for i in range(200)],
+    "conversation": {"cid": "conv-001", "tags": [], "conversation": [{"role": "user", "content": "hi"}]},
+    "patientProfile": {
+        "uid": "user-001", "name": "Jane", "age": 29, "bloodType": "A-", "allergies": ["Peanuts"],
+        "treatment": {"medicationList": ["Ibuprofen"], "dailyChecklist": [], "appointment": "",
+                      "recommendations": [], "sleepHours": 8, "sleepQuality": "Good"},
+    },
+}
+
+
+def agent_response(memory, profile):
+    return {"updatedPatientProfile": profile, "updatedMemory": memory, "Updates": [], "extraInfo": "ok"}
+
+
+class TestMakePatch(unittest.TestCase):
+    def test_round_trips(self):
+        after = json.loads(json.dumps(STATE))
+        after["memory"].append({"text": "new fact", "datetime": "2025-02-01"})
+        after["patientProfile"]["age"] = 30
+        after["patientProfile"]["treatment"]["medicationList"] = ["Panadol"]
+        after["conversation"]["tags"] = ["sleep"]
+        del after["patientProfile"]["bloodType"]
+        patch = make_patch(STATE, after)
+        self.assertEqual(apply_patch(STATE, patch), after)
+        # Appending one memory costs one operation, not the whole list
+        self.assertIn({"op": "add", "path": "/memory/-", "value": after["memory"][-1]}, patch)
+        self.assertEqual(make_patch(STATE, STATE), [])
+
+    def test_rewritten_lists_are_replaced_whole(self):
+        before = {"memory": list(range(10))}
+        after = {"memory": list(range(1, 10))}
+        self.assertEqual(make_patch(before, after), [{"op": "replace", "path": "/memory", "value": after["memory"]}])
+        truncated = {"memory": list(range(9))}
+        self.assertEqual(make_patch(before, truncated), [{"op": "remove", "path": "/memory/9"}])
+
+
+class StoreContract:
+    def test_versions_and_conflicts(self):
+        self.assertEqual(self.store.load("s1"), (0, None))
+        self.assertEqual(self.store.save("s1", 0, STATE), 1)
+        version, document = self.store.load("s1")
+        self.assertEqual((version, document), (1, STATE))
+        document["memory"].clear()
+        self.assertEqual(len(self.store.load("s1")[1]["memory"]), 200)
+        with self.assertRaises(SessionConflictError) as ctx:
+            self.store.save("s1", 0, STATE)
+        self.assertEqual(ctx.exception.version, 1)
+        self.assertEqual(self.store.save("s1", 1, STATE), 2)
+        self.store.delete("s1")
+        self.assertEqual(self.store.load("s1"), (0, None))
+
+
+class TestMemorySessionStore(StoreContract, unittest.TestCase):
+    def setUp(self):
+        self.store = MemorySessionStore(max_sessions=2)
+
+    def test_least_recently_used_sessions_are_evicted(self):
+        for session_id in ("a", "b", "c"):
+            self.store.save(session_id, 0, {})
+        self.assertEqual(self.store.load("a"), (0, None))
+        self.assertEqual(self.store.stats()["sessions"], 2)
+
+
+class TestSQLiteSessionStore(StoreContract, unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "data", "sessions.db")
+        self.store = SQLiteSessionStore(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_state_survives_a_new_store(self):
+        self.store.save("s1", 0, STATE)
+        self.assertEqual(SQLiteSessionStore(self.path).load("s1"), (1, STATE))
+
+    def test_database_url(self):
+        self.assertEqual(sqlite_path("sqlite:///data/database.db"), "data/database.db")
+        self.assertEqual(sqlite_path("sqlite:////var/db/agent.db"), "/var/db/agent.db")
+        with self.assertRaises(ValueError):
+            sqlite_path("postgresql://localhost/agent")
+
+
+class TestSessionSync(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(api_common, "session_store", MemorySessionStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def turn(self, payload, token=None, memory_added=()):
+        data, session, error = api_common.resolve_session_request(payload, token)
+        self.assertIsNone(error)
+        request, error = api_common.parse_agent_request(data)
+        self.assertIsNone(error)
+        memory = request["memory"] + list(memory_added)
+        profile = json.loads(json.dumps(session["document"]["patientProfile"]))
+        result = {"memory": memory, "patientProfile": profile}
+        return api_common.commit_session(session, result, agent_response(memory, profile), request)
+
+    def start(self):
+        first = self.turn({"sessionId": None, "prompt": "hello", **STATE})
+        return first["sessionId"], first["sessionToken"]
+
+    def test_full_sync_then_constant_size_deltas(self):
+        first = self.turn({"sessionId": None, "prompt": "hello", **STATE})
+        self.assertEqual((first["version"], first["patch"]), (1, []))
+        self.assertNotIn("updatedMemory", first)
+        session_id, token = first["sessionId"], first["sessionToken"]
+
+        new_turn = {"role": "user", "content": "I slept badly"}
+        fact = {"text": "slept badly", "datetime": "2025-02-01"}
+        second = self.turn({
+            "sessionId": session_id, "baseVersion": 1, "prompt": "I slept badly",
+            "patch": [{"op": "add", "path": "/conversation/conversation/-", "value": new_turn}],
+        }, token, memory_added=[fact])
+        self.assertEqual(second["version"], 2)
+        self.assertEqual(second["patch"], [{"op": "add", "path": "/memory/-", "value": fact}])
+        # The token is only issued when the session starts
+        self.assertNotIn("sessionToken", second)
+
+        stored = api_common.session_state(session_id, token)
+        self.assertEqual(stored["version"], 2)
+        self.assertEqual(stored["state"]["conversation"]["conversation"][-1], new_turn)
+        self.assertEqual(stored["state"]["memory"][-1], fact)
+        # The stored profile keeps the client's nested shape
+        self.assertIn("treatment", stored["state"]["patientProfile"])
+
+    def test_stream_keeps_the_profile_shape(self):
+        profile = {"uid": "user-001", "treatment": [{"drug": "Ibuprofen", "dose": "200mg"}]}
+        data, session, _ = api_common.resolve_session_request({"sessionId": None, "prompt": "hi", **STATE,
+                                                               "patientProfile": profile})
+        request, _ = api_common.parse_agent_request(data)
+        result = {"patientProfile": request["patient_profile"], "memory": request["memory"], "final_answer": "ok"}
+        chunk = api_common.build_session_final_result(session, result, request)
+        self.assertEqual(chunk["data"]["patch"], [])
+        state = api_common.session_state(chunk["data"]["sessionId"], chunk["data"]["sessionToken"])
+        self.assertEqual(state["state"]["patientProfile"], profile)
+
+    def test_both_endpoints_store_the_same_profile(self):
+        profile = {"uid": "user-001", "name": "Jane", "treatment": [{"drug": "Ibuprofen"}]}
+        stored = []
+        for endpoint in ("agent", "stream"):
+            data, session, _ = api_common.resolve_session_request({"sessionId": None, "prompt": "hi", **STATE,
+                                                                   "patientProfile": profile})
+            request, _ = api_common.parse_agent_request(data)
+            result = {"patientProfile": request["patient_profile"], "memory": request["memory"], "final_answer": "ok"}
+            if endpoint == "agent":
+                response = api_common.build_agent_response(result, request)
+                data = api_common.commit_session(session, result, response, request)
+                self.assertEqual(data["extraInfo"], "ok")
+            else:
+                data = api_common.build_session_final_result(session, result, request)["data"]
+            stored.append(api_common.session_state(data["sessionId"], data["sessionToken"])["state"]["patientProfile"])
+        self.assertEqual(stored, [profile, profile])
+
+    def test_ids_are_issued_by_the_server_and_need_the_token(self):
+        session_id, token = self.start()
+        self.assertNotEqual(session_id, self.start()[0])
+        self.assertIsNone(api_common.session_state(session_id, None))
+        self.assertIsNone(api_common.session_state(session_id, "guess"))
+        for wrong in (None, "guess"):
+            _, _, error = api_common.resolve_session_request(
+                {"sessionId": session_id, "baseVersion": 1, "prompt": "x"}, wrong)
+            self.assertEqual(error, ({"error": "Unknown session"}, 404))
+        # A client-chosen id is not a way to create a session
+        _, _, error = api_common.resolve_session_request({"sessionId": "s1", "prompt": "hello", **STATE})
+        self.assertEqual(error[1], 404)
+
+    def test_versionless_write_does_not_reset_the_session(self):
+        session_id, token = self.start()
+        _, _, error = api_common.resolve_session_request({"sessionId": session_id, "prompt": "x", "memory": []}, token)
+        self.assertEqual(error[1], 409)
+        self.assertEqual(len(api_common.session_state(session_id, token)["state"]["memory"]), 200)
+
+    def test_stale_version_is_a_conflict(self):
+        session_id, token = self.start()
+        data, session, error = api_common.resolve_session_request(
+            {"sessionId": session_id, "baseVersion": 0, "prompt": "x"}, token)
+        self.assertEqual(error[1], 409)
+        self.assertEqual(error[0]["version"], 1)
+
+    def test_bad_patch_is_rejected(self):
+        session_id, token = self.start()
+        _, _, error = api_common.resolve_session_request({
+            "sessionId": session_id, "baseVersion": 1, "prompt": "x",
+            "patch": [{"op": "remove", "path": "/memory/999"}],
+        }, token)
+        self.assertEqual(error[1], 400)
+
+    def test_requests_without_session_are_untouched(self):
+        payload = {"prompt": "hello", **STATE}
+        self.assertEqual(api_common.resolve_session_request(payload), (payload, None, None))
+        with mock.patch.object(api_common, "session_store", None):
+            _, _, error = api_common.resolve_session_request({"sessionId": "s1", "baseVersion": 1, "prompt": "x"})
+            self.assertEqual(error[1], 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from unittest import mock
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+import main
+from config.settings import settings
+
+CONVERSATION = {"cid": "conv-001", "conversation": [
+    {"role": "user", "content": "What is a good bedtime?"},
+    {"role": "assistant", "content": "Around 10pm."},
+]}
+
+
+class TestSpeculativeTagging(unittest.TestCase):
+    def setUp(self):
+        self.record = mock.Mock()
+        for patcher in (
+            mock.patch.object(settings, "SPECULATIVE_TAGGING", True),
+            mock.patch.object(main, "_classify_route", return_value=("text", True)),
+            mock.patch.object(main, "_record_route", self.record),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_turn(self, analysis: str) -> dict:
+        with mock.patch.object(main, "get_llm", return_value=FakeListChatModel(responses=[analysis])):
+            state = main.conversational_context_node({"input": "and on weekends?", "conversation": CONVERSATION,
+                                                       "patientProfile": {}})
+        return main.llm_tagger_node(state)
+
+    def test_used_speculative_tag_is_recorded_once(self):
+        state = self.run_turn("NO_CONTEXT_NEEDED")
+        self.assertEqual(state["route_tag"], "text")
+        self.record.assert_called_once_with("and on weekends?", {}, "text")
+
+    def test_discarded_speculative_tag_is_not_recorded(self):
+        main._classify_route.side_effect = lambda user_input, profile: ("web" if "bedtime" in user_input else "text", True)
+        state = self.run_turn("CONTEXT_NEEDED\nModified user input: What is a good bedtime on weekends?")
+        self.assertEqual(state["route_tag"], "web")
+        # Only the rewritten input's decision, which llm_tagger_node routed on
+        self.record.assert_called_once_with("What is a good bedtime on weekends?", {}, "web")
+
+
+if __name__ == "__main__":
+    unittest.main()
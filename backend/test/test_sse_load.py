@@ -0,0 +1,41 @@
+import unittest
+from benchmarks.sse_load import StreamRecord, check_stream, parse_sse_event
+
+
+def stream(*types, status=200, content_type="text/event-stream; charset=utf-8", transport_error=None):
+    record = StreamRecord("TEXT", "Hi")
+    record.status = status
+    record.content_type = content_type
+    record.events = [(0.1 * i, kind, 20) for i, kind in enumerate(types)]
+    record.transport_error = transport_error
+    return record
+
+
+class TestSSEConformance(unittest.TestCase):
+    def test_event_blocks_are_parsed(self):
+        self.assertEqual(parse_sse_event('data: {"type": "keepalive"}')[0], "keepalive")
+        self.assertIsNone(parse_sse_event("data: not json")[0])
+        self.assertIsNone(parse_sse_event("data: [1, 2]")[0])
+
+    def test_stream_ending_with_one_terminal_chunk_conforms(self):
+        for terminal in ("final_result", "error"):
+            record = stream("streaming_started", "keepalive", "text_chunk", terminal)
+            self.assertEqual(check_stream(record), [])
+            self.assertEqual(record.outcome, terminal)
+        self.assertAlmostEqual(stream("keepalive", "streaming_started", "final_result").first_chunk(), 0.1)
+
+    def test_violations_are_reported(self):
+        self.assertEqual(check_stream(stream("streaming_started", "keepalive")),
+                         ["ended without final_result or error"])
+        self.assertEqual(check_stream(stream("final_result", "error")),
+                         ["2 terminal chunks: ['final_result', 'error']"])
+        self.assertEqual(check_stream(stream("error", "keepalive")), ["1 event(s) after error"])
+        self.assertEqual(check_stream(stream("text_chunk", None, "final_result", content_type="application/json")),
+                         ["content-type 'application/json'", "1 malformed event(s)"])
+        self.assertEqual(check_stream(stream("streaming_started", transport_error="ReadTimeout")),
+                         ["ended without final_result or error (ReadTimeout)"])
+        self.assertEqual(stream("streaming_started").outcome, "incomplete")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import copy
+import unittest
+from utils.structural_diff import diff_documents, format_path
+
+BEFORE = {
+    "age": 29,
+    "allergies": ["Peanuts", "Dust"],
+    "treatment": [
+        {"name": "Sleep", "medicationList": ["Ibuprofen"], "dailyChecklist": ["Walk 30 minutes"], "sleepHours": 8},
+        {"name": "Fitness", "medicationList": [], "dailyChecklist": ["Stretch"]},
+    ]
+}
+
+
+class TestStructuralDiff(unittest.TestCase):
+    def test_identical_documents_have_no_changes(self):
+        self.assertEqual(diff_documents(BEFORE, copy.deepcopy(BEFORE)), [])
+
+    def test_scalar_and_list_item_changes_are_compact(self):
+        after = copy.deepcopy(BEFORE)
+        after["age"] = 30
+        after["allergies"].insert(1, "Penicillin")
+        self.assertEqual(diff_documents(BEFORE, after), [
+            {"path": "age", "before": 29, "after": 30, "type": "modified"},
+            {"path": "allergies", "before": None, "after": "Penicillin", "type": "added"},
+        ])
+
+    def test_list_item_removal_and_in_place_edit(self):
+        after = copy.deepcopy(BEFORE)
+        after["allergies"] = ["Dust"]
+        after["treatment"][0]["dailyChecklist"] = ["Walk 45 minutes"]
+        self.assertEqual(diff_documents(BEFORE, after), [
+            {"path": "allergies", "before": "Peanuts", "after": None, "type": "removed"},
+            {"path": "treatment[Sleep].dailyChecklist", "before": "Walk 30 minutes", "after": "Walk 45 minutes", "type": "modified"},
+        ])
+
+    def test_treatments_are_matched_by_name_not_position(self):
+        after = copy.deepcopy(BEFORE)
+        after["treatment"].reverse()
+        after["treatment"][1]["medicationList"].append("Melatonin")
+        after["treatment"].append({"name": "Diet", "medicationList": [], "dailyChecklist": []})
+        del after["treatment"][0]  # Fitness
+        self.assertEqual(diff_documents(BEFORE, after), [
+            {"path": "treatment[Sleep].medicationList", "before": None, "after": "Melatonin", "type": "added"},
+            {"path": "treatment", "before": BEFORE["treatment"][1], "after": None, "type": "removed"},
+            {"path": "treatment", "before": None, "after": {"name": "Diet", "medicationList": [], "dailyChecklist": []}, "type": "added"},
+        ])
+
+    def test_added_and_removed_keys(self):
+        self.assertEqual(diff_documents({"a": 1, "b": 2}, {"a": 1, "c": 3}), [
+            {"path": "b", "before": 2, "after": None, "type": "removed"},
+            {"path": "c", "before": None, "after": 3, "type": "added"},
+        ])
+
+    def test_format_path(self):
+        self.assertEqual(format_path(["treatment", ("item", "Sleep"), "medicationList"]), "treatment[Sleep].medicationList")
+        self.assertEqual(format_path([("item", 2)]), "[2]")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from utils import tracing
+from utils.tracing import AgentMetrics, Histogram, llm_span_callback, request_trace, traced
+
+
+def fake_llm_call(prompt_tokens=10, completion_tokens=3):
+    message = AIMessage(content="ok", usage_metadata={
+        "input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    })
+    llm_span_callback.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]))
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(tracing, "agent_metrics", AgentMetrics())
+        self.metrics = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = Histogram("node_seconds", "Node latency", ("node",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 2.0):
+            histogram.observe(value, "web")
+        self.assertEqual(histogram.render(), [
+            "# HELP node_seconds Node latency",
+            "# TYPE node_seconds histogram",
+            'node_seconds_bucket{node="web",le="0.1"} 1',
+            'node_seconds_bucket{node="web",le="1.0"} 2',
+            'node_seconds_bucket{node="web",le="+Inf"} 3',
+            'node_seconds_sum{node="web"} 2.550000',
+            'node_seconds_count{node="web"} 3',
+        ])
+
+    def test_spans_record_latency_llm_usage_and_route(self):
+        def tagger(state):
+            fake_llm_call(12, 2)
+            fake_llm_call(8, 1)
+            time.sleep(0.01)
+            return {**state, "route_tag": "PATIENT"}
+
+        node = traced("llm_tagger", tagger)
+        with request_trace() as trace:
+            self.assertEqual(node({"input": "hi"})["route_tag"], "PATIENT")
+        span = trace.waterfall()["spans"][0]
+        self.assertEqual((span["node"], span["llm_calls"], span["prompt_tokens"], span["completion_tokens"]),
+                         ("llm_tagger", 2, 20, 3))
+        self.assertEqual(span["route_tag"], "PATIENT")
+        self.assertGreaterEqual(span["duration_ms"], 10)
+        rendered = self.metrics.render()
+        self.assertIn('agent_node_duration_seconds_count{node="llm_tagger",route="PATIENT"} 1', rendered)
+        self.assertIn('agent_node_llm_tokens_total{node="llm_tagger",kind="prompt"} 20', rendered)
+
+    def test_llm_calls_outside_a_node_are_ignored(self):
+        fake_llm_call()
+        self.assertNotIn("agent_node_llm_calls_total{", self.metrics.render())
+
+    def test_failing_node_is_recorded_and_reraised(self):
+        def broken(state):
+            raise ValueError("boom")
+
+        with request_trace() as trace:
+            with self.assertRaises(ValueError):
+                traced("web", broken)({})
+        self.assertEqual(trace.waterfall()["spans"][0]["error"], "ValueError: boom")
+        self.assertIn('agent_node_errors_total{node="web"} 1', self.metrics.render())
+
+    def test_concurrent_async_nodes_keep_their_own_spans(self):
+        async def medical(state):
+            await asyncio.sleep(0.02)
+            fake_llm_call(5, 5)
+            return state
+
+        async def web(state):
+            fake_llm_call(1, 1)
+            await asyncio.sleep(0.02)
+            return state
+
+        async def run():
+            with request_trace() as trace:
+                await asyncio.gather(traced("medical", medical, asynchronous=True)({}),
+                                     traced("web", web, asynchronous=True)({}))
+            return trace.waterfall()
+
+        waterfall = asyncio.run(run())
+        spans = {s["node"]: s for s in waterfall["spans"]}
+        self.assertEqual((spans["medical"]["prompt_tokens"], spans["web"]["prompt_tokens"]), (5, 1))
+        # Parallel branches overlap in the waterfall
+        self.assertLess(abs(spans["medical"]["start_ms"] - spans["web"]["start_ms"]), 10)
+        self.assertEqual(waterfall["llm_calls"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import asyncio
+import contextvars
+import json
+import unittest
+import websockets
+from utils.background_loop import BackgroundLoop
+from utils.unmute_pool import UnmuteSessionPool, await_session_updated
+
+
+class FakeUnmuteServer:
+    """Counts connections and echoes every message back."""
+
+    def __init__(self):
+        self.connections = 0
+        self.server = None
+        self.url = None
+
+    async def handler(self, websocket, path=None):
+        self.connections += 1
+        async for message in websocket:
+            await websocket.send(message)
+
+    async def start(self):
+        self.server = await websockets.serve(self.handler, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = f"ws://127.0.0.1:{port}"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class TestUnmuteSessionPool(unittest.TestCase):
+    def setUp(self):
+        self.loop = BackgroundLoop(name="test-unmute-loop")
+        self.server = FakeUnmuteServer()
+        self.loop.run(self.server.start())
+        self.initialized = 0
+
+    def tearDown(self):
+        self.loop.run(self.server.stop())
+
+    async def _connect(self):
+        websocket = await websockets.connect(self.server.url)
+        self.initialized += 1
+        return websocket
+
+    def test_leases_come_from_preconnected_sessions(self):
+        pool = UnmuteSessionPool(self._connect, size=2, max_sessions=4)
+
+        async def scenario():
+            await pool.start()
+            await asyncio.sleep(0.2)
+            async with pool.lease() as session:
+                await session.websocket.send("ping")
+                return await session.websocket.recv()
+
+        self.assertEqual(self.loop.run(scenario(), timeout=5), "ping")
+        stats = pool.stats()
+        self.assertEqual(stats["leases"], 1)
+        self.assertEqual(stats["pooled_lease_rate"], 1.0)
+        self.assertIn("p95", stats["wait_ms"])
+        self.loop.run(pool.close())
+
+    def test_sessions_are_recycled_unless_reuse_is_enabled(self):
+        pool = UnmuteSessionPool(self._connect, size=1, max_sessions=2, reuse=False)
+        reusing = UnmuteSessionPool(self._connect, size=1, max_sessions=2, reuse=True)
+
+        async def two_leases(p):
+            sockets = []
+            for _ in range(2):
+                async with p.lease() as session:
+                    sockets.append(session.websocket)
+                    session.reusable = True
+                await asyncio.sleep(0.1)
+            return sockets[0] is sockets[1]
+
+        self.assertFalse(self.loop.run(two_leases(pool), timeout=5))
+        self.assertTrue(self.loop.run(two_leases(reusing), timeout=5))
+        self.assertGreaterEqual(pool.stats()["recycled"], 2)
+        self.loop.run(pool.close())
+        self.loop.run(reusing.close())
+
+    def test_lease_waits_when_pool_is_at_capacity(self):
+        pool = UnmuteSessionPool(self._connect, size=1, max_sessions=1, lease_timeout=0.2)
+
+        async def scenario():
+            async with pool.lease():
+                with self.assertRaises(TimeoutError):
+                    async with pool.lease():
+                        pass
+
+        self.loop.run(scenario(), timeout=5)
+        self.assertEqual(pool.stats()["lease_timeouts"], 1)
+        self.loop.run(pool.close())
+
+    def _handshake(self, reply: dict, timeout: float = 1.0):
+        async def scenario():
+            # The echo server answers with whatever we send, standing in for the server's reply
+            async with websockets.connect(self.server.url) as websocket:
+                await websocket.send(json.dumps(reply))
+                return await await_session_updated(websocket, timeout)
+
+        return self.loop.run(scenario(), timeout=5)
+
+    def test_handshake_returns_on_session_updated(self):
+        self.assertTrue(self._handshake({"type": "session.updated"}))
+
+    def test_handshake_times_out_without_ack(self):
+        self.assertFalse(self._handshake({"type": "something.else"}, timeout=0.1))
+
+    def test_handshake_raises_on_server_error(self):
+        with self.assertRaises(RuntimeError):
+            self._handshake({"type": "error", "error": "bad voice"})
+
+    def test_background_loop_carries_caller_context(self):
+        var = contextvars.ContextVar("request", default=None)
+
+        async def read_var():
+            return var.get()
+
+        var.set("request-1")
+        self.assertEqual(self.loop.run(read_var(), timeout=2), "request-1")
+        self.assertEqual(asyncio.run(self.loop.run_async(read_var())), "request-1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import threading
+import unittest
+from unittest import mock
+import numpy as np
+from config.settings import settings
+from utils.embedding_cache import EmbeddingCache
+from utils.vector_index import BruteForceIndex, IVFIndex, MemoryIndexStore
+
+
+def random_unit_vectors(n, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class TestVectorIndex(unittest.TestCase):
+    def test_brute_force_matches_full_sort(self):
+        vectors = random_unit_vectors(200)
+        query = vectors[17]
+        ids, _ = BruteForceIndex(vectors).search(query, 5)
+        expected = np.argsort(-(vectors @ query))[:5]
+        self.assertEqual(list(ids), list(expected))
+
+    def test_ivf_probing_all_lists_is_exact(self):
+        vectors = random_unit_vectors(500)
+        index = IVFIndex(vectors, nlist=10, nprobe=10)
+        for q in (3, 250, 499):
+            ids, _ = index.search(vectors[q], 5)
+            expected = np.argsort(-(vectors @ vectors[q]))[:5]
+            self.assertEqual(list(ids), list(expected))
+
+    def test_ivf_incremental_insert_is_searchable(self):
+        vectors = random_unit_vectors(300)
+        index = IVFIndex(vectors[:200], nlist=8, nprobe=8)
+        index.add(vectors[200:])
+        self.assertEqual(len(index), 300)
+        ids, _ = index.search(vectors[250], 1)
+        self.assertEqual(int(ids[0]), 250)
+
+
+class TestMemoryIndexStore(unittest.TestCase):
+    def setUp(self):
+        self.encoded = []
+
+        def encoder(texts):
+            self.encoded.extend(texts)
+            return np.array([random_unit_vectors(1, seed=sum(t.encode()))[0] for t in texts])
+
+        self.release = threading.Event()
+        self.release.set()
+        self.store = MemoryIndexStore(EmbeddingCache(encoder=encoder, max_bytes=1 << 20))
+
+    def blocking_encoder(self, texts):
+        if "slow" in texts:
+            self.release.wait(5)
+        return np.array([random_unit_vectors(1, seed=sum(t.encode()))[0] for t in texts])
+
+    def test_appended_memories_are_inserted_incrementally(self):
+        texts = [f"memory {i}" for i in range(10)]
+        self.store.search("p1", texts, "memory 3", 3)
+        self.encoded.clear()
+        self.store.insert("p1", texts + ["memory 10"])
+        self.assertEqual(self.encoded, ["memory 10"])
+        self.assertEqual(self.store.stats()["p1"]["size"], 11)
+
+    def test_encoding_does_not_hold_the_index_lock(self):
+        self.store = MemoryIndexStore(EmbeddingCache(encoder=self.blocking_encoder, max_bytes=1 << 20))
+        self.release.clear()
+        slow = threading.Thread(target=self.store.search, args=("p1", ["slow", "memory 1"], "memory 1", 1))
+        slow.start()
+        try:
+            # Another patient's search finishes while p1's memories are still being encoded
+            done = threading.Thread(target=self.store.search, args=("p2", ["memory 2"], "memory 2", 1))
+            done.start()
+            done.join(2)
+            self.assertFalse(done.is_alive())
+        finally:
+            self.release.set()
+            slow.join()
+        self.assertEqual(sorted(self.store.stats()), ["p1", "p2"])
+
+    def test_auto_mode_switches_to_ivf_above_threshold(self):
+        with mock.patch.object(settings, "VECTOR_INDEX", "auto"), \
+             mock.patch.object(settings, "ANN_INDEX_THRESHOLD", 20):
+            texts = [f"memory {i}" for i in range(19)]
+            self.store.search("p1", texts, "memory 1", 3)
+            self.assertEqual(self.store.stats()["p1"]["kind"], "brute")
+            self.store.insert("p1", texts + ["memory 19"])
+            self.assertEqual(self.store.stats()["p1"]["kind"], "ivf")
+
+
+if __name__ == '__main__':
+    unittest.main()
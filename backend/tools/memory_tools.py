@@ -1,4 +1,4 @@
-from langchain.agents import Tool
+from langchain_core.tools import Tool
 from modules.memory_operations import MemoryOperations
 
 def create_memory_tools():
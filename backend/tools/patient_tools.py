@@ -1,4 +1,4 @@
-from langchain.agents import Tool
+from langchain_core.tools import Tool
 from modules.patient_operations import PatientOperations
 
 def create_patient_tools():
@@ -1,6 +1,6 @@
 # Text processing tools 
 
-from langchain.agents import Tool
+from langchain_core.tools import Tool
 from modules.text_operations import TextOperations
 
 def create_text_tools():
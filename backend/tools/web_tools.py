@@ -1,6 +1,6 @@
 # Google PSE search tools
 
-from langchain.agents import Tool
+from langchain_core.tools import Tool
 from modules.web_operations import WebOperations
 
 def create_web_tools():
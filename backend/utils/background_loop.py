@@ -0,0 +1,76 @@
+# Long-lived asyncio event loop on a daemon thread, shared by sync and async callers
+
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+from typing import Optional
+
+
+class BackgroundLoop:
+    """
+    Runs one event loop forever on a daemon thread. Objects bound to a loop (websocket
+    connections, asyncio locks) can live here for the whole process while Flask worker
+    threads and the ASGI event loop both schedule coroutines onto it.
+    The caller's context is carried into the scheduled task, so per-request context
+    variables (e.g. the streaming channel) keep working.
+    """
+
+    def __init__(self, name: str = "background-loop"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._thread = threading.Thread(target=loop.run_forever, name=self.name, daemon=True)
+                    self._thread.start()
+                    self._loop = loop
+        return self._loop
+
+    def in_loop(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """Schedule `coro` on the loop; returns a concurrent Future for its result."""
+        loop = self.loop
+        context = contextvars.copy_context()
+        result = concurrent.futures.Future()
+
+        def on_done(task: asyncio.Task):
+            if result.done():
+                return
+            if task.cancelled():
+                result.cancel()
+            elif task.exception() is not None:
+                result.set_exception(task.exception())
+            else:
+                result.set_result(task.result())
+
+        def start():
+            if result.cancelled():
+                coro.close()
+                return
+            # create_task copies the current context, which inside context.run is the caller's
+            task = context.run(loop.create_task, coro)
+            task.add_done_callback(on_done)
+            # Cancelling the returned future (e.g. the awaiting request went away) cancels the task
+            result.add_done_callback(lambda f: f.cancelled() and loop.call_soon_threadsafe(task.cancel))
+
+        loop.call_soon_threadsafe(start)
+        return result
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """Block the calling (non-loop) thread until `coro` finishes on the background loop."""
+        if self.in_loop():
+            raise RuntimeError("BackgroundLoop.run() called from the loop thread; await the coroutine instead")
+        return self.submit(coro).result(timeout=timeout)
+
+    async def run_async(self, coro):
+        """Await `coro` on the background loop from another event loop."""
+        return await asyncio.wrap_future(self.submit(coro))
@@ -0,0 +1,94 @@
+# Deterministic phrasing of structural-diff change records for the updates feed
+
+import re
+from typing import Any, List, Optional, Tuple
+
+# Human-readable names for profile fields; unknown camelCase fields are split into words
+FIELD_LABELS = {
+    "bloodType": "blood type",
+    "medicationList": "medications",
+    "dailyChecklist": "daily checklist",
+    "sleepHours": "sleep hours",
+    "sleepQuality": "sleep quality",
+}
+
+_SEGMENT = re.compile(r"([^.\[\]]+)|\[([^\]]*)\]")
+
+
+def _parse_path(path: str) -> Tuple[List[str], List[str]]:
+    """Split "treatment[Sleep].medicationList" into fields ["treatment", "medicationList"] and labels ["Sleep"]."""
+    fields, labels = [], []
+    for field, label in _SEGMENT.findall(path or ""):
+        if field:
+            fields.append(field)
+        else:
+            labels.append(label)
+    return fields, labels
+
+
+def field_label(field: str) -> str:
+    if field in FIELD_LABELS:
+        return FIELD_LABELS[field]
+    return re.sub(r"(?<=[a-z0-9])(?=[A-Z])", " ", field).lower()
+
+
+def _scalar(value: Any) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def _fmt(value: Any) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def render_change(change: dict) -> Optional[str]:
+    """Phrase one change record, or return None if no template fits (the caller asks the LLM)."""
+    fields, labels = _parse_path(change.get("path", ""))
+    if not fields:
+        return None
+    change_type = change.get("type")
+    before, after = change.get("before"), change.get("after")
+    field = fields[-1]
+    label = field_label(field)
+    # Inside a named treatment, say which one ("Sleep medications")
+    owner = labels[-1] if labels and not str(labels[-1]).isdigit() else None
+    target = f"{owner} {label}" if owner and not label.startswith(str(owner).lower()) else label
+
+    if field == "treatment" and change_type in ("added", "removed"):
+        item = after if change_type == "added" else before
+        if isinstance(item, dict) and item.get("name"):
+            return f"{'Added' if change_type == 'added' else 'Removed'} {item['name']} treatment"
+        return None
+
+    if change_type == "added" and before is None and _scalar(after):
+        if field == "allergies":
+            return f"Added allergy to {_fmt(after)}"
+        return f"Added {_fmt(after)} to {target}"
+
+    if change_type == "removed" and after is None and _scalar(before):
+        if field == "allergies":
+            return f"Removed allergy to {_fmt(before)}"
+        return f"Removed {_fmt(before)} from {target}"
+
+    if change_type == "modified" and _scalar(before) and _scalar(after):
+        if before in (None, ""):
+            return f"Set {target} to {_fmt(after)}"
+        if after in (None, ""):
+            return f"Cleared {target}"
+        verb = "Updated" if isinstance(after, (int, float)) and not isinstance(after, bool) else "Changed"
+        return f"{verb} {target} from {_fmt(before)} to {_fmt(after)}"
+
+    return None
+
+
+def render_changes(changes: list) -> Tuple[List[str], list]:
+    """Returns (phrases for the changes templates cover, changes left for the LLM)."""
+    phrases, unphrased = [], []
+    for change in changes:
+        phrase = render_change(change)
+        if phrase is None:
+            unphrased.append(change)
+        else:
+            phrases.append(phrase)
+    return phrases, unphrased
@@ -0,0 +1,197 @@
+# Token-budgeted conversation history: recent messages verbatim, older ones as a rolling summary
+
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+from config.settings import settings
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a patient (User) and a health "
+    "assistant (AI). Update the summary with the new messages. Keep the topics, symptoms, "
+    "medications and open questions the user may refer back to; drop greetings and filler. "
+    "Answer with the updated summary only, at most {max_words} words.\n\n"
+    "Current summary:\n{summary}\n\n"
+    "New messages:\n{messages}"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token); only used for budgeting."""
+    return (len(text) + 3) // 4
+
+
+def format_message(msg: dict) -> str:
+    sender = "User" if msg.get('sender') == 'user' else "AI"
+    return f"{sender}: {msg.get('text', '')}"
+
+
+def compress_message(msg: dict, max_chars: int = 160) -> str:
+    """First sentence of a message, clipped; the stand-in until the summarizer catches up."""
+    text = " ".join(str(msg.get('text', '')).split())
+    first = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+    if len(first) > max_chars:
+        first = first[:max_chars - 3].rstrip() + "..."
+    return format_message({**msg, 'text': first})
+
+
+def clip_tokens(text: str, max_tokens: int) -> str:
+    """Keep the newest part of `text` within max_tokens, cut at a line or word boundary."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    tail = text[-max_tokens * 4:]
+    cut = tail.find("\n")
+    if cut == -1:
+        cut = tail.find(" ")
+    return tail[cut + 1:] if cut != -1 else tail
+
+
+def _fingerprint(msg: dict) -> str:
+    return hashlib.sha1(json.dumps(msg, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ConversationWindow:
+    """
+    Builds the conversation context for the context analyzer within a token budget:
+
+    - the last `window_size` messages verbatim (oldest dropped first if they alone exceed
+      the budget, the latest two are always kept),
+    - everything older as a rolling summary cached per conversation id. The summary covers
+      a prefix of the history and is checked against that prefix's last message, so a
+      different conversation reusing the cid starts over. New older messages are folded in
+      incrementally by a background summarizer; until it finishes, they appear compressed
+      to their first sentence, so building the window never waits on an LLM.
+    """
+
+    def __init__(self, window_size: Optional[int] = None, token_budget: Optional[int] = None,
+                 summary_tokens: Optional[int] = None, cache_size: Optional[int] = None,
+                 summarizer: Optional[Callable[[str, List[dict]], str]] = None, use_llm: Optional[bool] = None):
+        self.window_size = window_size if window_size is not None else settings.MEMORY_WINDOW_SIZE
+        self.token_budget = token_budget if token_budget is not None else settings.CONVERSATION_TOKEN_BUDGET
+        self.summary_tokens = summary_tokens if summary_tokens is not None else settings.CONVERSATION_SUMMARY_TOKENS
+        self.cache_size = cache_size if cache_size is not None else settings.CONVERSATION_SUMMARY_CACHE_SIZE
+        use_llm = use_llm if use_llm is not None else settings.CONVERSATION_SUMMARY_LLM
+        self.summarizer = summarizer or (self._llm_summary if use_llm else self._extractive_summary)
+        self._summaries: "OrderedDict[str, dict]" = OrderedDict()  # cid -> {covered, anchor, text}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="conversation-summary")
+        self._builds = 0
+        self._summary_hits = 0
+        self._folds = 0
+        self._fold_errors = 0
+
+    def _extractive_summary(self, summary: str, messages: List[dict]) -> str:
+        # Newest messages matter most: walk back from the end and stop once the budget is full
+        lines, used = [], 0
+        for msg in reversed(messages):
+            line = compress_message(msg)
+            used += estimate_tokens(line) + 1
+            if used > self.summary_tokens and lines:
+                break
+            lines.append(line)
+        if summary and used < self.summary_tokens:
+            lines.append(summary)
+        return clip_tokens("\n".join(reversed(lines)), self.summary_tokens)
+
+    def _llm_summary(self, summary: str, messages: List[dict]) -> str:
+        from utils.llm_registry import get_llm
+        llm = get_llm(temperature=0)
+        # Fold in batches that fit the window budget, so a long backlog never makes one huge prompt
+        batch, size = [], 0
+        for i, msg in enumerate(messages):
+            line = format_message(msg)
+            batch.append(line)
+            size += estimate_tokens(line)
+            if size >= self.token_budget or i == len(messages) - 1:
+                result = llm.invoke(SUMMARY_PROMPT.format(
+                    max_words=int(self.summary_tokens * 0.75),
+                    summary=summary or "(empty)",
+                    messages="\n".join(batch)
+                ))
+                summary = clip_tokens(str(result.content).strip(), self.summary_tokens)
+                batch, size = [], 0
+        return summary
+
+    def _cached(self, cid: str, older: List[dict]) -> dict:
+        entry = self._summaries.get(cid)
+        if entry and 0 < entry["covered"] <= len(older) and _fingerprint(older[entry["covered"] - 1]) == entry["anchor"]:
+            self._summaries.move_to_end(cid)
+            return entry
+        return {"covered": 0, "anchor": None, "text": ""}
+
+    def _fold(self, cid: str, entry: dict, older: List[dict]):
+        try:
+            text = self.summarizer(entry["text"], older[entry["covered"]:])
+            with self._lock:
+                current = self._summaries.get(cid)
+                # Never replace a summary that already covers more of the conversation
+                if current is None or current["covered"] <= len(older):
+                    self._summaries[cid] = {"covered": len(older), "anchor": _fingerprint(older[-1]), "text": text}
+                    self._summaries.move_to_end(cid)
+                    while len(self._summaries) > self.cache_size:
+                        self._summaries.popitem(last=False)
+                self._folds += 1
+        except Exception as e:
+            with self._lock:
+                self._fold_errors += 1
+            print(f"DEBUG - Conversation summary update failed for {cid}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(cid)
+
+    def build(self, cid: str, history: List[dict]) -> str:
+        """Conversation context string for `history`, within the token budget."""
+        older = history[:-self.window_size] if self.window_size > 0 else list(history)
+        recent = list(history[len(older):])
+        summary = ""
+        with self._lock:
+            self._builds += 1
+            entry = self._cached(cid, older) if older else None
+            pending = older[entry["covered"]:] if entry else []
+            if entry and not pending:
+                self._summary_hits += 1
+            schedule = bool(pending) and cid not in self._pending
+            if schedule:
+                self._pending.add(cid)
+        if schedule:
+            self._executor.submit(self._fold, cid, entry, list(older))
+        if entry:
+            summary = self._extractive_summary(entry["text"], pending) if pending else entry["text"]
+
+        lines = [format_message(m) for m in recent]
+        used = estimate_tokens(summary) + sum(estimate_tokens(line) for line in lines)
+        # Squeeze the oldest verbatim messages into the summary until the window fits,
+        # always keeping the latest exchange verbatim
+        while len(lines) > 2 and used > self.token_budget:
+            lines.pop(0)
+            summary = self._extractive_summary(summary, [recent.pop(0)])
+            used = estimate_tokens(summary) + sum(estimate_tokens(line) for line in lines)
+
+        if summary:
+            return f"Summary of earlier conversation:\n{summary}\n\nLatest messages:\n" + "\n".join(lines)
+        return "\n".join(lines)
+
+    def clear(self):
+        with self._lock:
+            self._summaries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "window_size": self.window_size,
+                "token_budget": self.token_budget,
+                "summary_tokens": self.summary_tokens,
+                "conversations": len(self._summaries),
+                "builds": self._builds,
+                "summary_hits": self._summary_hits,
+                "folds": self._folds,
+                "fold_errors": self._fold_errors,
+                "pending": len(self._pending),
+            }
+
+
+conversation_window = ConversationWindow()
@@ -0,0 +1,123 @@
+# Content-hash keyed embedding cache for semantic memory search
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+import numpy as np
+from config.settings import settings
+
+
+def text_key(text: str) -> str:
+    """Stable content hash used as the cache key for a text."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    LRU cache of L2-normalized float32 embeddings keyed by content hash.
+    Only texts that have not been seen before are sent to the encoder, and the
+    stacked matrix for a memory list is cached so ranking is a single matrix product.
+    """
+
+    def __init__(self, encoder: Callable[[list], np.ndarray], max_bytes: Optional[int] = None, max_matrices: Optional[int] = None):
+        self._encoder = encoder
+        self.max_bytes = max_bytes if max_bytes is not None else settings.EMBEDDING_CACHE_MAX_BYTES
+        self.max_matrices = max_matrices if max_matrices is not None else settings.EMBEDDING_MATRIX_CACHE_SIZE
+        self._vectors = OrderedDict()
+        self._matrices = OrderedDict()
+        self._bytes = 0
+        self._matrix_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _store(self, key: str, vector: np.ndarray):
+        if key in self._vectors:
+            self._vectors.move_to_end(key)
+            return
+        self._vectors[key] = vector
+        self._bytes += vector.nbytes
+        while self._bytes > self.max_bytes and len(self._vectors) > 1:
+            _, evicted = self._vectors.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def encode(self, texts: list) -> np.ndarray:
+        """Return an (n, dim) normalized float32 matrix, encoding only cache misses in one batch."""
+        keys = [text_key(t) for t in texts]
+        found = {}
+        missing = []
+        with self._lock:
+            for key, text in zip(keys, texts):
+                vector = self._vectors.get(key)
+                if vector is not None:
+                    self._vectors.move_to_end(key)
+                    found[key] = vector
+                    self.hits += 1
+                elif key not in found:
+                    found[key] = None
+                    missing.append((key, text))
+                    self.misses += 1
+
+        if missing:
+            encoded = self._normalize(self._encoder([text for _, text in missing]))
+            with self._lock:
+                for (key, _), vector in zip(missing, encoded):
+                    found[key] = vector
+                    self._store(key, vector)
+
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack([found[key] for key in keys])
+
+    def matrix(self, texts: list) -> np.ndarray:
+        """Return the cached stacked embedding matrix for an ordered list of texts."""
+        keys = [text_key(t) for t in texts]
+        signature = text_key("\n".join(keys))
+        with self._lock:
+            cached = self._matrices.get(signature)
+            if cached is not None:
+                self._matrices.move_to_end(signature)
+                self.hits += len(keys)
+                return cached
+        matrix = self.encode(texts)
+        with self._lock:
+            if signature not in self._matrices:
+                self._matrices[signature] = matrix
+                self._matrix_bytes += matrix.nbytes
+            # Stacked matrices share the memory budget with the per-text vectors
+            while len(self._matrices) > 1 and (
+                len(self._matrices) > self.max_matrices or self._bytes + self._matrix_bytes > self.max_bytes
+            ):
+                _, evicted = self._matrices.popitem(last=False)
+                self._matrix_bytes -= evicted.nbytes
+        return matrix
+
+    def clear(self):
+        with self._lock:
+            self._vectors.clear()
+            self._matrices.clear()
+            self._bytes = 0
+            self._matrix_bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._vectors),
+            "bytes": self._bytes + self._matrix_bytes,
+            "max_bytes": self.max_bytes,
+            "matrices": len(self._matrices),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
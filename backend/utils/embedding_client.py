@@ -0,0 +1,37 @@
+# Client for the shared embedding service (embedding_service.py)
+
+import base64
+import httpx
+import numpy as np
+from config.settings import settings
+
+
+class EmbeddingServiceClient:
+    """
+    Callable encoder that sends texts to the embedding sidecar over localhost HTTP
+    or a Unix socket (url of the form unix:///path/to/socket). Drop-in replacement
+    for the local SentenceTransformer encoder used by EmbeddingCache.
+    """
+
+    def __init__(self, url: str, timeout: float = None):
+        if url.startswith("unix://"):
+            transport = httpx.HTTPTransport(uds=url[len("unix://"):])
+            base_url = "http://embedding-service"
+        else:
+            transport = httpx.HTTPTransport()
+            base_url = url.rstrip("/")
+        self._client = httpx.Client(
+            base_url=base_url,
+            transport=transport,
+            timeout=timeout or settings.EMBEDDING_SERVICE_TIMEOUT
+        )
+
+    def __call__(self, texts: list) -> np.ndarray:
+        response = self._client.post("/embed", json={"texts": list(texts)})
+        response.raise_for_status()
+        payload = response.json()
+        vectors = np.frombuffer(base64.b64decode(payload["data"]), dtype="<f4")
+        return vectors.reshape(payload["count"], payload["dim"])
+
+    def stats(self) -> dict:
+        return self._client.get("/stats").json()
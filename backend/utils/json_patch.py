@@ -0,0 +1,289 @@
+# RFC 6902 JSON Patch: validation against an existing document's shape, local apply, change records
+
+import copy
+import fnmatch
+from typing import Any, Iterable, List, Optional
+from utils.structural_diff import pointer_path
+
+PATCH_OPS = ("add", "remove", "replace", "test", "move", "copy")
+
+
+class PatchError(ValueError):
+    """Raised when a patch is malformed or doesn't fit the document it targets."""
+
+
+def parse_pointer(pointer: str) -> List[str]:
+    """Split an RFC 6901 JSON pointer into unescaped tokens ("" is the whole document)."""
+    if not isinstance(pointer, str):
+        raise PatchError(f"Path must be a string, got {type(pointer).__name__}")
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise PatchError(f"Path must start with '/': {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _index(container: list, token: str, allow_end: bool = False) -> int:
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise PatchError(f"Invalid array index {token!r}")
+    index = int(token)
+    limit = len(container) if allow_end else len(container) - 1
+    if index > limit:
+        raise PatchError(f"Array index {index} out of range")
+    return index
+
+
+def _resolve(doc: Any, tokens: List[str]) -> Any:
+    current = doc
+    for token in tokens:
+        if isinstance(current, dict):
+            if token not in current:
+                raise PatchError(f"Path segment {token!r} does not exist")
+            current = current[token]
+        elif isinstance(current, list):
+            current = current[_index(current, token)]
+        else:
+            raise PatchError(f"Cannot descend into {type(current).__name__} at {token!r}")
+    return current
+
+
+def get_value(doc: Any, pointer: str) -> Any:
+    return _resolve(doc, parse_pointer(pointer))
+
+
+def _add(doc: Any, tokens: List[str], value: Any) -> Any:
+    if not tokens:
+        return value
+    parent = _resolve(doc, tokens[:-1])
+    key = tokens[-1]
+    if isinstance(parent, dict):
+        parent[key] = value
+    elif isinstance(parent, list):
+        parent.insert(_index(parent, key, allow_end=True), value)
+    else:
+        raise PatchError(f"Cannot add to {type(parent).__name__}")
+    return doc
+
+
+def _remove(doc: Any, tokens: List[str]) -> Any:
+    if not tokens:
+        raise PatchError("Cannot remove the whole document")
+    parent = _resolve(doc, tokens[:-1])
+    key = tokens[-1]
+    if isinstance(parent, dict):
+        if key not in parent:
+            raise PatchError(f"Path segment {key!r} does not exist")
+        return parent.pop(key)
+    if isinstance(parent, list):
+        return parent.pop(_index(parent, key))
+    raise PatchError(f"Cannot remove from {type(parent).__name__}")
+
+
+def _check_operation(operation: Any) -> dict:
+    if not isinstance(operation, dict):
+        raise PatchError(f"Operation must be an object, got {type(operation).__name__}")
+    op = operation.get("op")
+    if op not in PATCH_OPS:
+        raise PatchError(f"Unsupported op {op!r}")
+    if "path" not in operation:
+        raise PatchError(f"'{op}' operation is missing 'path'")
+    if op in ("add", "replace", "test") and "value" not in operation:
+        raise PatchError(f"'{op}' operation is missing 'value'")
+    if op in ("move", "copy") and "from" not in operation:
+        raise PatchError(f"'{op}' operation is missing 'from'")
+    return operation
+
+
+def apply_patch(doc: Any, patch: Iterable[dict]) -> Any:
+    """Apply a patch to a deep copy of `doc`; all-or-nothing, the input is never modified."""
+    result = copy.deepcopy(doc)
+    for operation in patch:
+        operation = _check_operation(operation)
+        op = operation["op"]
+        tokens = parse_pointer(operation["path"])
+        if op == "add":
+            result = _add(result, tokens, copy.deepcopy(operation["value"]))
+        elif op == "remove":
+            _remove(result, tokens)
+        elif op == "replace":
+            _resolve(result, tokens)  # target must exist
+            if not tokens:
+                result = copy.deepcopy(operation["value"])
+            else:
+                _remove(result, tokens)
+                result = _add(result, tokens, copy.deepcopy(operation["value"]))
+        elif op == "test":
+            if _resolve(result, tokens) != operation["value"]:
+                raise PatchError(f"Test failed at {operation['path']}")
+        elif op == "move":
+            source = parse_pointer(operation["from"])
+            if tokens[:len(source)] == source and tokens != source:
+                raise PatchError("Cannot move a value into one of its children")
+            result = _add(result, tokens, _remove(result, source))
+        elif op == "copy":
+            value = copy.deepcopy(_resolve(result, parse_pointer(operation["from"])))
+            result = _add(result, tokens, value)
+    return result
+
+
+def _json_type(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, list):
+        return "array"
+    if isinstance(value, dict):
+        return "object"
+    return type(value).__name__
+
+
+def _same_shape(expected: Any, value: Any) -> bool:
+    # A null or empty-string placeholder accepts any scalar; containers must stay containers
+    if expected is None or expected == "":
+        return _json_type(value) not in ("array", "object")
+    return _json_type(expected) == _json_type(value)
+
+
+def _protected(pointer: str, protected: Iterable[str]) -> Optional[str]:
+    segments = pointer.split("/")
+    for pattern in protected:
+        if fnmatch.fnmatchcase(pointer, pattern) or fnmatch.fnmatchcase(pointer, pattern + "/*"):
+            return pattern
+        # Writing an ancestor (e.g. replacing /treatment/0) rewrites the protected value with it
+        pattern_segments = pattern.split("/")
+        if len(segments) < len(pattern_segments) and all(
+                fnmatch.fnmatchcase(segment, part) for segment, part in zip(segments, pattern_segments)):
+            return pattern
+    return None
+
+
+def validate_patch(doc: Any, patch: Any, protected: Iterable[str] = (), allow_new_keys: bool = False):
+    """
+    Check a patch against the current document, which acts as the schema: paths must exist,
+    replaced values keep their JSON type, added array items match their siblings, and
+    (unless allow_new_keys) objects never gain new keys. `protected` holds pointer globs
+    (e.g. "/treatment/*/recommendations") that may not be touched, read, or rewritten through
+    one of their ancestors. Raises PatchError.
+    """
+    if not isinstance(patch, list):
+        raise PatchError(f"Patch must be a list of operations, got {type(patch).__name__}")
+    protected = tuple(protected)
+    working = copy.deepcopy(doc)
+    for operation in patch:
+        operation = _check_operation(operation)
+        op = operation["op"]
+        targets = [operation["path"]] + ([operation["from"]] if op in ("move", "copy") else [])
+        for pointer in targets:
+            pattern = _protected(pointer, protected)
+            if pattern and op != "test":
+                raise PatchError(f"Path {pointer} is protected ({pattern})")
+        tokens = parse_pointer(operation["path"])
+        if op in ("add", "copy", "move") and tokens:
+            parent = _resolve(working, tokens[:-1])
+            if isinstance(parent, dict) and tokens[-1] not in parent and not allow_new_keys:
+                raise PatchError(f"New field {operation['path']} is not part of the document")
+            if isinstance(parent, list) and op == "add" and parent:
+                if not _same_shape(parent[0], operation["value"]):
+                    raise PatchError(
+                        f"Item for {operation['path']} should be {_json_type(parent[0])}, "
+                        f"got {_json_type(operation['value'])}"
+                    )
+            if isinstance(parent, dict) and tokens[-1] in parent and op == "add":
+                if not _same_shape(parent[tokens[-1]], operation["value"]):
+                    raise PatchError(f"Value for {operation['path']} changes its type")
+        elif op == "replace":
+            if not _same_shape(_resolve(working, tokens), operation["value"]):
+                raise PatchError(
+                    f"Value for {operation['path']} should be {_json_type(_resolve(working, tokens))}, "
+                    f"got {_json_type(operation['value'])}"
+                )
+        elif op == "remove" and tokens:
+            parent = _resolve(working, tokens[:-1])
+            if isinstance(parent, dict) and not allow_new_keys:
+                raise PatchError(f"Cannot remove field {operation['path']} (clear it instead)")
+        # Later operations see the effect of earlier ones
+        working = apply_patch(working, [operation])
+
+
+def patch_changes(before: Any, patch: Iterable[dict]) -> list:
+    """
+    Change records ({"path", "before", "after", "type"}) for a patch that applies to `before`,
+    read off the operations instead of diffing the two documents.
+    """
+    changes = []
+    working = copy.deepcopy(before)
+    for operation in patch:
+        op = operation["op"]
+        tokens = parse_pointer(operation["path"])
+        if not tokens or op == "test":
+            working = apply_patch(working, [operation])
+            continue
+        parent = _resolve(working, tokens[:-1])
+        in_list = isinstance(parent, list)
+        # List item changes are reported against the list, e.g. "allergies" rather than "allergies[2]"
+        path = pointer_path(working, tokens[:-1] if in_list else tokens)
+        if op == "add":
+            if in_list or tokens[-1] not in parent:
+                changes.append({"path": path, "before": None, "after": operation["value"], "type": "added"})
+            elif parent[tokens[-1]] != operation["value"]:
+                changes.append({"path": path, "before": parent[tokens[-1]], "after": operation["value"], "type": "modified"})
+        elif op == "remove":
+            changes.append({"path": path, "before": _resolve(working, tokens), "after": None, "type": "removed"})
+        elif op == "replace":
+            old = _resolve(working, tokens)
+            if old != operation["value"]:
+                changes.append({"path": pointer_path(working, tokens), "before": old,
+                                "after": operation["value"], "type": "modified"})
+        elif op in ("move", "copy"):
+            source = parse_pointer(operation["from"])
+            value = _resolve(working, source)
+            if op == "move":
+                changes.append({"path": pointer_path(working, source), "before": value, "after": None, "type": "removed"})
+            changes.append({"path": path, "before": None, "after": value, "type": "added"})
+        working = apply_patch(working, [operation])
+    return changes
+
+
+def _escape(token: Any) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def make_patch(before: Any, after: Any, path: str = "") -> List[dict]:
+    """
+    A patch turning `before` into `after`. Objects are walked key by key; lists keep their
+    common prefix and only the tail is rewritten, so appending to a long list (memory,
+    conversation turns) costs one "add /-" per new item. Anything else is a "replace".
+    """
+    if before == after:
+        return []
+    if isinstance(before, dict) and isinstance(after, dict):
+        patch = []
+        for key in before:
+            if key not in after:
+                patch.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in after.items():
+            child = f"{path}/{_escape(key)}"
+            if key not in before:
+                patch.append({"op": "add", "path": child, "value": copy.deepcopy(value)})
+            else:
+                patch.extend(make_patch(before[key], value, child))
+        return patch
+    if isinstance(before, list) and isinstance(after, list):
+        common = 0
+        while common < min(len(before), len(after)) and before[common] == after[common]:
+            common += 1
+        # Removed from the end first so the remaining indices stay valid
+        patch = [{"op": "remove", "path": f"{path}/{index}"} for index in range(len(before) - 1, common - 1, -1)]
+        patch.extend({"op": "add", "path": f"{path}/-", "value": copy.deepcopy(item)} for item in after[common:])
+        if len(patch) > len(after) // 2 + 1 and path:
+            # Mostly rewritten: one replace is smaller than per-item operations
+            return [{"op": "replace", "path": path, "value": copy.deepcopy(after)}]
+        return patch
+    return [{"op": "replace", "path": path, "value": copy.deepcopy(after)}]
@@ -0,0 +1,276 @@
+# Shared LLM client registry backed by pooled keep-alive connections
+
+import asyncio
+import threading
+import weakref
+from typing import Optional
+import httpx
+from config.settings import settings
+from utils.tracing import llm_span_callback
+
+
+class LLMRegistry:
+    """
+    Process-wide cache of chat model clients keyed by (provider, model, temperature).
+    All clients of a provider share one pooled httpx transport, so connections
+    (and their TLS sessions) are reused across nodes and concurrent requests.
+
+    Async clients (get_async) get their own pooled transport per event loop, because
+    asyncio connections cannot be shared between loops.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Hooks and cache lookups run on many threads; counters are only touched under this lock
+        self._counter_lock = threading.Lock()
+        self._llms = {}
+        self._transports = {}
+        self._http_clients = {}
+        self._hits = 0
+        self._misses = 0
+        self._requests = {}
+        # event loop -> {"transports": {...}, "http_clients": {...}, "llms": {...}}
+        self._async_state = weakref.WeakKeyDictionary()
+
+    # --- Pooled HTTP plumbing ---
+    def _event_hooks(self, provider: str, asynchronous: bool = False) -> dict:
+        with self._counter_lock:
+            counters = self._requests.setdefault(provider, {"requests": 0, "responses": 0, "errors": 0})
+
+        def on_request(request):
+            with self._counter_lock:
+                counters["requests"] += 1
+
+        def on_response(response):
+            with self._counter_lock:
+                counters["responses"] += 1
+                if response.status_code >= 400:
+                    counters["errors"] += 1
+
+        if asynchronous:
+            # httpx.AsyncClient awaits its hooks
+            async def on_request_async(request):
+                on_request(request)
+
+            async def on_response_async(response):
+                on_response(response)
+
+            return {"request": [on_request_async], "response": [on_response_async]}
+        return {"request": [on_request], "response": [on_response]}
+
+    @staticmethod
+    def _limits() -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=settings.LLM_POOL_KEEPALIVE_EXPIRY
+        )
+
+    def _get_transport(self, provider: str) -> httpx.HTTPTransport:
+        transport = self._transports.get(provider)
+        if transport is None:
+            transport = httpx.HTTPTransport(limits=self._limits(), retries=1)
+            self._transports[provider] = transport
+        return transport
+
+    def _loop_state(self) -> dict:
+        loop = asyncio.get_running_loop()
+        state = self._async_state.get(loop)
+        if state is None:
+            state = {"transports": {}, "http_clients": {}, "llms": {}}
+            self._async_state[loop] = state
+        return state
+
+    def _get_async_transport(self, provider: str) -> httpx.AsyncHTTPTransport:
+        transports = self._loop_state()["transports"]
+        transport = transports.get(provider)
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(limits=self._limits(), retries=1)
+            transports[provider] = transport
+        return transport
+
+    def _get_async_http_client(self, provider: str) -> httpx.AsyncClient:
+        clients = self._loop_state()["http_clients"]
+        client = clients.get(provider)
+        if client is None:
+            client = httpx.AsyncClient(
+                transport=self._get_async_transport(provider),
+                timeout=settings.LLM_REQUEST_TIMEOUT,
+                event_hooks=self._event_hooks(provider, asynchronous=True)
+            )
+            clients[provider] = client
+        return client
+
+    def _get_http_client(self, provider: str) -> httpx.Client:
+        client = self._http_clients.get(provider)
+        if client is None:
+            client = httpx.Client(
+                transport=self._get_transport(provider),
+                timeout=settings.LLM_REQUEST_TIMEOUT,
+                event_hooks=self._event_hooks(provider)
+            )
+            self._http_clients[provider] = client
+        return client
+
+    # --- Client construction ---
+    def _create_llm(self, provider: str, model: str, temperature: float, options: dict, asynchronous: bool = False):
+        if provider == "ollama":
+            from langchain_ollama import ChatOllama
+            client_kwargs = {
+                "sync_client_kwargs": {
+                    "transport": self._get_transport(provider),
+                    "event_hooks": self._event_hooks(provider)
+                }
+            }
+            if asynchronous:
+                client_kwargs["async_client_kwargs"] = {
+                    "transport": self._get_async_transport(provider),
+                    "event_hooks": self._event_hooks(provider, asynchronous=True)
+                }
+            return ChatOllama(
+                model=model,
+                base_url=settings.OLLAMA_BASE_URL,
+                temperature=temperature,
+                callbacks=[llm_span_callback],
+                **client_kwargs,
+                **options
+            )
+        from langchain_groq import ChatGroq
+        client_kwargs = {"http_client": self._get_http_client(provider)}
+        if asynchronous:
+            client_kwargs["http_async_client"] = self._get_async_http_client(provider)
+        return ChatGroq(
+            model=model,
+            temperature=temperature,
+            callbacks=[llm_span_callback],
+            **client_kwargs,
+            **options
+        )
+
+    @staticmethod
+    def _key(temperature: float, provider: Optional[str], model: Optional[str], options: dict) -> tuple:
+        if provider is None:
+            provider = "ollama" if getattr(settings, "USE_OLLAMA", False) else "groq"
+        if model is None:
+            model = settings.OLLAMA_MODEL if provider == "ollama" else settings.LLM_MODEL
+        return (provider, model, float(temperature), tuple(sorted(options.items())))
+
+    def _count(self, hit: bool):
+        with self._counter_lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+    def get(self, temperature: float = 0.3, provider: Optional[str] = None, model: Optional[str] = None, **options):
+        """Return the shared chat model for (provider, model, temperature), creating it on first use."""
+        key = self._key(temperature, provider, model, options)
+        provider, model = key[0], key[1]
+
+        llm = self._llms.get(key)
+        if llm is not None:
+            self._count(hit=True)
+            return llm
+        with self._lock:
+            llm = self._llms.get(key)
+            created = llm is None
+            if created:
+                llm = self._create_llm(provider, model, float(temperature), options)
+                self._llms[key] = llm
+        self._count(hit=not created)
+        return llm
+
+    def get_async(self, temperature: float = 0.3, provider: Optional[str] = None, model: Optional[str] = None, **options):
+        """
+        Like get(), but the returned model's ainvoke() goes through a pooled async transport
+        owned by the running event loop. Must be called from inside that loop.
+        """
+        key = self._key(temperature, provider, model, options)
+        llms = self._loop_state()["llms"]
+        llm = llms.get(key)
+        if llm is not None:
+            self._count(hit=True)
+            return llm
+        self._count(hit=False)
+        llm = self._create_llm(key[0], key[1], key[2], options, asynchronous=True)
+        llms[key] = llm
+        return llm
+
+    # --- Introspection / lifecycle ---
+    def client_count(self) -> int:
+        """Chat model clients created so far, sync and async."""
+        return len(self._llms) + sum(len(state["llms"]) for state in list(self._async_state.values()))
+
+    def pool_stats(self) -> dict:
+        """Return registry hit/miss counts and per-provider connection pool usage."""
+        transports = {}
+        for provider, transport in self._transports.items():
+            transports.setdefault(provider, []).append(transport)
+        for state in list(self._async_state.values()):
+            for provider, transport in state["transports"].items():
+                transports.setdefault(provider, []).append(transport)
+
+        pools = {}
+        for provider, provider_transports in transports.items():
+            connections = [
+                c for transport in provider_transports
+                for c in list(getattr(getattr(transport, "_pool", None), "connections", []) or [])
+            ]
+            idle = sum(1 for c in connections if getattr(c, "is_idle", lambda: False)())
+            with self._counter_lock:
+                counters = dict(self._requests.get(provider, {}))
+            pools[provider] = {
+                "open_connections": len(connections),
+                "idle_connections": idle,
+                "active_connections": len(connections) - idle,
+                "event_loops": len(provider_transports) - (1 if provider in self._transports else 0),
+                "requests": counters.get("requests", 0),
+                "responses": counters.get("responses", 0),
+                "errors": counters.get("errors", 0),
+                "max_connections": settings.LLM_POOL_MAX_CONNECTIONS,
+                "max_keepalive_connections": settings.LLM_POOL_MAX_KEEPALIVE
+            }
+        with self._counter_lock:
+            hits, misses = self._hits, self._misses
+        return {
+            "clients": [
+                {"provider": k[0], "model": k[1], "temperature": k[2]} for k in self._llms
+            ],
+            "async_clients": sum(len(state["llms"]) for state in list(self._async_state.values())),
+            "hits": hits,
+            "misses": misses,
+            "pools": pools
+        }
+
+    def close(self):
+        """
+        Drop all cached clients and close their pooled connections. Async transports are
+        only dropped; their connections close with the event loop that owns them.
+        Request counters are kept: hooks of clients still in use keep updating them.
+        """
+        with self._lock:
+            for client in self._http_clients.values():
+                client.close()
+            for transport in self._transports.values():
+                transport.close()
+            self._llms.clear()
+            self._http_clients.clear()
+            self._transports.clear()
+            self._async_state.clear()
+
+
+llm_registry = LLMRegistry()
+
+
+def get_llm(temperature: float = 0.3, provider: Optional[str] = None, model: Optional[str] = None, **options):
+    """Shortcut for llm_registry.get(); use this instead of constructing ChatGroq/ChatOllama directly."""
+    return llm_registry.get(temperature=temperature, provider=provider, model=model, **options)
+
+
+def get_async_llm(temperature: float = 0.3, provider: Optional[str] = None, model: Optional[str] = None, **options):
+    """Shortcut for llm_registry.get_async(); use from async nodes running on the server event loop."""
+    return llm_registry.get_async(temperature=temperature, provider=provider, model=model, **options)
+
+
+def get_llm_pool_stats() -> dict:
+    return llm_registry.pool_stats()
@@ -0,0 +1,220 @@
+# In-process route classifier trained on logged tagger decisions (nearest centroid over MiniLM embeddings)
+
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+import numpy as np
+from config.settings import settings
+from utils.route_cache import ROUTE_TAGS, normalize_input
+
+
+def input_key(user_input: str) -> str:
+    """Stable, non-reversible key of an input (after the route cache's normalization)."""
+    return hashlib.sha1(normalize_input(user_input).encode("utf-8")).hexdigest()
+
+
+class RouteDecisionLog:
+    """
+    Append-only JSONL log of LLM tagger decisions. User inputs can contain patient health
+    text, so they are never written: each record holds the input's hash, the tag and the
+    input's embedding (float16), which is all the router needs to rebuild its centroids.
+    Past max_bytes the file is rotated to <path>.1, replacing the previous rotation.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None, model: Optional[str] = None):
+        self.path = path if path is not None else settings.ROUTE_DECISIONS_PATH
+        self.max_bytes = max_bytes if max_bytes is not None else settings.ROUTE_DECISIONS_MAX_BYTES
+        self.model = model if model is not None else settings.EMBEDDING_MODEL
+        self._lock = threading.Lock()
+
+    def append(self, key: str, tag: str, vector: np.ndarray):
+        if not self.path:
+            return
+        record = {
+            "key": key, "tag": tag, "model": self.model, "ts": time.time(),
+            "vector": base64.b64encode(np.asarray(vector, dtype=np.float16).tobytes()).decode("ascii"),
+        }
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+    def load(self, limit: Optional[int] = None) -> list:
+        """
+        Return the most recent (key, tag, vector) records, oldest first, skipping malformed
+        lines, unknown tags and vectors from a different embedding model.
+        """
+        if not self.path:
+            return []
+        records = deque(maxlen=limit) if limit else []
+        with self._lock:
+            for path in (self.path + ".1", self.path):
+                if not os.path.exists(path):
+                    continue
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                            vector = np.frombuffer(base64.b64decode(record["vector"]), dtype=np.float16)
+                        except (ValueError, KeyError, TypeError):
+                            continue
+                        if record.get("tag") in ROUTE_TAGS and record.get("key") and record.get("model") == self.model:
+                            records.append((record["key"], record["tag"], vector.astype(np.float32)))
+        return list(records)
+
+
+class LocalRouter:
+    """
+    Nearest-centroid classifier over normalized sentence embeddings. Each tag keeps a running
+    sum of its example vectors, so learning a new LLM decision is O(dim) and needs no retrain.
+    `predict` returns a tag only when the softmax confidence over centroid similarities clears
+    the threshold and the tag has enough examples; otherwise the caller falls back to the LLM.
+
+    Logged decisions are folded in by load(), which warm-up calls; requests never read the
+    log. Until it has run, predict() starts it in the background and defers to the LLM.
+    """
+
+    def __init__(self, encoder: Callable[[list], np.ndarray], decision_log: Optional[RouteDecisionLog] = None,
+                 threshold: Optional[float] = None, min_examples: Optional[int] = None,
+                 temperature: Optional[float] = None):
+        self._encoder = encoder
+        self.decision_log = decision_log
+        self.threshold = threshold if threshold is not None else settings.LOCAL_ROUTER_THRESHOLD
+        self.min_examples = min_examples if min_examples is not None else settings.LOCAL_ROUTER_MIN_EXAMPLES
+        self.temperature = temperature if temperature is not None else settings.LOCAL_ROUTER_TEMPERATURE
+        self._sums = {}
+        self._counts = {}
+        self._seen = set()
+        # Decisions observed before the encoder could be used; learned (and logged) by load()
+        self._pending = deque(maxlen=settings.LOCAL_ROUTER_MAX_EXAMPLES)
+        self._loaded = decision_log is None
+        self._loading = False
+        self._lock = threading.Lock()
+        self.predictions = 0
+        self.fallbacks = 0
+
+    def _encode(self, texts: list) -> np.ndarray:
+        return np.asarray(self._encoder([normalize_input(t) for t in texts]), dtype=np.float32)
+
+    def _add(self, key: str, tag: str, vector: np.ndarray) -> bool:
+        """Add one example to the centroid sums; duplicate (input, tag) pairs count once."""
+        if tag not in ROUTE_TAGS or (key, tag) in self._seen:
+            return False
+        if tag in self._sums and self._sums[tag].shape != vector.shape:
+            return False
+        self._seen.add((key, tag))
+        if tag not in self._sums:
+            self._sums[tag] = np.zeros_like(vector)
+            self._counts[tag] = 0
+        self._sums[tag] += vector
+        self._counts[tag] += 1
+        return True
+
+    def _learn(self, texts: list, tags: list) -> list:
+        """Encode and add new examples; returns the (key, tag, vector) records that were added."""
+        fresh = [(input_key(t), t, tag) for t, tag in zip(texts, tags)
+                 if tag in ROUTE_TAGS and (input_key(t), tag) not in self._seen]
+        if not fresh:
+            return []
+        vectors = self._encode([t for _, t, _ in fresh])
+        return [(key, tag, vector) for (key, _, tag), vector in zip(fresh, vectors) if self._add(key, tag, vector)]
+
+    def load(self):
+        """Fold the logged decisions (and any observed before the encoder was ready) into the centroids."""
+        with self._lock:
+            if not self._loaded and self.decision_log is not None:
+                for key, tag, vector in self.decision_log.load(limit=settings.LOCAL_ROUTER_MAX_EXAMPLES):
+                    self._add(key, tag, vector)
+            pending, self._pending = list(self._pending), deque(maxlen=self._pending.maxlen)
+            learned = self._learn([t for t, _ in pending], [tag for _, tag in pending]) if pending else []
+            self._loaded = True
+            self._loading = False
+        self._log(learned)
+
+    def _load_in_background(self):
+        with self._lock:
+            if self._loaded or self._loading:
+                return
+            self._loading = True
+
+        def run():
+            try:
+                self.load()
+            except Exception:
+                with self._lock:
+                    self._loading = False
+
+        threading.Thread(target=run, name="local-router-load", daemon=True).start()
+
+    def _log(self, records: list):
+        if self.decision_log is not None:
+            for key, tag, vector in records:
+                self.decision_log.append(key, tag, vector)
+
+    def fit(self, texts: list, tags: list):
+        with self._lock:
+            self._sums, self._counts, self._seen = {}, {}, set()
+            self._learn(list(texts), list(tags))
+            self._loaded = True
+
+    def observe(self, user_input: str, tag: str, learn: bool = True):
+        """
+        Record an LLM tagger decision: fold it into the centroids and log it. With
+        learn=False (encoder not ready) it is kept in memory until load() runs.
+        """
+        if tag not in ROUTE_TAGS:
+            return
+        if not learn or not self._loaded:
+            with self._lock:
+                self._pending.append((user_input, tag))
+            return
+        with self._lock:
+            learned = self._learn([user_input], [tag])
+        self._log(learned)
+
+    def predict_with_confidence(self, user_input: str) -> tuple:
+        if not self._loaded:
+            self._load_in_background()
+            return None, 0.0
+        with self._lock:
+            tags = [tag for tag, count in self._counts.items() if count >= self.min_examples]
+            if len(tags) < 2:
+                return None, 0.0
+            centroids = np.stack([self._sums[tag] for tag in tags])
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        query = self._encode([user_input])[0]
+        logits = (centroids @ query) / self.temperature
+        probs = np.exp(logits - logits.max())
+        probs /= probs.sum()
+        best = int(np.argmax(probs))
+        return tags[best], float(probs[best])
+
+    def predict(self, user_input: str) -> Optional[str]:
+        tag, confidence = self.predict_with_confidence(user_input)
+        if tag is not None and confidence >= self.threshold:
+            self.predictions += 1
+            return tag
+        self.fallbacks += 1
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        decided = self.predictions + self.fallbacks
+        return {
+            "loaded": self._loaded,
+            "pending": len(self._pending),
+            "examples": counts,
+            "threshold": self.threshold,
+            "min_examples": self.min_examples,
+            "local_predictions": self.predictions,
+            "llm_fallbacks": self.fallbacks,
+            "local_rate": (self.predictions / decided) if decided else 0.0
+        }
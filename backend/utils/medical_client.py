@@ -0,0 +1,299 @@
+# Pooled, deadline-aware client for the medical reasoning endpoint(s)
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import List, Optional
+import httpx
+from config.settings import settings
+from utils.background_loop import BackgroundLoop
+from utils.logging_config import logger
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """Every configured endpoint has an open circuit breaker; the call failed fast."""
+
+
+class MedicalEndpointError(RuntimeError):
+    """No attempt succeeded within the deadline."""
+
+
+class EndpointState:
+    """Circuit breaker and metrics for one endpoint URL."""
+
+    def __init__(self, url: str, failure_threshold: int, reset_timeout: float):
+        self.url = url
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+        self.latencies_ms: deque = deque(maxlen=1000)
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def available(self) -> bool:
+        state = self.state
+        # Half-open: a single probe request decides whether the circuit closes again
+        return state == "closed" or (state == "half_open" and not self.probe_in_flight)
+
+    def begin(self):
+        self.requests += 1
+        if self.state != "closed":
+            self.probe_in_flight = True
+
+    def record_success(self, latency_ms: float):
+        self.successes += 1
+        self.latencies_ms.append(latency_ms)
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+
+    def record_failure(self, latency_ms: float, timed_out: bool = False):
+        self.failures += 1
+        self.timeouts += int(timed_out)
+        self.latencies_ms.append(latency_ms)
+        self.consecutive_failures += 1
+        half_open_probe = self.probe_in_flight
+        self.probe_in_flight = False
+        if half_open_probe or self.consecutive_failures >= self.failure_threshold:
+            if self.opened_at is None or half_open_probe:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies_ms)
+
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 2) if latencies else 0.0
+
+        return {
+            "state": self.state,
+            "requests": self.requests,
+            "successes": self.successes,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejected_by_breaker": self.rejected,
+            "times_opened": self.times_opened,
+            "consecutive_failures": self.consecutive_failures,
+            "error_rate": round(self.failures / self.requests, 4) if self.requests else 0.0,
+            "latency_ms": {"p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99), "max": latencies[-1] if latencies else 0.0},
+        }
+
+
+class MedicalClient:
+    """
+    POSTs a payload to one of the configured medical endpoints:
+
+    - one pooled keep-alive AsyncClient living on a background loop, shared by sync
+      (post) and async (apost) callers,
+    - an overall deadline; each attempt gets min(attempt_timeout, time left) and retries
+      (with jittered backoff) only happen while there is time left,
+    - optional hedging: if an attempt hasn't answered after hedge_delay, the same request is
+      sent to the next endpoint and the first success wins,
+    - a circuit breaker per endpoint, so a dead service fails fast instead of costing the
+      full timeout on every turn.
+    """
+
+    def __init__(self, urls: List[str], deadline: float = 5.0, attempt_timeout: float = 5.0,
+                 max_attempts: int = 3, retry_backoff: float = 0.2, hedge_delay: float = 0.0,
+                 breaker_threshold: int = 5, breaker_reset: float = 30.0, max_connections: int = 20,
+                 loop: Optional[BackgroundLoop] = None):
+        if not urls:
+            raise ValueError("MedicalClient needs at least one endpoint URL")
+        self.urls = list(urls)
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff = retry_backoff
+        self.hedge_delay = hedge_delay
+        self.max_connections = max_connections
+        self.endpoints = {url: EndpointState(url, breaker_threshold, breaker_reset) for url in self.urls}
+        self.loop = loop or BackgroundLoop(name="medical-loop")
+        self._client: Optional[httpx.AsyncClient] = None
+        self._next = 0
+        self._stats_lock = threading.Lock()
+        self._calls = 0
+        self._fast_failures = 0
+        self._retries = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+
+    def _http(self) -> httpx.AsyncClient:
+        # Created on the background loop, which owns its connections
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections)
+            )
+        return self._client
+
+    def _candidates(self) -> List[EndpointState]:
+        """Endpoints whose breaker lets a request through, rotated for load spreading."""
+        order = self.urls[self._next:] + self.urls[:self._next]
+        self._next = (self._next + 1) % len(self.urls)
+        allowed = []
+        for url in order:
+            endpoint = self.endpoints[url]
+            if endpoint.available():
+                allowed.append(endpoint)
+            else:
+                endpoint.rejected += 1
+        return allowed
+
+    async def _send(self, endpoint: EndpointState, payload: dict, timeout: float) -> httpx.Response:
+        endpoint.begin()
+        started = time.perf_counter()
+        try:
+            # httpx timeouts are per phase; wait_for bounds the whole exchange
+            response = await asyncio.wait_for(
+                self._http().post(endpoint.url, json=payload, timeout=timeout), timeout=timeout
+            )
+        except asyncio.TimeoutError as e:
+            endpoint.record_failure((time.perf_counter() - started) * 1000, timed_out=True)
+            raise httpx.TimeoutException(f"No answer from {endpoint.url} within {timeout:.2f}s") from e
+        except asyncio.CancelledError:
+            # Lost a hedge race: neither a success nor a failure of the endpoint
+            endpoint.requests -= 1
+            endpoint.probe_in_flight = False
+            raise
+        except Exception as e:
+            endpoint.record_failure((time.perf_counter() - started) * 1000, isinstance(e, httpx.TimeoutException))
+            raise
+        latency_ms = (time.perf_counter() - started) * 1000
+        if response.status_code in RETRYABLE_STATUS:
+            endpoint.record_failure(latency_ms)
+        else:
+            endpoint.record_success(latency_ms)
+        return response
+
+    @staticmethod
+    def _succeeded(task: asyncio.Future) -> bool:
+        return task.exception() is None and task.result().status_code not in RETRYABLE_STATUS
+
+    async def _attempt(self, endpoints: List[EndpointState], payload: dict, timeout: float) -> httpx.Response:
+        """One logical attempt, hedged onto the next endpoint if the first is slow to answer."""
+        if self.hedge_delay <= 0 or len(endpoints) < 2 or self.hedge_delay >= timeout:
+            return await self._send(endpoints[0], payload, timeout)
+
+        primary = asyncio.ensure_future(self._send(endpoints[0], payload, timeout))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay)
+            if done:
+                # Answered (or failed) before the hedge delay: retries handle failures
+                return primary.result()
+            with self._stats_lock:
+                self._hedges += 1
+            tasks.append(asyncio.ensure_future(self._send(endpoints[1], payload, timeout - self.hedge_delay)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if self._succeeded(task):
+                        if task is not primary:
+                            with self._stats_lock:
+                                self._hedge_wins += 1
+                        return task.result()
+            # Neither succeeded: hand back a retryable response if there is one, else the error
+            for task in tasks:
+                if task.exception() is None:
+                    return task.result()
+            raise primary.exception()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _post(self, payload: dict) -> httpx.Response:
+        deadline = time.monotonic() + self.deadline
+        with self._stats_lock:
+            self._calls += 1
+        last_error: Optional[BaseException] = None
+        last_response: Optional[httpx.Response] = None
+        for attempt in range(self.max_attempts):
+            endpoints = self._candidates()
+            if not endpoints:
+                if attempt == 0:
+                    with self._stats_lock:
+                        self._fast_failures += 1
+                    raise CircuitOpenError("Medical endpoint circuit open; failing fast")
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if attempt > 0:
+                with self._stats_lock:
+                    self._retries += 1
+            try:
+                response = await self._attempt(endpoints, payload, min(self.attempt_timeout, remaining))
+            except (httpx.HTTPError, OSError) as e:
+                last_error = e
+            else:
+                if response.status_code not in RETRYABLE_STATUS:
+                    return response
+                last_response = response
+            backoff = self.retry_backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+            # Only retry while there is still time left for a meaningful attempt
+            if deadline - time.monotonic() <= backoff:
+                break
+            await asyncio.sleep(backoff)
+        if last_response is not None:
+            return last_response
+        raise MedicalEndpointError(f"Medical endpoint unavailable: {last_error}")
+
+    def post(self, payload: dict) -> httpx.Response:
+        """Blocking POST for sync graph nodes."""
+        return self.loop.run(self._post(payload))
+
+    async def apost(self, payload: dict) -> httpx.Response:
+        """POST from any event loop; the request itself runs on the client's loop."""
+        return await self.loop.run_async(self._post(payload))
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            totals = {
+                "calls": self._calls,
+                "fast_failures": self._fast_failures,
+                "retries": self._retries,
+                "hedges": self._hedges,
+                "hedge_wins": self._hedge_wins,
+            }
+        return {
+            **totals,
+            "deadline_s": self.deadline,
+            "hedge_delay_s": self.hedge_delay,
+            "endpoints": {url: endpoint.stats() for url, endpoint in self.endpoints.items()},
+        }
+
+
+def create_medical_client() -> MedicalClient:
+    urls = [u.strip() for u in settings.MEDICAL_ENDPOINT_URLS.split(",") if u.strip()]
+    logger.info(f"Medical endpoints: {urls}")
+    return MedicalClient(
+        urls,
+        deadline=settings.MEDICAL_DEADLINE,
+        attempt_timeout=settings.MEDICAL_ATTEMPT_TIMEOUT,
+        max_attempts=settings.MEDICAL_MAX_ATTEMPTS,
+        retry_backoff=settings.MEDICAL_RETRY_BACKOFF,
+        hedge_delay=settings.MEDICAL_HEDGE_DELAY,
+        breaker_threshold=settings.MEDICAL_BREAKER_THRESHOLD,
+        breaker_reset=settings.MEDICAL_BREAKER_RESET,
+        max_connections=settings.MEDICAL_POOL_MAX_CONNECTIONS,
+    )
@@ -0,0 +1,201 @@
+# Semantic memory compaction: merge near-duplicate facts, cap the list by recency and frequency
+
+import math
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+import numpy as np
+from config.settings import settings
+from utils.embedding_cache import EmbeddingCache
+
+MEMORY_DATETIME_FORMAT = "%d_%m_%y_%H_%M"  # as written by MemoryOperations.update_semantic_memory
+
+
+def parse_memory_datetime(value) -> Optional[datetime]:
+    try:
+        return datetime.strptime(str(value), MEMORY_DATETIME_FORMAT)
+    except ValueError:
+        return None
+
+
+def memory_count(item: dict) -> int:
+    """How many times a fact was stored; entries without a count were stored once."""
+    try:
+        return max(1, int(item.get("count", 1)))
+    except (TypeError, ValueError):
+        return 1
+
+
+class MemoryCompactor:
+    """
+    Keeps a patient's semantic memory list from filling up with restatements.
+
+    - Near-duplicates (cosine similarity >= threshold on the cached normalized embeddings)
+      are merged into the newest of them; the survivor keeps its text and datetime and
+      carries a "count" of how many entries it absorbed.
+    - Past max_items, the entries with the lowest retention score are evicted:
+      (1 + ln(count)) * 0.5 ** (age_days / half_life_days), so a fact stated often
+      outlives one stated once, and recent facts outlive old ones.
+
+    Relative order of the surviving entries is preserved.
+    """
+
+    def __init__(self, embeddings: EmbeddingCache, threshold: Optional[float] = None,
+                 max_items: Optional[int] = None, half_life_days: Optional[float] = None):
+        self._embeddings = embeddings
+        self.threshold = threshold if threshold is not None else settings.MEMORY_DEDUP_THRESHOLD
+        self.max_items = max_items if max_items is not None else settings.MEMORY_MAX_ITEMS
+        self.half_life_days = half_life_days if half_life_days is not None else settings.MEMORY_RECENCY_HALF_LIFE_DAYS
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._merged = 0
+        self._evicted = 0
+
+    @staticmethod
+    def _newer(a: Tuple[int, dict], b: Tuple[int, dict]) -> bool:
+        """Is entry a newer than entry b? Datetime first, list position breaks ties."""
+        da, db = parse_memory_datetime(a[1].get("datetime")), parse_memory_datetime(b[1].get("datetime"))
+        if da and db and da != db:
+            return da > db
+        if bool(da) != bool(db):
+            return bool(da)
+        return a[0] > b[0]
+
+    @staticmethod
+    def _merge(survivor: dict, absorbed: List[dict]) -> dict:
+        merged = dict(survivor)
+        merged["count"] = memory_count(survivor) + sum(memory_count(m) for m in absorbed)
+        return merged
+
+    def _record(self, merged: int, evicted: int):
+        with self._lock:
+            self._runs += 1
+            self._merged += merged
+            self._evicted += evicted
+
+    def dedupe(self, memory: List[dict]) -> Tuple[List[dict], int]:
+        """Merge near-duplicate clusters; returns (memory, entries merged away)."""
+        texts = [m.get("text", "") for m in memory]
+        if len(texts) < 2:
+            return list(memory), 0
+        vectors = self._embeddings.matrix(texts)
+        # Greedy leader clustering, newest entry first, so every cluster is led by its
+        # newest member and similarity never chains through intermediate entries
+        order = sorted(range(len(memory)), key=lambda i: (
+            parse_memory_datetime(memory[i].get("datetime")) or datetime.min, i), reverse=True)
+        leaders: List[int] = []
+        members = {}
+        for i in order:
+            if leaders:
+                scores = vectors[leaders] @ vectors[i]
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    members[leaders[best]].append(i)
+                    continue
+            leaders.append(i)
+            members[i] = []
+        if len(leaders) == len(memory):
+            return list(memory), 0
+        keep = set(leaders)
+        result = [
+            self._merge(memory[i], [memory[j] for j in members[i]]) if members[i] else memory[i]
+            for i in range(len(memory)) if i in keep
+        ]
+        return result, len(memory) - len(result)
+
+    def absorb_latest(self, memory: List[dict]) -> Tuple[List[dict], int]:
+        """
+        Incremental dedupe for a list whose only new entry is the last one: older entries
+        that restate it are folded into it. O(n) against cached embeddings.
+        """
+        if len(memory) < 2:
+            return list(memory), 0
+        vectors = self._embeddings.matrix([m.get("text", "") for m in memory])
+        scores = vectors[:-1] @ vectors[-1]
+        duplicates = set(int(i) for i in np.flatnonzero(scores >= self.threshold))
+        if not duplicates:
+            return list(memory), 0
+        latest = self._merge(memory[-1], [memory[i] for i in sorted(duplicates)])
+        result = [m for i, m in enumerate(memory[:-1]) if i not in duplicates] + [latest]
+        return result, len(duplicates)
+
+    def retention_score(self, item: dict, now: datetime) -> float:
+        stamp = parse_memory_datetime(item.get("datetime"))
+        age_days = max(0.0, (now - stamp).total_seconds() / 86400) if stamp else float("inf")
+        recency = 0.5 ** (age_days / self.half_life_days) if self.half_life_days > 0 else 1.0
+        return (1 + math.log(memory_count(item))) * recency
+
+    def enforce_cap(self, memory: List[dict], now: Optional[datetime] = None) -> Tuple[List[dict], int]:
+        """Evict the lowest-scoring entries beyond max_items; returns (memory, entries evicted)."""
+        if self.max_items <= 0 or len(memory) <= self.max_items:
+            return list(memory), 0
+        now = now or datetime.now()
+        # Ties go to the later position (the more recently stored entry)
+        ranked = sorted(range(len(memory)), key=lambda i: (self.retention_score(memory[i], now), i), reverse=True)
+        keep = set(ranked[:self.max_items])
+        return [m for i, m in enumerate(memory) if i in keep], len(memory) - self.max_items
+
+    def compact(self, memory: List[dict], now: Optional[datetime] = None) -> List[dict]:
+        """Full pass (batch job): dedupe the whole list, then enforce the cap."""
+        deduped, merged = self.dedupe(memory)
+        capped, evicted = self.enforce_cap(deduped, now)
+        self._record(merged, evicted)
+        return capped
+
+    def compact_latest(self, memory: List[dict], now: Optional[datetime] = None) -> List[dict]:
+        """Inline pass after appending one entry: absorb its duplicates, then enforce the cap."""
+        deduped, merged = self.absorb_latest(memory)
+        capped, evicted = self.enforce_cap(deduped, now)
+        self._record(merged, evicted)
+        return capped
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": settings.MEMORY_COMPACTION,
+                "threshold": self.threshold,
+                "max_items": self.max_items,
+                "half_life_days": self.half_life_days,
+                "runs": self._runs,
+                "merged": self._merged,
+                "evicted": self._evicted,
+            }
+
+
+def compact_sessions(store, compactor: MemoryCompactor) -> dict:
+    """
+    Batch job over a session store (see utils/session_store.py): compact every stored
+    memory list. Sessions updated concurrently are skipped and picked up next run.
+    """
+    from utils.session_store import SessionConflictError
+    report = {"sessions": 0, "compacted": 0, "removed": 0, "conflicts": 0}
+    for session_id in store.session_ids():
+        version, document = store.load(session_id)
+        if not document:
+            continue
+        report["sessions"] += 1
+        memory = document.get("memory") or []
+        compacted = compactor.compact(memory)
+        if len(compacted) == len(memory):
+            continue
+        try:
+            store.save(session_id, version, {**document, "memory": compacted})
+        except SessionConflictError:
+            report["conflicts"] += 1
+            continue
+        report["compacted"] += 1
+        report["removed"] += len(memory) - len(compacted)
+    return report
+
+
+if __name__ == "__main__":
+    # Batch compaction of the sqlite session store, e.g. from cron:
+    #   SESSION_STORE=sqlite python -m utils.memory_compaction
+    import json
+    from modules.memory_operations import memory_compactor
+    from utils.session_store import create_session_store
+
+    session_store = create_session_store()
+    if session_store is None:
+        raise SystemExit("SESSION_STORE is not set; nothing to compact")
+    print(json.dumps(compact_sessions(session_store, memory_compactor)))
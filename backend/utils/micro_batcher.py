@@ -0,0 +1,82 @@
+# Dynamic micro-batching for encode requests
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional
+import numpy as np
+from config.settings import settings
+
+
+class MicroBatcher:
+    """
+    Collects concurrent encode requests and runs them through `encode_fn` as one batch.
+    A batch is flushed when it reaches `max_batch` texts or `max_wait_ms` after its
+    first request arrived, whichever comes first.
+    """
+
+    def __init__(self, encode_fn: Callable[[list], np.ndarray], max_batch: Optional[int] = None, max_wait_ms: Optional[float] = None):
+        self._encode_fn = encode_fn
+        self.max_batch = max_batch or settings.EMBEDDING_BATCH_MAX_SIZE
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else settings.EMBEDDING_BATCH_MAX_WAIT_MS) / 1000.0
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.texts = 0
+        self.requests = 0
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: list) -> Future:
+        future = Future()
+        self._queue.put((list(texts), future))
+        return future
+
+    def encode(self, texts: list, timeout: Optional[float] = None) -> np.ndarray:
+        return self.submit(texts).result(timeout=timeout)
+
+    def _collect(self) -> list:
+        first = self._queue.get()
+        batch = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = np.asarray(self._encode_fn(texts)) if texts else np.zeros((0, 0), dtype=np.float32)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.requests += len(batch)
+            self.texts += len(texts)
+            offset = 0
+            for item_texts, future in batch:
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "texts": self.texts,
+            "avg_batch_size": (self.texts / self.batches) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0
+        }
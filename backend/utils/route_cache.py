@@ -0,0 +1,118 @@
+# Cache of route-tagger decisions keyed by normalized input + routing-relevant profile shape
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from config.settings import settings
+
+ROUTE_TAGS = ("web", "text", "patient", "medical", "ui_change", "modify_treatment")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT_RE = re.compile(r"[\s.!?,;:]+$")
+
+
+def normalize_input(user_input: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation ('What are my meds?' == 'what are my meds')."""
+    text = _WHITESPACE_RE.sub(" ", (user_input or "").strip().lower())
+    return _TRAILING_PUNCT_RE.sub("", text)
+
+
+def _key_paths(value, prefix: str = "") -> list:
+    if isinstance(value, dict):
+        paths = []
+        for k, v in value.items():
+            paths.extend(_key_paths(v, f"{prefix}.{k}" if prefix else str(k)))
+        return paths or [prefix]
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        # Lists of records (e.g. treatment) contribute the union of their fields, not their length
+        return sorted({p for item in value for p in _key_paths(item, f"{prefix}[]")})
+    return [prefix]
+
+
+def routing_fingerprint(patient_profile: Optional[dict]) -> str:
+    """
+    Hash of the parts of the profile the tagger actually routes on: which fields exist and
+    which treatments the patient has. Values such as sleepHours or appointment dates do not
+    change the route, so edits to them keep the cached decisions valid.
+    """
+    profile = patient_profile if isinstance(patient_profile, dict) else {}
+    treatments = profile.get("treatment")
+    if isinstance(treatments, list):
+        treatment_names = sorted(str(t.get("name", "")).lower() for t in treatments if isinstance(t, dict))
+    else:
+        treatment_names = []
+    shape = {"fields": sorted(set(_key_paths(profile))), "treatments": treatment_names}
+    return hashlib.sha1(json.dumps(shape, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+class RouteCache:
+    """
+    Thread-safe LRU cache of route tags with a TTL. Only the known tags are stored, so a
+    malformed LLM answer is never replayed.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.max_size = max_size if max_size is not None else settings.ROUTE_CACHE_SIZE
+        self.ttl = ttl_seconds if ttl_seconds is not None else settings.ROUTE_CACHE_TTL
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(user_input: str, patient_profile: Optional[dict]) -> tuple:
+        return normalize_input(user_input), routing_fingerprint(patient_profile)
+
+    def get(self, user_input: str, patient_profile: Optional[dict]) -> Optional[str]:
+        key = self.make_key(user_input, patient_profile)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                tag, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return tag
+                del self._entries[key]
+                self.expired += 1
+            self.misses += 1
+            return None
+
+    def put(self, user_input: str, patient_profile: Optional[dict], tag: str) -> bool:
+        if tag not in ROUTE_TAGS or self.max_size <= 0:
+            return False
+        key = self.make_key(user_input, patient_profile)
+        with self._lock:
+            self._entries[key] = (tag, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions
+            }
+
+
+route_cache = RouteCache()
@@ -0,0 +1,131 @@
+# Web-search result cache: normalized queries, per-category TTLs, single-flight fetches
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+from config.settings import settings
+from utils.route_cache import normalize_input
+
+# First matching category decides how long a result stays fresh
+QUERY_CATEGORIES = (
+    ("realtime", re.compile(r"\b(price|prices|stock|stocks|shares?|bitcoin|btc|ethereum|crypto\w*|exchange rate|score|scores|live|now|right now)\b")),
+    ("weather", re.compile(r"\b(weather|forecast|temperature|rain|humidity|wind)\b")),
+    ("news", re.compile(r"\b(news|latest|today|tonight|yesterday|breaking|update|updates|recent|this week)\b")),
+)
+
+
+def categorize_query(normalized_query: str) -> str:
+    for category, pattern in QUERY_CATEGORIES:
+        if pattern.search(normalized_query):
+            return category
+    return "default"
+
+
+def default_ttls() -> Dict[str, float]:
+    return {
+        "realtime": settings.WEB_SEARCH_TTL_REALTIME,
+        "weather": settings.WEB_SEARCH_TTL_WEATHER,
+        "news": settings.WEB_SEARCH_TTL_NEWS,
+        "default": settings.WEB_SEARCH_TTL_DEFAULT,
+        "empty": settings.WEB_SEARCH_TTL_EMPTY,
+    }
+
+
+class SearchCache:
+    """
+    Thread-safe LRU of search results keyed by the normalized query. Entries expire after
+    the TTL of the query's category (a stock price goes stale faster than a population
+    figure). Concurrent misses for the same query share one fetch (single-flight); failed
+    fetches are never cached, and empty results (often a quota or transient error rather
+    than a real miss) only for the short "empty" TTL.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttls: Optional[Dict[str, float]] = None):
+        self.max_size = max_size if max_size is not None else settings.WEB_SEARCH_CACHE_SIZE
+        self.ttls = ttls if ttls is not None else default_ttls()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, results)
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._expired = 0
+        self._errors = 0
+        self._empty = 0
+
+    def _ttl(self, category: str, results=None) -> float:
+        ttl = self.ttls.get(category, self.ttls.get("default", 0))
+        if not results:
+            return min(ttl, self.ttls.get("empty", 0))
+        return ttl
+
+    def get_or_fetch(self, query: str, fetch: Callable[[str], object]):
+        """Return cached results for `query`, or call fetch(query) once for all concurrent callers."""
+        key = normalize_input(query)
+        category = categorize_query(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self._expired += 1
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._coalesced += 1
+                leader = False
+            else:
+                future = Future()
+                self._in_flight[key] = future
+                self._misses += 1
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            results = fetch(query)
+        except BaseException as e:
+            with self._lock:
+                self._errors += 1
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            ttl = self._ttl(category, results)
+            if not results:
+                self._empty += 1
+            if ttl > 0:
+                self._entries[key] = (time.monotonic() + ttl, results)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            self._in_flight.pop(key, None)
+        future.set_result(results)
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses + self._coalesced
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttls": dict(self.ttls),
+                "hits": self._hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced,
+                "expired": self._expired,
+                "errors": self._errors,
+                "empty": self._empty,
+                "in_flight": len(self._in_flight),
+                "hit_rate": round((self._hits + self._coalesced) / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,162 @@
+# Server-side session state (memory, conversation, patient profile) with optimistic versioning
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from config.settings import settings
+from utils.logging_config import logger
+
+
+class SessionConflictError(RuntimeError):
+    """The session moved on since the version the caller based its change on."""
+
+    def __init__(self, session_id: str, version: int):
+        super().__init__(f"Session {session_id} is at version {version}")
+        self.session_id = session_id
+        self.version = version
+
+
+class MemorySessionStore:
+    """
+    Process-local store: session_id -> (version, document), least recently used sessions
+    evicted past max_sessions. Every save bumps the version; a save based on an older
+    version raises SessionConflictError instead of overwriting newer state.
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_sessions: int = 10000):
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Tuple[int, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str) -> Tuple[int, Optional[dict]]:
+        """(version, document); (0, None) for an unknown session."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return 0, None
+            self._sessions.move_to_end(session_id)
+            # Stored serialized so callers can never mutate the saved copy
+            return entry[0], json.loads(entry[1])
+
+    def save(self, session_id: str, expected_version: int, document: dict) -> int:
+        payload = json.dumps(document)
+        with self._lock:
+            current = self._sessions.get(session_id, (0, None))[0]
+            if current != expected_version:
+                raise SessionConflictError(session_id, current)
+            self._sessions[session_id] = (current + 1, payload)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return current + 1
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def session_ids(self) -> list:
+        with self._lock:
+            return list(self._sessions)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": self.backend, "sessions": len(self._sessions), "max_sessions": self.max_sessions}
+
+
+class SQLiteSessionStore:
+    """
+    Same contract as MemorySessionStore, persisted in one SQLite table so sessions survive
+    restarts and are shared by worker processes on the same host. Connections are per
+    thread; the version check and the write happen in a single UPDATE.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS agent_sessions ("
+                "session_id TEXT PRIMARY KEY, version INTEGER NOT NULL, "
+                "document TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, session_id: str) -> Tuple[int, Optional[dict]]:
+        row = self._connection().execute(
+            "SELECT version, document FROM agent_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return 0, None
+        return row[0], json.loads(row[1])
+
+    def save(self, session_id: str, expected_version: int, document: dict) -> int:
+        payload = json.dumps(document)
+        conn = self._connection()
+        with conn:
+            if expected_version == 0:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO agent_sessions (session_id, version, document, updated_at) "
+                    "VALUES (?, 1, ?, ?)", (session_id, payload, time.time())
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE agent_sessions SET version = version + 1, document = ?, updated_at = ? "
+                    "WHERE session_id = ? AND version = ?",
+                    (payload, time.time(), session_id, expected_version)
+                )
+        if cursor.rowcount != 1:
+            raise SessionConflictError(session_id, self.load(session_id)[0])
+        return expected_version + 1
+
+    def delete(self, session_id: str):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM agent_sessions WHERE session_id = ?", (session_id,))
+
+    def session_ids(self) -> list:
+        return [row[0] for row in self._connection().execute("SELECT session_id FROM agent_sessions")]
+
+    def stats(self) -> dict:
+        count = self._connection().execute("SELECT COUNT(*) FROM agent_sessions").fetchone()[0]
+        return {"backend": self.backend, "sessions": count, "path": self.path}
+
+
+def sqlite_path(database_url: str) -> str:
+    """sqlite:///relative/path.db -> relative/path.db, sqlite:////abs/path.db -> /abs/path.db"""
+    prefix = "sqlite:///"
+    if not database_url.startswith(prefix):
+        raise ValueError(f"Session store needs a sqlite:/// DATABASE_URL, got {database_url!r}")
+    return database_url[len(prefix):] or ":memory:"
+
+
+def create_session_store():
+    """The store selected by SESSION_STORE, or None when the API stays stateless."""
+    backend = settings.SESSION_STORE.strip().lower()
+    if not backend:
+        return None
+    if backend == "memory":
+        store = MemorySessionStore(settings.SESSION_MEMORY_MAX_SESSIONS)
+    elif backend == "sqlite":
+        store = SQLiteSessionStore(sqlite_path(settings.DATABASE_URL))
+    else:
+        raise ValueError(f"Unknown SESSION_STORE {settings.SESSION_STORE!r} (use memory or sqlite)")
+    logger.info(f"Session store: {store.stats()}")
+    return store
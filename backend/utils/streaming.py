@@ -0,0 +1,43 @@
+# Per-request streaming channel for workflow status/text/audio chunks
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+ChunkSender = Callable[[str, dict], None]
+
+# Set by the API layer for the duration of one request. Context variables follow the request
+# into LangGraph worker threads, asyncio tasks and asyncio.to_thread calls, so concurrent
+# streams never see each other's channel.
+_current_channel: contextvars.ContextVar[Optional[ChunkSender]] = contextvars.ContextVar(
+    "streaming_channel", default=None
+)
+
+
+def make_chunk(chunk_type: str, data: dict) -> dict:
+    return {
+        "type": chunk_type,
+        "data": data,
+        "timestamp": time.time()
+    }
+
+
+def send_streaming_chunk(chunk_type: str, data: dict):
+    """
+    Send a streaming chunk to the frontend of the current request.
+    Does nothing when the request is not streaming (no channel is open).
+    """
+    channel = _current_channel.get()
+    if channel is not None:
+        channel(chunk_type, data)
+
+
+@contextmanager
+def streaming_channel(sender: ChunkSender):
+    """Route send_streaming_chunk() calls made inside this block (and its threads/tasks) to `sender`."""
+    token = _current_channel.set(sender)
+    try:
+        yield
+    finally:
+        _current_channel.reset(token)
@@ -0,0 +1,173 @@
+# Structural diff for profile change tracking: per-item list changes, keyed list-of-dict matching
+
+import json
+from difflib import SequenceMatcher
+from typing import Any, Iterable, List, Optional, Sequence
+
+# Fields that identify an item in a list of objects (e.g. a treatment by its name)
+DEFAULT_KEY_FIELDS = ("name", "id", "uid")
+
+
+def format_path(segments: Sequence) -> str:
+    """
+    Render path segments as e.g. "treatment[Sleep].medicationList": dict keys are joined
+    with dots, list positions are shown as [index] or [item key].
+    """
+    path = ""
+    for segment in segments:
+        if isinstance(segment, tuple):  # ("item", label) for a list position
+            path += f"[{segment[1]}]"
+        else:
+            path = f"{path}.{segment}" if path else str(segment)
+    return path
+
+
+def item_label(item: Any, index: int, key_fields: Iterable[str] = DEFAULT_KEY_FIELDS) -> Any:
+    if isinstance(item, dict):
+        for field in key_fields:
+            value = item.get(field)
+            if isinstance(value, (str, int)) and not isinstance(value, bool):
+                return value
+    return index
+
+
+def pointer_path(doc: Any, tokens: Sequence[str], key_fields: Iterable[str] = DEFAULT_KEY_FIELDS) -> str:
+    """format_path() for JSON pointer tokens resolved against `doc` (list items get their key)."""
+    segments = []
+    current = doc
+    for token in tokens:
+        if isinstance(current, list):
+            index = int(token) if token.isdigit() else len(current)
+            item = current[index] if index < len(current) else None
+            segments.append(("item", item_label(item, index, key_fields)))
+            current = item
+        else:
+            segments.append(token)
+            current = current.get(token) if isinstance(current, dict) else None
+    return format_path(segments)
+
+
+def _record(segments: list, change_type: str, before: Any = None, after: Any = None) -> dict:
+    return {"path": format_path(segments), "before": before, "after": after, "type": change_type}
+
+
+def _fingerprint(value: Any) -> Any:
+    # Scalars hash as themselves; containers by their canonical JSON
+    if isinstance(value, bool):
+        return ("bool", value)
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _key_field(before: list, after: list, key_fields: Iterable[str]) -> Optional[str]:
+    """A field that uniquely identifies every dict in both lists, if there is one."""
+    items = before + after
+    if not items or not all(isinstance(item, dict) for item in items):
+        return None
+    for field in key_fields:
+        for side in (before, after):
+            values = [item.get(field) for item in side]
+            if any(not isinstance(v, (str, int)) or isinstance(v, bool) for v in values) or len(set(values)) != len(values):
+                break
+        else:
+            return field
+    return None
+
+
+class StructuralDiff:
+    """
+    Compares two JSON-like documents and returns compact change records
+    ({"path", "before", "after", "type"} with type added/removed/modified):
+
+    - dicts are walked over the union of their keys,
+    - lists of objects sharing a unique key field (e.g. treatments by "name") are matched by
+      that key and compared recursively,
+    - other lists are aligned on hashed items with an LCS-style matcher, so inserting or
+      deleting one item yields one record holding just that item, not both full lists.
+    """
+
+    def __init__(self, key_fields: Iterable[str] = DEFAULT_KEY_FIELDS):
+        self.key_fields = tuple(key_fields)
+
+    def diff(self, before: Any, after: Any) -> List[dict]:
+        changes: List[dict] = []
+        self._compare(before, after, [], changes)
+        return changes
+
+    def _compare(self, before: Any, after: Any, segments: list, changes: list):
+        if before == after:
+            return
+        if isinstance(before, dict) and isinstance(after, dict):
+            self._compare_dicts(before, after, segments, changes)
+        elif isinstance(before, list) and isinstance(after, list):
+            self._compare_lists(before, after, segments, changes)
+        else:
+            changes.append(_record(segments, "modified", before, after))
+
+    def _compare_dicts(self, before: dict, after: dict, segments: list, changes: list):
+        for key in before:
+            if key in after:
+                self._compare(before[key], after[key], segments + [key], changes)
+            else:
+                changes.append(_record(segments + [key], "removed", before[key], None))
+        for key in after:
+            if key not in before:
+                changes.append(_record(segments + [key], "added", None, after[key]))
+
+    def _compare_lists(self, before: list, after: list, segments: list, changes: list):
+        key_field = _key_field(before, after, self.key_fields)
+        if key_field is not None:
+            self._compare_keyed(before, after, key_field, segments, changes)
+            return
+
+        # Only the window between the common prefix and suffix needs matching,
+        # which makes the usual single insert/delete linear and cheap
+        start, shortest = 0, min(len(before), len(after))
+        while start < shortest and before[start] == after[start]:
+            start += 1
+        end = 0
+        while end < shortest - start and before[-1 - end] == after[-1 - end]:
+            end += 1
+        old_items = before[start:len(before) - end]
+        new_items = after[start:len(after) - end]
+
+        matcher = SequenceMatcher(None, [_fingerprint(v) for v in old_items], [_fingerprint(v) for v in new_items], autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                continue
+            if tag == "replace" and i2 - i1 == j2 - j1:
+                # Same number of items swapped in place: compare them pairwise
+                for offset in range(i2 - i1):
+                    old, new = old_items[i1 + offset], new_items[j1 + offset]
+                    if isinstance(old, (dict, list)) and type(old) is type(new):
+                        label = item_label(old, start + i1 + offset, self.key_fields)
+                        self._compare(old, new, segments + [("item", label)], changes)
+                    else:
+                        changes.append(_record(segments, "modified", old, new))
+                continue
+            for old in old_items[i1:i2]:
+                changes.append(_record(segments, "removed", old, None))
+            for new in new_items[j1:j2]:
+                changes.append(_record(segments, "added", None, new))
+
+    def _compare_keyed(self, before: list, after: list, key_field: str, segments: list, changes: list):
+        after_by_key = {item[key_field]: item for item in after}
+        before_keys = set()
+        for item in before:
+            key = item[key_field]
+            before_keys.add(key)
+            if key in after_by_key:
+                self._compare(item, after_by_key[key], segments + [("item", key)], changes)
+            else:
+                changes.append(_record(segments, "removed", item, None))
+        for item in after:
+            if item[key_field] not in before_keys:
+                changes.append(_record(segments, "added", None, item))
+
+
+structural_diff = StructuralDiff()
+
+
+def diff_documents(before: Any, after: Any) -> List[dict]:
+    return structural_diff.diff(before, after)
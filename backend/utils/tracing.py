@@ -0,0 +1,256 @@
+# Per-node spans for the agent graph and Prometheus-format latency metrics
+
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+from langchain_core.callbacks import BaseCallbackHandler
+from config.settings import settings
+
+# Seconds; covers in-process nodes (ms) up to slow LLM/medical calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative Prometheus histogram, one series per label tuple."""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...], buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, series in sorted(self._series.items()):
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            prefix = labels + "," if labels else ""
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float, *label_values):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            lines.append(f"{self.name}{{{labels}}} {value:g}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class AgentMetrics:
+    """Process-wide graph metrics, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.node_seconds = Histogram("agent_node_duration_seconds", "Graph node latency", ("node", "route"))
+        self.request_seconds = Histogram("agent_request_duration_seconds", "Whole workflow latency", ("route",))
+        self.llm_calls = Counter("agent_node_llm_calls_total", "LLM calls made inside a node", ("node",))
+        self.llm_tokens = Counter("agent_node_llm_tokens_total", "LLM tokens used inside a node", ("node", "kind"))
+        self.node_errors = Counter("agent_node_errors_total", "Nodes that raised", ("node",))
+
+    def record_span(self, span: "Span"):
+        route = span.route_tag or "none"
+        with self._lock:
+            self.node_seconds.observe(span.duration, span.node, route)
+            if span.llm_calls:
+                self.llm_calls.inc(span.llm_calls, span.node)
+                self.llm_tokens.inc(span.prompt_tokens, span.node, "prompt")
+                self.llm_tokens.inc(span.completion_tokens, span.node, "completion")
+            if span.error:
+                self.node_errors.inc(1, span.node)
+
+    def record_request(self, seconds: float, route_tag: Optional[str]):
+        with self._lock:
+            self.request_seconds.observe(seconds, route_tag or "none")
+
+    def render(self) -> str:
+        with self._lock:
+            lines = []
+            for metric in (self.request_seconds, self.node_seconds, self.llm_calls, self.llm_tokens, self.node_errors):
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class Span:
+    __slots__ = ("node", "start", "end", "llm_calls", "prompt_tokens", "completion_tokens", "route_tag", "error")
+
+    def __init__(self, node: str, start: float):
+        self.node = node
+        self.start = start
+        self.end = start
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.route_tag = None
+        self.error = None
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class RequestTrace:
+    """Spans of one workflow run; parallel branches show up as overlapping spans."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def waterfall(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "llm_calls": sum(s.llm_calls for s in spans),
+            "spans": [
+                {
+                    "node": s.node,
+                    "start_ms": round((s.start - self.started) * 1000, 2),
+                    "duration_ms": round(s.duration * 1000, 2),
+                    "llm_calls": s.llm_calls,
+                    "prompt_tokens": s.prompt_tokens,
+                    "completion_tokens": s.completion_tokens,
+                    "route_tag": s.route_tag,
+                    "error": s.error,
+                }
+                for s in spans
+            ],
+        }
+
+
+agent_metrics = AgentMetrics()
+
+# Both follow the request into LangGraph worker threads and asyncio tasks
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("agent_trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("agent_span", default=None)
+
+
+@contextmanager
+def request_trace():
+    """Collect the spans of the workflow run inside this block."""
+    trace = RequestTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def _route_of(state) -> Optional[str]:
+    return state.get("route_tag") if isinstance(state, dict) else None
+
+
+def _begin(node: str, state) -> Tuple[Span, contextvars.Token]:
+    span = Span(node, time.perf_counter())
+    span.route_tag = _route_of(state)
+    return span, _current_span.set(span)
+
+
+def _finish(span: Span, token: contextvars.Token, result=None, error: Optional[BaseException] = None):
+    span.end = time.perf_counter()
+    _current_span.reset(token)
+    span.route_tag = _route_of(result) or span.route_tag
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+    agent_metrics.record_span(span)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(span)
+
+
+def traced(node: str, func: Callable, asynchronous: bool = False) -> Callable:
+    """Wrap a graph node so each run records a span (latency, LLM calls/tokens, route tag)."""
+    if not settings.TRACING_ENABLED:
+        return func
+
+    if asynchronous:
+        @functools.wraps(func)
+        async def async_wrapper(state):
+            span, token = _begin(node, state)
+            try:
+                result = await func(state)
+            except BaseException as e:
+                _finish(span, token, error=e)
+                raise
+            _finish(span, token, result)
+            return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(state):
+        span, token = _begin(node, state)
+        try:
+            result = func(state)
+        except BaseException as e:
+            _finish(span, token, error=e)
+            raise
+        _finish(span, token, result)
+        return result
+    return wrapper
+
+
+class LLMSpanCallback(BaseCallbackHandler):
+    """Attributes every chat model call (and its token usage) to the node span it runs in."""
+
+    run_inline = True  # stay in the caller's context so the current span is visible
+
+    def on_llm_end(self, response, **kwargs):
+        span = _current_span.get()
+        if span is None:
+            return
+        span.llm_calls += 1
+        prompt = completion = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt += usage.get("input_tokens", 0)
+                completion += usage.get("output_tokens", 0)
+        if not prompt and not completion:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        span.prompt_tokens += prompt or 0
+        span.completion_tokens += completion or 0
+
+    def on_llm_error(self, error, **kwargs):
+        span = _current_span.get()
+        if span is not None:
+            span.llm_calls += 1
+
+
+llm_span_callback = LLMSpanCallback()
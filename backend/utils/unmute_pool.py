@@ -0,0 +1,287 @@
+# Pool of pre-connected, pre-initialized Unmute websocket sessions
+
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+from utils.logging_config import logger
+
+
+def _is_open(websocket) -> bool:
+    # websockets < 13 exposes .open; newer releases expose .state
+    is_open = getattr(websocket, "open", None)
+    if is_open is not None:
+        return bool(is_open)
+    state = getattr(websocket, "state", None)
+    return getattr(state, "name", "") == "OPEN"
+
+
+async def await_session_updated(websocket, timeout: float) -> bool:
+    """
+    Wait for the server's `session.updated` ack after a `session.update`.
+    Returns False if none arrives within `timeout`; raises if the server answers with an error.
+    """
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            raw = await asyncio.wait_for(websocket.recv(), timeout=max(deadline - time.monotonic(), 0))
+            try:
+                msg = json.loads(raw)
+            except (json.JSONDecodeError, TypeError):
+                continue
+            msg_type = msg.get("type", "")
+            if msg_type == "session.updated":
+                return True
+            if msg_type == "error":
+                raise RuntimeError(f"Unmute rejected session.update: {msg.get('error', msg)}")
+    except asyncio.TimeoutError:
+        return False
+
+
+class PooledSession:
+    """A connected, initialized websocket plus the bookkeeping the pool needs."""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.created_at = time.time()
+        self.idle_since = self.created_at
+        self.uses = 0
+        # Set by the caller once its exchange finished cleanly; anything else is recycled
+        self.reusable = False
+
+
+class UnmuteSessionPool:
+    """
+    Keeps `size` sessions connected and initialized ahead of time so a request only has to
+    lease one instead of paying TCP/websocket setup plus the session start.
+    Must be used from a single event loop (the backend's background loop): sessions,
+    the condition and refill tasks are all bound to it.
+
+    Unmute sessions carry conversation state, so by default a session serves one response
+    and is then closed and replaced in the background (reuse=False). With reuse=True a
+    session that finished its exchange cleanly goes back to the idle set.
+    """
+
+    def __init__(self, connect: Callable[[], Awaitable], size: int = 2, max_sessions: int = 32,
+                 lease_timeout: float = 10.0, max_idle_seconds: float = 60.0, reuse: bool = False,
+                 retry_backoff: float = 5.0):
+        self._connect = connect
+        self.size = size
+        self.max_sessions = max(max_sessions, size, 1)
+        self.lease_timeout = lease_timeout
+        self.max_idle_seconds = max_idle_seconds
+        self.reuse = reuse
+        self.retry_backoff = retry_backoff
+        self._idle: deque = deque()
+        self._in_use = 0
+        self._connecting = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._next_refill_at = 0.0
+        self._background: set = set()
+        self._maintainer: Optional[asyncio.Task] = None
+        # Metrics (read from other threads through stats())
+        self._stats_lock = threading.Lock()
+        self._waits_ms: deque = deque(maxlen=1000)
+        self._created = 0
+        self._leases = 0
+        self._pooled_leases = 0
+        self._connect_failures = 0
+        self._recycled = 0
+        self._discarded = 0
+        self._lease_timeouts = 0
+        self._last_error: Optional[str] = None
+
+    @property
+    def _total(self) -> int:
+        return len(self._idle) + self._in_use + self._connecting
+
+    def _cond(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _open_session(self) -> PooledSession:
+        try:
+            websocket = await self._connect()
+        except Exception as e:
+            with self._stats_lock:
+                self._connect_failures += 1
+                self._last_error = str(e)
+            raise
+        with self._stats_lock:
+            self._created += 1
+            self._last_error = None
+        return PooledSession(websocket)
+
+    async def _close(self, session: PooledSession):
+        try:
+            await session.websocket.close()
+        except Exception:
+            pass
+
+    async def _refill_one(self):
+        try:
+            session = await self._open_session()
+        except Exception as e:
+            logger.warning(f"Unmute pool: pre-connect failed: {str(e)}")
+            self._next_refill_at = time.monotonic() + self.retry_backoff
+            return
+        finally:
+            self._connecting -= 1
+        async with self._cond():
+            self._idle.append(session)
+            self._cond().notify()
+
+    def refill(self):
+        """Start connecting sessions until `size` are idle or being prepared (call on the pool's loop)."""
+        if time.monotonic() < self._next_refill_at:
+            return
+        while len(self._idle) + self._connecting < self.size and self._total < self.max_sessions:
+            self._connecting += 1
+            self._spawn(self._refill_one())
+
+    async def start(self):
+        """Pre-connect the initial sessions and keep the idle set fresh from then on."""
+        self.refill()
+        if self._maintainer is None:
+            self._maintainer = asyncio.get_running_loop().create_task(self._maintain())
+
+    async def _maintain(self):
+        # Idle sessions can be dropped by the server; replace them before a request finds out
+        while self.size > 0:
+            await asyncio.sleep(max(self.max_idle_seconds / 2, 1.0))
+            async with self._cond():
+                fresh = [s for s in self._idle if self._is_fresh(s)]
+                stale = [s for s in self._idle if not self._is_fresh(s)]
+                self._idle = deque(fresh)
+            for session in stale:
+                with self._stats_lock:
+                    self._discarded += 1
+                await self._close(session)
+            self.refill()
+
+    def _is_fresh(self, session: PooledSession) -> bool:
+        return _is_open(session.websocket) and time.time() - session.idle_since <= self.max_idle_seconds
+
+    def _take_idle(self) -> Optional[PooledSession]:
+        while self._idle:
+            session = self._idle.popleft()
+            if self._is_fresh(session):
+                return session
+            with self._stats_lock:
+                self._discarded += 1
+            self._spawn(self._close(session))
+        return None
+
+    async def _acquire(self) -> tuple:
+        """Returns (session, came_from_pool)."""
+        deadline = time.monotonic() + self.lease_timeout
+        condition = self._cond()
+        async with condition:
+            while True:
+                session = self._take_idle()
+                if session is not None:
+                    self._in_use += 1
+                    return session, True
+                if self._total < self.max_sessions:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    with self._stats_lock:
+                        self._lease_timeouts += 1
+                    raise TimeoutError(f"No Unmute session available within {self.lease_timeout}s")
+                try:
+                    await asyncio.wait_for(condition.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+            # Pool is empty but under the cap: connect inline (counted as in use meanwhile)
+            self._in_use += 1
+        try:
+            session = await self._open_session()
+        except Exception:
+            async with condition:
+                self._in_use -= 1
+                condition.notify()
+            raise
+        return session, False
+
+    async def _release(self, session: PooledSession):
+        condition = self._cond()
+        keep = self.reuse and session.reusable and _is_open(session.websocket)
+        async with condition:
+            self._in_use -= 1
+            if keep:
+                session.idle_since = time.time()
+                session.reusable = False
+                self._idle.append(session)
+            condition.notify()
+        if not keep:
+            with self._stats_lock:
+                self._recycled += 1
+            self._spawn(self._close(session))
+        self.refill()
+
+    @asynccontextmanager
+    async def lease(self):
+        """Lease a ready session for one exchange; it is returned (or recycled) on exit."""
+        started = time.perf_counter()
+        session, pooled = await self._acquire()
+        # Start preparing the replacement while this session is busy
+        self.refill()
+        with self._stats_lock:
+            self._leases += 1
+            self._pooled_leases += int(pooled)
+            self._waits_ms.append((time.perf_counter() - started) * 1000)
+        session.uses += 1
+        try:
+            yield session
+        finally:
+            await self._release(session)
+
+    async def close(self):
+        """Close idle sessions (leased ones are closed when returned)."""
+        self.size = 0
+        if self._maintainer is not None:
+            self._maintainer.cancel()
+            self._maintainer = None
+        while self._idle:
+            await self._close(self._idle.popleft())
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            waits = sorted(self._waits_ms)
+            leases = self._leases
+            stats = {
+                "size": self.size,
+                "max_sessions": self.max_sessions,
+                "reuse_sessions": self.reuse,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "connecting": self._connecting,
+                "created": self._created,
+                "leases": leases,
+                "pooled_lease_rate": round(self._pooled_leases / leases, 4) if leases else 0.0,
+                "recycled": self._recycled,
+                "discarded_stale": self._discarded,
+                "connect_failures": self._connect_failures,
+                "lease_timeouts": self._lease_timeouts,
+                "last_error": self._last_error,
+            }
+        if waits:
+            stats["wait_ms"] = {
+                "avg": round(sum(waits) / len(waits), 2),
+                "p50": round(waits[len(waits) // 2], 2),
+                "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2),
+                "max": round(waits[-1], 2),
+            }
+        else:
+            stats["wait_ms"] = {"avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+        return stats
@@ -0,0 +1,199 @@
+# Vector indexes for semantic memory search (exact brute force and IVF over NumPy)
+
+import threading
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+from config.settings import settings
+from utils.embedding_cache import EmbeddingCache, text_key
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without a full sort."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class BruteForceIndex:
+    """Exact inner-product search over normalized vectors; best for small memory lists."""
+
+    kind = "brute"
+
+    def __init__(self, vectors: np.ndarray):
+        self._data = np.array(vectors, dtype=np.float32)
+        self._size = len(self._data)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._data[:self._size]
+
+    def add(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        needed = self._size + len(vectors)
+        if needed > len(self._data):
+            # Grow geometrically so repeated single inserts stay amortized O(1)
+            capacity = max(needed, 2 * len(self._data), 16)
+            grown = np.empty((capacity, vectors.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+        self._data[self._size:needed] = vectors
+        self._size = needed
+
+    def search(self, query: np.ndarray, k: int):
+        scores = self.vectors @ query
+        ids = _top_k(scores, k)
+        return ids, scores[ids]
+
+
+class IVFIndex(BruteForceIndex):
+    """
+    Inverted-file index: vectors are bucketed by their nearest k-means centroid and
+    a query only scans the `nprobe` closest buckets. Recall/latency trade-off is set
+    by ANN_NLIST and ANN_NPROBE.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, vectors: np.ndarray, nlist: Optional[int] = None, nprobe: Optional[int] = None):
+        super().__init__(vectors)
+        self.nlist = nlist or settings.ANN_NLIST or max(1, int(np.sqrt(len(vectors))))
+        self.nprobe = nprobe or settings.ANN_NPROBE
+        self._trained_size = 0
+        self._train()
+
+    def _train(self):
+        data = self.vectors
+        nlist = min(self.nlist, len(data))
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+        for _ in range(settings.ANN_KMEANS_ITERATIONS):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = data[assignment == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    centroids[c] = centroid / norm if norm else centroid
+        self._centroids = centroids
+        assignment = np.argmax(data @ centroids.T, axis=1)
+        self._lists = [list(np.flatnonzero(assignment == c)) for c in range(nlist)]
+        self._trained_size = len(data)
+
+    def add(self, vectors: np.ndarray):
+        start = len(self)
+        super().add(vectors)
+        if len(self) >= settings.ANN_RETRAIN_GROWTH * self._trained_size:
+            self._train()
+            return
+        assignment = np.argmax(np.asarray(vectors, dtype=np.float32) @ self._centroids.T, axis=1)
+        for offset, c in enumerate(assignment):
+            self._lists[c].append(start + offset)
+
+    def search(self, query: np.ndarray, k: int):
+        probes = _top_k(self._centroids @ query, self.nprobe)
+        candidates = np.fromiter(
+            (i for c in probes for i in self._lists[c]), dtype=np.int64
+        )
+        if len(candidates) < k:
+            return super().search(query, k)
+        scores = self.vectors[candidates] @ query
+        best = _top_k(scores, k)
+        return candidates[best], scores[best]
+
+
+def create_index(vectors: np.ndarray):
+    """Pick the index type for a memory list according to settings.VECTOR_INDEX."""
+    mode = settings.VECTOR_INDEX
+    if mode == "ivf" or (mode == "auto" and len(vectors) >= settings.ANN_INDEX_THRESHOLD):
+        return IVFIndex(vectors)
+    return BruteForceIndex(vectors)
+
+
+class MemoryIndexStore:
+    """
+    Per-patient vector indexes kept in sync with the (stateless) memory lists sent by clients.
+    Appended memories are inserted incrementally; any other change rebuilds the index
+    from cached embeddings.
+    """
+
+    def __init__(self, embeddings: EmbeddingCache, max_patients: Optional[int] = None):
+        self._embeddings = embeddings
+        self._max_patients = max_patients or settings.ANN_MAX_PATIENTS
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _appended(keys: list, indexed_keys: list) -> bool:
+        return len(keys) > len(indexed_keys) and keys[:len(indexed_keys)] == indexed_keys
+
+    def _prepare(self, patient_key: str, texts: list, keys: list, create: bool) -> Optional[tuple]:
+        """
+        Encode what the next _sync will need before the lock is taken: (indexed_count, vectors)
+        for an append, (None, matrix) for a rebuild, or None when nothing needs encoding.
+        """
+        with self._lock:
+            entry = self._entries.get(patient_key)
+            indexed_keys = entry[1] if entry is not None else None
+        if indexed_keys == keys:
+            return None
+        if indexed_keys is not None and self._appended(keys, indexed_keys):
+            return len(indexed_keys), self._embeddings.encode(texts[len(indexed_keys):])
+        return (None, self._embeddings.matrix(texts)) if create else None
+
+    def _sync(self, patient_key: str, texts: list, keys: list, create: bool = True, prepared: Optional[tuple] = None):
+        # Called with the lock held; `prepared` is used when the index hasn't moved since _prepare
+        entry = self._entries.get(patient_key)
+        if entry is not None:
+            self._entries.move_to_end(patient_key)
+            index, indexed_keys = entry
+            if indexed_keys == keys:
+                return index
+            if self._appended(keys, indexed_keys):
+                if prepared is not None and prepared[0] == len(indexed_keys):
+                    vectors = prepared[1]
+                else:
+                    vectors = self._embeddings.encode(texts[len(indexed_keys):])
+                index.add(vectors)
+                if index.kind == "brute" and settings.VECTOR_INDEX == "auto" and len(index) >= settings.ANN_INDEX_THRESHOLD:
+                    index = IVFIndex(index.vectors)
+                self._entries[patient_key] = (index, keys)
+                return index
+        if not create:
+            return None
+        matrix = prepared[1] if prepared is not None and prepared[0] is None else self._embeddings.matrix(texts)
+        index = create_index(matrix)
+        self._entries[patient_key] = (index, keys)
+        while len(self._entries) > self._max_patients:
+            self._entries.popitem(last=False)
+        return index
+
+    def search(self, patient_key: str, texts: list, query: str, k: int) -> list:
+        """Return positions in `texts` of the k memories most similar to the query."""
+        if not texts:
+            return []
+        # Encoding happens before the lock so searches only serialize on the index itself
+        keys = [text_key(t) for t in texts]
+        query_vector = self._embeddings.encode([query])[0]
+        prepared = self._prepare(patient_key, texts, keys, create=True)
+        with self._lock:
+            index = self._sync(patient_key, texts, keys, prepared=prepared)
+            ids, _ = index.search(query_vector, k)
+        return [int(i) for i in ids]
+
+    def insert(self, patient_key: str, texts: list):
+        """Incrementally index newly appended memories for a patient that already has an index."""
+        keys = [text_key(t) for t in texts]
+        prepared = self._prepare(patient_key, texts, keys, create=False)
+        with self._lock:
+            self._sync(patient_key, texts, keys, create=False, prepared=prepared)
+
+    def stats(self) -> dict:
+        return {
+            key: {"kind": index.kind, "size": len(index)} for key, (index, _) in self._entries.items()
+        }